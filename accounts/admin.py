@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Count
 from .models import User
 
 @admin.register(User)
@@ -21,9 +22,13 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(property_count=Count('properties'))
+
     def properties_count(self, obj):
-        return obj.properties.count()
+        return obj.property_count
     properties_count.short_description = 'Properties Listed'
+    properties_count.admin_order_field = 'property_count'
 
     actions = ['activate_users', 'deactivate_users', 'make_brokers', 'make_buyers']
 
@@ -74,7 +74,10 @@ def dashboard(request):
         user_form = UserProfileForm(instance=request.user)
         password_form = PasswordChangeForm(request.user)
 
-    return render(request, 'accounts/dashboard.html', {'form': user_form, 'password_form': password_form})
+    properties = request.user.properties.prefetch_related('images')
+    return render(request, 'accounts/dashboard.html', {
+        'form': user_form, 'password_form': password_form, 'properties': properties,
+    })
 
 @login_required
 def delete_account(request):
@@ -1,11 +1,40 @@
 from django.contrib import admin
-from .models import PageView
+from django.contrib.auth import get_user_model
+from real_estate.exports import CsvExportMixin, RelatedValue, format_datetime
+from blog.models import BlogPost
+from properties.models import Property
+from .models import PageView, SocialShare
+from .retention import archive_and_purge, retention_cutoff
+
+
+class AnalyticsAdminMixin:
+    """
+    Analytics rows live in their own database, so users, properties and blog posts
+    can't be joined: they are prefetched from the default database instead, and
+    username searches are resolved to user ids first.
+    """
+    related_prefetch = ('user',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(*self.related_prefetch)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Already narrowed by the list filters, which username matches must respect too
+        filtered = queryset
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            user_ids = get_user_model().objects.filter(
+                username__icontains=search_term
+            ).values_list('pk', flat=True)[:1000]
+            queryset |= filtered.filter(user_id__in=list(user_ids))
+        return queryset, may_have_duplicates
 
 @admin.register(PageView)
-class PageViewAdmin(admin.ModelAdmin):
+class PageViewAdmin(AnalyticsAdminMixin, CsvExportMixin, admin.ModelAdmin):
+    related_prefetch = ('user', 'property')
     list_display = ('url', 'user', 'ip_address', 'timestamp', 'user_agent')
     list_filter = ('timestamp', 'url')
-    search_fields = ('url', 'user__username', 'ip_address')
+    search_fields = ('url', 'ip_address')
     readonly_fields = ('timestamp', 'user_agent', 'ip_address', 'session_key')
 
     fieldsets = (
@@ -23,12 +52,57 @@ class PageViewAdmin(admin.ModelAdmin):
 
     actions = ['export_analytics', 'clear_old_views']
 
+    export_name = 'page_views'
+    export_columns = (
+        ('Timestamp', 'timestamp', format_datetime),
+        ('URL', 'url'),
+        ('Property', 'property_id', RelatedValue(Property, 'title')),
+        ('User', 'user_id', RelatedValue(get_user_model(), 'username')),
+        ('IP Address', 'ip_address'),
+        ('Session', 'session_key'),
+        ('Referrer', 'referrer'),
+        ('Time Spent (s)', 'time_spent'),
+        ('User Agent', 'user_agent'),
+    )
+
     def export_analytics(self, request, queryset):
-        # This would typically export analytics data
-        self.message_user(request, f"Export functionality would be implemented for {queryset.count()} page views.")
+        return self.export_csv(request, queryset)
     export_analytics.short_description = "Export selected analytics data"
 
     def clear_old_views(self, request, queryset):
-        # This would typically clear old analytics data
-        self.message_user(request, f"Clear old data functionality would be implemented for {queryset.count()} records.")
-    clear_old_views.short_description = "Clear selected old analytics data"
+        cutoff = retention_cutoff()
+        archived, files = archive_and_purge('pageview', cutoff, queryset=queryset)
+        self.message_user(
+            request,
+            f"🗄️ Archived and removed {archived} page views older than {cutoff:%Y-%m-%d} into {len(files)} archive files.",
+        )
+    clear_old_views.short_description = "Archive and clear selected page views past the retention window"
+
+
+@admin.register(SocialShare)
+class SocialShareAdmin(AnalyticsAdminMixin, CsvExportMixin, admin.ModelAdmin):
+    related_prefetch = ('user', 'property', 'blog_post')
+    list_display = ('platform', 'content_type', 'page_title', 'user', 'timestamp')
+    list_filter = ('platform', 'content_type', 'timestamp')
+    search_fields = ('page_title', 'url_shared')
+    readonly_fields = ('timestamp', 'user_agent', 'ip_address', 'session_key')
+
+    actions = ['export_shares']
+
+    export_name = 'social_shares'
+    export_columns = (
+        ('Timestamp', 'timestamp', format_datetime),
+        ('Platform', 'platform'),
+        ('Content Type', 'content_type'),
+        ('Page Title', 'page_title'),
+        ('URL', 'url_shared'),
+        ('Property', 'property_id', RelatedValue(Property, 'title')),
+        ('Blog Post', 'blog_post_id', RelatedValue(BlogPost, 'title')),
+        ('User', 'user_id', RelatedValue(get_user_model(), 'username')),
+        ('IP Address', 'ip_address'),
+        ('Referrer', 'referrer'),
+    )
+
+    def export_shares(self, request, queryset):
+        return self.export_csv(request, queryset)
+    export_shares.short_description = "Export selected shares to CSV"
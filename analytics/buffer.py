@@ -0,0 +1,84 @@
+"""
+In-process buffer between the async tracking endpoints and the database.
+
+The endpoints only append a request's events here and answer 204; a background
+thread writes everything pending with record_batches() every
+INGEST_BUFFER_FLUSH_SECONDS, or as soon as INGEST_BUFFER_MAX_EVENTS are waiting.
+Events beyond INGEST_BUFFER_MAX_PENDING (the database can't keep up) are dropped,
+and so are events still buffered when a process is killed; a normal exit flushes
+them. Tracking is fire-and-forget, so both are acceptable.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .ingest import record_batches
+
+logger = logging.getLogger(__name__)
+
+
+class IngestBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pending = []  # (events, context) pairs
+        self.pending_events = 0
+        self.dropped = 0
+        self.thread = None
+        self.pid = None
+
+    def add(self, events, context):
+        """Queue one request's events; returns False if they were dropped"""
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked worker: the parent's thread and events stay with the parent
+                self.pending, self.pending_events, self.thread, self.pid = [], 0, None, os.getpid()
+            if self.pending_events + len(events) > settings.INGEST_BUFFER_MAX_PENDING:
+                self.dropped += len(events)
+                self.wake.set()
+                return False
+            self.pending.append((events, context))
+            self.pending_events += len(events)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='ingest-buffer', daemon=True)
+                self.thread.start()
+            if self.pending_events >= settings.INGEST_BUFFER_MAX_EVENTS:
+                self.wake.set()
+        return True
+
+    def flush(self):
+        """Write everything pending now; returns (accepted, rejected)"""
+        with self.flush_lock:
+            with self.lock:
+                batches, self.pending, self.pending_events = self.pending, [], 0
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                logger.warning(f"Ingest buffer full; dropped {dropped} tracking events")
+            if not batches:
+                return 0, 0
+            return record_batches(batches)
+
+    def run(self):
+        while True:
+            self.wake.wait(settings.INGEST_BUFFER_FLUSH_SECONDS)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Ingest buffer flush failed")
+            finally:
+                close_old_connections()
+
+
+ingest_buffer = IngestBuffer()
+
+
+@atexit.register
+def flush_on_exit():
+    if ingest_buffer.pending and ingest_buffer.pid == os.getpid():
+        ingest_buffer.flush()
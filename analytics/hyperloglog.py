@@ -0,0 +1,73 @@
+"""
+Compact HyperLogLog sketches for unique visitor / sharer counts.
+
+A sketch keeps 2**PRECISION one-byte registers (2 KB, stored zlib-compressed so sparse
+days cost a few bytes). Estimates have a relative standard error of
+1.04 / sqrt(2**PRECISION) ~= 2.3%, i.e. about 95% of estimates are within +/-4.6% of the
+true count. Adding the same visitor twice never changes a sketch and sketches merge by
+taking the per-register maximum, so daily sketches can be combined into weekly,
+monthly or lifetime uniques without touching the raw rows.
+"""
+import hashlib
+import math
+import zlib
+
+PRECISION = 11
+REGISTER_COUNT = 1 << PRECISION
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTER_COUNT)
+
+_HASH_BITS = 64
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTER_COUNT)
+
+
+class HyperLogLog:
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers else bytearray(REGISTER_COUNT)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a sketch saved with to_bytes(); empty or missing data gives an empty sketch"""
+        if not data:
+            return cls()
+        return cls(zlib.decompress(bytes(data)))
+
+    @classmethod
+    def merged(cls, sketches):
+        """Union of several serialized sketches"""
+        result = cls()
+        for data in sketches:
+            if data:
+                result.merge(cls.from_bytes(data))
+        return result
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.registers))
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> (_HASH_BITS - PRECISION)
+        remainder = hashed & ((1 << (_HASH_BITS - PRECISION)) - 1)
+        rank = (_HASH_BITS - PRECISION) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Estimated number of distinct values added"""
+        zeros = self.registers.count(0)
+        if zeros == REGISTER_COUNT:
+            return 0
+
+        estimate = _ALPHA * REGISTER_COUNT * REGISTER_COUNT / sum(2.0 ** -r for r in self.registers)
+        if estimate <= 2.5 * REGISTER_COUNT and zeros:
+            # Small range correction (linear counting)
+            estimate = REGISTER_COUNT * math.log(REGISTER_COUNT / zeros)
+        return int(round(estimate))
@@ -0,0 +1,153 @@
+"""
+Batched ingestion of tracking events (social shares and page views)
+"""
+from django.db import router, transaction
+
+from blog.models import BlogPost
+from properties.models import Property
+from real_estate.db import increment_counters
+
+from .models import PageView, SocialShare, SocialShareAnalytics
+from .utils import share_counter_row
+
+MAX_BATCH_EVENTS = 100
+
+SHARE_PLATFORMS = {choice for choice, _ in SocialShare.PLATFORM_CHOICES}
+SHARE_CONTENT_TYPES = {choice for choice, _ in SocialShare.CONTENT_TYPE_CHOICES}
+
+
+def get_client_ip(request):
+    """Get client IP address, handling proxy headers"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def request_context(request, user=None):
+    """Visitor details recorded with every event sent in one request"""
+    user = request.user if user is None else user
+    return {
+        'user_id': user.pk if user.is_authenticated else None,
+        'session_key': request.session.session_key or '',
+        'ip_address': get_client_ip(request),
+        'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+        'referrer': request.META.get('HTTP_REFERER', ''),
+    }
+
+
+async def arequest_context(request):
+    """request_context() for async views, where request.user can't be loaded lazily"""
+    return request_context(request, await request.auser())
+
+
+def _content_id(event, key='content_id'):
+    try:
+        return int(event.get(key))
+    except (TypeError, ValueError):
+        return None
+
+
+def record_events(events, context):
+    """
+    Store a batch of tracking events.
+
+    Each event is a dict with ``type`` 'share' (same fields as the single share
+    endpoint) or 'page_view' (``property_id``, ``url``, ``time_spent``). Content ids are
+    resolved with one in_bulk query per content type, the rows are written with one
+    bulk_create per table and all daily share counters are applied in a single
+    aggregated upsert.
+
+    Returns (accepted, rejected) counts.
+    """
+    return record_batches([(events, context)])
+
+
+def record_batches(batches):
+    """
+    Store several batches of events, each an (events, context) pair as taken by
+    record_events(), with the same queries as a single batch.
+
+    Returns the total (accepted, rejected) counts.
+    """
+    rejected = 0
+    contextual_events = []
+    for events, context in batches:
+        valid_events = [event for event in events[:MAX_BATCH_EVENTS] if isinstance(event, dict)]
+        rejected += len(events) - len(valid_events)
+        contextual_events.extend((event, context) for event in valid_events)
+
+    property_ids = set()
+    blog_post_ids = set()
+    for event, _ in contextual_events:
+        if event.get('type') == 'page_view':
+            property_ids.add(_content_id(event, 'property_id'))
+        elif event.get('content_type') == 'property':
+            property_ids.add(_content_id(event))
+        elif event.get('content_type') == 'blog_post':
+            blog_post_ids.add(_content_id(event))
+    property_ids.discard(None)
+    blog_post_ids.discard(None)
+
+    known_properties = Property.objects.only('id').in_bulk(property_ids) if property_ids else {}
+    known_blog_posts = BlogPost.objects.only('id').in_bulk(blog_post_ids) if blog_post_ids else {}
+
+    shares = []
+    page_views = []
+    for event, context in contextual_events:
+        event_type = event.get('type', 'share')
+
+        if event_type == 'page_view':
+            property_id = _content_id(event, 'property_id')
+            if property_id is not None and property_id not in known_properties:
+                rejected += 1
+                continue
+            page_views.append(PageView(
+                property_id=property_id,
+                user_id=context['user_id'],
+                url=str(event.get('url') or '')[:200] or None,
+                ip_address=context['ip_address'],
+                user_agent=context['user_agent'],
+                session_key=context['session_key'],
+                referrer=context['referrer'][:200] or None,
+                time_spent=max(_content_id(event, 'time_spent') or 0, 0),
+            ))
+
+        elif event_type == 'share':
+            platform = event.get('platform')
+            if platform not in SHARE_PLATFORMS:
+                rejected += 1
+                continue
+            content_type = event.get('content_type', 'other')
+            if content_type not in SHARE_CONTENT_TYPES:
+                content_type = 'other'
+            content_id = _content_id(event)
+            metadata = event.get('metadata', {})
+            shares.append(SocialShare(
+                user_id=context['user_id'],
+                property_id=content_id if content_type == 'property' and content_id in known_properties else None,
+                blog_post_id=content_id if content_type == 'blog_post' and content_id in known_blog_posts else None,
+                platform=platform,
+                content_type=content_type,
+                url_shared=str(event.get('url', ''))[:200],
+                page_title=str(event.get('page_title', ''))[:200],
+                ip_address=context['ip_address'],
+                user_agent=context['user_agent'],
+                session_key=context['session_key'],
+                referrer=context['referrer'][:200],
+                metadata=metadata if isinstance(metadata, dict) else {},
+            ))
+
+        else:
+            rejected += 1
+
+    with transaction.atomic(using=router.db_for_write(PageView)):
+        if page_views:
+            PageView.objects.bulk_create(page_views)
+        if shares:
+            SocialShare.objects.bulk_create(shares)
+            increment_counters(
+                SocialShareAnalytics, ['date', 'platform'], [share_counter_row(share) for share in shares]
+            )
+
+    return len(page_views) + len(shares), rejected
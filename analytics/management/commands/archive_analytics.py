@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analytics.retention import ARCHIVED_MODELS, archive_and_purge, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Archive page views and social shares older than the retention window to compressed files, then purge them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.ANALYTICS_RETENTION_DAYS,
+            help='Keep this many days of raw rows in the database',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.ANALYTICS_PURGE_BATCH_SIZE,
+            help='Rows deleted per transaction',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many rows would be archived without making changes',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options['days'])
+        self.stdout.write(f'Archiving rows older than {cutoff:%Y-%m-%d}...')
+
+        for name in ARCHIVED_MODELS:
+            archived, files = archive_and_purge(
+                name, cutoff, batch_size=options['batch_size'], dry_run=options['dry_run']
+            )
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING(f'  Would archive {archived} {name} rows'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'  Archived and purged {archived} {name} rows into {len(files)} files'))
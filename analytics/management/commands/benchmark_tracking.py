@@ -0,0 +1,184 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.buffer import ingest_buffer
+
+# (name, method, sync path, async path, body)
+ENDPOINTS = (
+    (
+        'track-share', 'POST', '/analytics/track-share/', '/analytics/async/track-share/',
+        {'platform': 'facebook', 'content_type': 'homepage', 'url': 'https://example.com/'},
+    ),
+    (
+        'track-batch', 'POST', '/analytics/track-batch/', '/analytics/async/track-batch/',
+        {'events': [
+            {'type': 'share', 'platform': 'twitter', 'content_type': 'other', 'url': 'https://example.com/'},
+            {'type': 'page_view', 'url': '/', 'time_spent': 12},
+        ]},
+    ),
+    ('share-stats', 'GET', '/analytics/share-stats/', '/analytics/async/share-stats/', None),
+)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput of the sync tracking endpoints with their async versions. By default '
+        'requests are sent straight to the ASGI application in this process; with --url they go '
+        'to a running ASGI server, e.g. "uvicorn real_estate.asgi:application --workers 4". '
+        'Events are written to the configured databases.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server (default: in-process ASGI)')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint (default 2000)')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight (default 50)')
+        parser.add_argument('--host', default='localhost', help='Host header (default localhost)')
+        parser.add_argument(
+            '--endpoint', action='append', choices=[endpoint[0] for endpoint in ENDPOINTS],
+            help='Only benchmark this endpoint (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        endpoints = [endpoint for endpoint in ENDPOINTS if not options['endpoint'] or endpoint[0] in options['endpoint']]
+        if options['url']:
+            target = urlsplit(options['url'])
+            if target.scheme != 'http' or not target.hostname:
+                raise CommandError('--url must be an http:// URL')
+            send = HttpClient(target.hostname, target.port or 80, options['host']).request
+            where = options['url']
+        else:
+            send = AsgiClient(get_asgi_application(), options['host']).request
+            where = 'in-process ASGI application'
+
+        self.stdout.write(f"{options['requests']} requests per endpoint, {options['concurrency']} in flight, {where}")
+        self.stdout.write(f"{'endpoint':<12} {'path':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for name, method, sync_path, async_path, body in endpoints:
+            payload = json.dumps(body).encode() if body is not None else b''
+            for label, path in (('sync', sync_path), ('async', async_path)):
+                result = asyncio.run(self.run(send, method, path, payload, options))
+                self.stdout.write(
+                    f"{name:<12} {label:<6} {result['rate']:>8.0f} {percentile(result['latencies'], 0.50):>8.2f} "
+                    f"{percentile(result['latencies'], 0.95):>8.2f} {result['errors']:>7}"
+                )
+
+        if not options['url']:
+            start = time.perf_counter()
+            accepted, _ = ingest_buffer.flush()
+            self.stdout.write(
+                f"Flushed {accepted} buffered events in {(time.perf_counter() - start) * 1000:.0f} ms"
+            )
+
+    async def run(self, send, method, path, payload, options):
+        remaining = iter(range(options['requests']))
+        latencies = []
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    status = await send(method, path, payload)
+                except (OSError, asyncio.IncompleteReadError):
+                    status = None
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status is None or status >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - start
+        return {'rate': len(latencies) / elapsed, 'latencies': latencies, 'errors': errors}
+
+
+class AsgiClient:
+    """Calls an ASGI application directly, without a server or sockets"""
+
+    def __init__(self, application, host):
+        self.application = application
+        self.host = host.encode()
+
+    async def request(self, method, path, body):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', self.host),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+            'client': ('127.0.0.1', 50000),
+            'server': ('127.0.0.1', 80),
+        }
+        received = False
+        status = None
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # The client never disconnects; Django stops listening once it has responded
+            await asyncio.Future()
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await self.application(scope, receive, send)
+        return status
+
+
+class HttpClient:
+    """Minimal HTTP/1.1 client keeping one connection per concurrent worker"""
+
+    def __init__(self, hostname, port, host):
+        self.hostname = hostname
+        self.port = port
+        self.host = host
+        self.idle = []
+
+    async def request(self, method, path, body):
+        reader, writer = self.idle.pop() if self.idle else await asyncio.open_connection(self.hostname, self.port)
+        writer.write(
+            f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        keep_alive = True
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+            elif name.lower() == 'connection' and value.strip().lower() == 'close':
+                keep_alive = False
+        await reader.readexactly(length)
+
+        if keep_alive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        return status
@@ -0,0 +1,74 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy analytics rows recorded before the analytics database was split out from the '
+        'default database into ANALYTICS_DATABASE; rows already copied are skipped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per transaction')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many rows would be copied without making changes',
+        )
+
+    def handle(self, *args, **options):
+        source = DEFAULT_DB_ALIAS
+        target = settings.ANALYTICS_DATABASE
+        if source == target:
+            self.stdout.write(self.style.WARNING('Analytics already use the default database; nothing to copy'))
+            return
+
+        introspection = connections[source].introspection
+        models = list(apps.get_app_config('analytics').get_models())
+        with connections[source].cursor() as cursor:
+            source_tables = set(introspection.table_names(cursor))
+            # Only the analytics tables the source still has
+            source_columns = {
+                model._meta.db_table: {
+                    column.name for column in introspection.get_table_description(cursor, model._meta.db_table)
+                }
+                for model in models if model._meta.db_table in source_tables
+            }
+        for model in models:
+            if model._meta.db_table not in source_columns:
+                continue
+            # Columns added after the split take their defaults
+            fields = [
+                field.attname for field in model._meta.concrete_fields
+                if field.column in source_columns[model._meta.db_table]
+            ]
+            rows = model.objects.using(source).order_by('pk').values(*fields)
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING(f'  Would copy {rows.count()} {model.__name__} rows'))
+                continue
+
+            copied = 0
+            total = 0
+            batch = []
+            for row in rows.iterator(chunk_size=options['batch_size']):
+                total += 1
+                batch.append(model(**row))
+                if len(batch) >= options['batch_size']:
+                    copied += self.copy(model, batch, target)
+                    batch = []
+            copied += self.copy(model, batch, target)
+            self.stdout.write(self.style.SUCCESS(
+                f'  Copied {copied} {model.__name__} rows; {total - copied} already present were kept'
+            ))
+
+    def copy(self, model, batch, target):
+        """Insert the rows of batch missing from target; returns how many were inserted"""
+        if not batch:
+            return 0
+        present = model.objects.using(target).filter(pk__in=[row.pk for row in batch])
+        with transaction.atomic(using=target):
+            before = present.count()
+            model.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+            return present.count() - before
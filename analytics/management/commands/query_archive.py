@@ -0,0 +1,39 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.retention import ARCHIVED_MODELS, load_archive
+from core.nplusone import RepeatedQueryCheckMixin
+
+
+class Command(RepeatedQueryCheckMixin, BaseCommand):
+    help = 'Run an ad-hoc SQL query against archived analytics days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(ARCHIVED_MODELS), help='Archived table to load')
+        parser.add_argument('start', type=date.fromisoformat, help='First day to load (YYYY-MM-DD)')
+        parser.add_argument('end', type=date.fromisoformat, help='Day after the last day to load (YYYY-MM-DD)')
+        parser.add_argument(
+            '--sql',
+            help='Query to run; the table is named after the archived table (default: row count)',
+        )
+        parser.add_argument(
+            '--save',
+            help='Write the loaded rows to this SQLite file instead of an in-memory database',
+        )
+
+    def handle(self, *args, **options):
+        table = options['table']
+        sql = options['sql'] or f'SELECT count(*) FROM {table}'
+
+        connection = load_archive(table, options['start'], options['end'], database=options['save'] or ':memory:')
+        try:
+            cursor = connection.execute(sql)
+        except Exception as e:
+            raise CommandError(f'Query failed: {e}')
+
+        if cursor.description:
+            self.stdout.write('\t'.join(column[0] for column in cursor.description))
+        for row in cursor:
+            self.stdout.write('\t'.join('' if value is None else str(value) for value in row))
+        connection.close()
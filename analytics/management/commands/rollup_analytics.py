@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.utils import rollup_page_views, rollup_social_shares
+
+
+class Command(BaseCommand):
+    help = 'Roll up new page views and social shares into the daily analytics tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of raw rows consumed per transaction',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running as a worker instead of exiting once caught up',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds to sleep between passes when running with --loop',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            page_views = self.drain(rollup_page_views, batch_size)
+            shares = self.drain(rollup_social_shares, batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Rolled up {page_views} page views and {shares} social shares'))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def drain(self, rollup, batch_size):
+        """Run a rollup function until it has caught up with the raw table"""
+        total = 0
+        while True:
+            consumed = rollup(batch_size=batch_size)
+            total += consumed
+            if consumed < batch_size:
+                return total
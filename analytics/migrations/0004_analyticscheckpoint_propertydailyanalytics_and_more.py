@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_socialshareanalytics_socialshare'),
+        ('properties', '0008_alter_image_options_image_created_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PropertyDailyAnalytics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.IntegerField(default=0)),
+                ('unique_viewers', models.IntegerField(default=0)),
+                ('total_time_spent', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['timestamp'], name='analytics_p_timesta_835321_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['property', 'timestamp'], name='analytics_p_propert_c8ca10_idx'),
+        ),
+        migrations.AddField(
+            model_name='propertydailyanalytics',
+            name='property',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_analytics', to='properties.property'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='propertydailyanalytics',
+            unique_together={('property', 'date')},
+        ),
+    ]
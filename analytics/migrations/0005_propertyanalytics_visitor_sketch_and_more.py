@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_analyticscheckpoint_propertydailyanalytics_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyanalytics',
+            name='visitor_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='propertydailyanalytics',
+            name='visitor_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='socialshareanalytics',
+            name='visitor_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='trafficanalytics',
+            name='visitor_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
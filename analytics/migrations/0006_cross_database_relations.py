@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_propertyanalytics_visitor_sketch_and_more'),
+        ('blog', '0002_blogpost_excerpt_blogpost_is_published_blogpost_slug_and_more'),
+        ('properties', '0010_property_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pageview',
+            name='property',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='page_views', to='properties.property'),
+        ),
+        migrations.AlterField(
+            model_name='pageview',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='propertyanalytics',
+            name='property',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='analytics', to='properties.property'),
+        ),
+        migrations.AlterField(
+            model_name='propertydailyanalytics',
+            name='property',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='daily_analytics', to='properties.property'),
+        ),
+        migrations.AlterField(
+            model_name='socialshare',
+            name='blog_post',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='social_shares', to='blog.blogpost'),
+        ),
+        migrations.AlterField(
+            model_name='socialshare',
+            name='property',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='social_shares', to='properties.property'),
+        ),
+        migrations.AlterField(
+            model_name='socialshare',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='useractivity',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_cross_database_relations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trafficanalytics',
+            name='raw_rows_purged',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -4,9 +4,13 @@ from properties.models import Property
 from blog.models import BlogPost
 from django.utils import timezone
 
+# The analytics app can live in its own database (see real_estate.routers), so its
+# foreign keys to users, properties and blog posts carry no database constraint and
+# no ORM cascade; analytics.signals applies the deletions instead.
+
 class PageView(models.Model):
-    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='page_views', null=True, blank=True)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    property = models.ForeignKey(Property, on_delete=models.DO_NOTHING, db_constraint=False, related_name='page_views', null=True, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True)
     url = models.URLField(blank=True, null=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     user_agent = models.TextField(blank=True)
@@ -15,6 +19,12 @@ class PageView(models.Model):
     referrer = models.URLField(blank=True, null=True)
     time_spent = models.IntegerField(default=0)  # in seconds
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['property', 'timestamp']),
+        ]
+
     def __str__(self):
         return f"{self.url or self.property.title if self.property else 'Unknown'} viewed by {self.user.username if self.user else 'Anonymous'} at {self.timestamp}"
 
@@ -32,7 +42,7 @@ class UserActivity(models.Model):
         ('profile_update', 'Profile Updated'),
     )
 
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False)
     activity_type = models.CharField(max_length=50, choices=ACTIVITY_CHOICES)
     description = models.TextField()
     ip_address = models.GenericIPAddressField(blank=True, null=True)
@@ -49,6 +59,8 @@ class TrafficAnalytics(models.Model):
     page_views = models.IntegerField(default=0)
     bounce_rate = models.FloatField(default=0.0)
     avg_session_duration = models.IntegerField(default=0)  # in seconds
+    visitor_sketch = models.BinaryField(default=b'', blank=True)  # HyperLogLog of visitors
+    raw_rows_purged = models.BooleanField(default=False)  # page views archived (analytics.retention); late ones are added
 
     class Meta:
         unique_together = ('date',)
@@ -57,16 +69,41 @@ class TrafficAnalytics(models.Model):
         return f"Traffic Analytics for {self.date}"
 
 class PropertyAnalytics(models.Model):
-    property = models.OneToOneField(Property, on_delete=models.CASCADE, related_name='analytics')
+    property = models.OneToOneField(Property, on_delete=models.DO_NOTHING, db_constraint=False, related_name='analytics')
     total_views = models.IntegerField(default=0)
     unique_viewers = models.IntegerField(default=0)
     avg_time_on_page = models.IntegerField(default=0)  # in seconds
     inquiry_count = models.IntegerField(default=0)
     last_viewed = models.DateTimeField(null=True, blank=True)
+    visitor_sketch = models.BinaryField(default=b'', blank=True)  # HyperLogLog of viewers
 
     def __str__(self):
         return f"Analytics for {self.property.title}"
 
+class PropertyDailyAnalytics(models.Model):
+    property = models.ForeignKey(Property, on_delete=models.DO_NOTHING, db_constraint=False, related_name='daily_analytics')
+    date = models.DateField()
+    views = models.IntegerField(default=0)
+    unique_viewers = models.IntegerField(default=0)
+    total_time_spent = models.IntegerField(default=0)  # in seconds
+    visitor_sketch = models.BinaryField(default=b'', blank=True)  # HyperLogLog of viewers
+
+    class Meta:
+        unique_together = ('property', 'date')
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Analytics for property {self.property_id} on {self.date}"
+
+class AnalyticsCheckpoint(models.Model):
+    """Persisted watermark: the highest raw event id already rolled up by a job"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} rolled up to #{self.last_id}"
+
 class SocialShare(models.Model):
     PLATFORM_CHOICES = (
         ('facebook', 'Facebook'),
@@ -88,9 +125,9 @@ class SocialShare(models.Model):
         ('other', 'Other Page'),
     )
 
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
-    property = models.ForeignKey(Property, on_delete=models.CASCADE, null=True, blank=True, related_name='social_shares')
-    blog_post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, null=True, blank=True, related_name='social_shares')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True)
+    property = models.ForeignKey(Property, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='social_shares')
+    blog_post = models.ForeignKey(BlogPost, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='social_shares')
 
     platform = models.CharField(max_length=20, choices=PLATFORM_CHOICES)
     content_type = models.CharField(max_length=20, choices=CONTENT_TYPE_CHOICES, default='other')
@@ -130,6 +167,7 @@ class SocialShareAnalytics(models.Model):
     property_shares = models.IntegerField(default=0)
     blog_shares = models.IntegerField(default=0)
     other_shares = models.IntegerField(default=0)
+    visitor_sketch = models.BinaryField(default=b'', blank=True)  # HyperLogLog of sharers
 
     class Meta:
         unique_together = ('date', 'platform')
@@ -0,0 +1,179 @@
+"""
+Retention for the raw tracking tables: archive old rows to compressed files, then purge them.
+
+Rows older than the retention window are written to gzip'd JSON Lines files partitioned
+by table and day::
+
+    <ANALYTICS_ARCHIVE_ROOT>/<table>/<YYYY>/<MM>/<YYYY-MM-DD>.<first id>-<last id>.jsonl.gz
+
+and only deleted once their file is complete. Deletes run in small primary-key ranges,
+each in its own short transaction, so tracking writers are never blocked for long.
+Rows the rollup job has not consumed yet are never archived, and days whose page views
+are purged are flagged (TrafficAnalytics.raw_rows_purged) so the rollup adds late rows
+to their totals rather than recomputing them from what is left.
+"""
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.db.models import Min
+from django.utils import timezone
+
+from real_estate.db import immediate_atomic
+
+from .models import AnalyticsCheckpoint, PageView, SocialShare, TrafficAnalytics
+from .utils import PAGE_VIEW_CHECKPOINT, SOCIAL_SHARE_CHECKPOINT, day_range
+
+ARCHIVED_MODELS = {
+    'pageview': (PageView, PAGE_VIEW_CHECKPOINT),
+    'socialshare': (SocialShare, SOCIAL_SHARE_CHECKPOINT),
+}
+
+
+def archive_root():
+    return Path(settings.ANALYTICS_ARCHIVE_ROOT)
+
+
+def retention_cutoff(days=None):
+    """Start of the oldest day that is kept in the live tables"""
+    days = settings.ANALYTICS_RETENTION_DAYS if days is None else days
+    start, _ = day_range(timezone.localdate() - timedelta(days=days))
+    return start
+
+
+def archive_and_purge(name, cutoff, queryset=None, batch_size=None, dry_run=False):
+    """
+    Archive and delete rows of ARCHIVED_MODELS[name] with a timestamp before cutoff.
+
+    queryset optionally narrows the candidate rows (e.g. an admin selection).
+    Returns (archived_rows, archive_files).
+    """
+    model, checkpoint_name = ARCHIVED_MODELS[name]
+    batch_size = batch_size or settings.ANALYTICS_PURGE_BATCH_SIZE
+    rolled_up_to = AnalyticsCheckpoint.objects.filter(name=checkpoint_name).values_list('last_id', flat=True).first() or 0
+
+    candidates = (queryset if queryset is not None else model.objects.all()).order_by().filter(
+        timestamp__lt=cutoff, id__lte=rolled_up_to
+    )
+
+    archived = 0
+    files = []
+    while True:
+        oldest = candidates.aggregate(oldest=Min('timestamp'))['oldest']
+        if oldest is None:
+            break
+
+        day = timezone.localdate(oldest)
+        start, end = day_range(day)
+        day_rows = candidates.filter(timestamp__gte=start, timestamp__lt=min(end, cutoff))
+        if dry_run:
+            archived += day_rows.count()
+            candidates = candidates.filter(timestamp__gte=end)
+            continue
+
+        path, id_ranges, count = _write_day_archive(name, day, day_rows, batch_size)
+        if model is PageView:
+            TrafficAnalytics.objects.filter(date=day).update(raw_rows_purged=True)
+        for first_id, last_id in id_ranges:
+            with immediate_atomic(using=router.db_for_write(model)):
+                day_rows.filter(id__gte=first_id, id__lte=last_id).delete()
+
+        archived += count
+        files.append(path)
+
+    return archived, files
+
+
+def _write_day_archive(name, day, rows, batch_size):
+    """Write one day of rows to its archive file; returns (path, id ranges to delete, row count)"""
+    directory = archive_root() / name / f'{day:%Y}' / f'{day:%m}'
+    directory.mkdir(parents=True, exist_ok=True)
+
+    id_ranges = []
+    count = 0
+    first_id = batch_first_id = last_id = None
+    # A file name of its own, so concurrent runs never write into each other's file
+    tmp = tempfile.NamedTemporaryFile(dir=directory, prefix=f'{day.isoformat()}.', suffix='.partial', delete=False)
+    with tmp, gzip.open(tmp, 'wt', encoding='utf-8') as archive:
+        for row in rows.order_by('id').values().iterator(chunk_size=batch_size):
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder))
+            archive.write('\n')
+            count += 1
+            last_id = row['id']
+            if first_id is None:
+                first_id = last_id
+            if batch_first_id is None:
+                batch_first_id = last_id
+            if count % batch_size == 0:
+                id_ranges.append((batch_first_id, last_id))
+                batch_first_id = None
+        if batch_first_id is not None:
+            id_ranges.append((batch_first_id, last_id))
+
+    path = directory / f'{day.isoformat()}.{first_id}-{last_id}.jsonl.gz'
+    os.replace(tmp.name, path)
+    return path, id_ranges, count
+
+
+def archived_files(name, start_date, end_date):
+    """Archive files of a table for days in [start_date, end_date)"""
+    root = archive_root() / name
+    if not root.exists():
+        return []
+    paths = []
+    for path in sorted(root.glob('*/*/*.jsonl.gz')):
+        day = date.fromisoformat(path.name.split('.', 1)[0])
+        if start_date <= day < end_date:
+            paths.append(path)
+    return paths
+
+
+def iter_archived_rows(name, start_date, end_date):
+    """Yield archived rows (as dicts) of a table for days in [start_date, end_date)"""
+    seen = set()
+    for path in archived_files(name, start_date, end_date):
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                row = json.loads(line)
+                # A purge interrupted after its file was written re-archives the
+                # surviving rows on the next run, so skip ids already yielded
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                yield row
+
+
+def load_archive(name, start_date, end_date, database=':memory:'):
+    """
+    Load archived days into a standalone SQLite database for ad-hoc reports.
+
+    Returns an open sqlite3 connection with one table named after the archived table,
+    e.g. ``load_archive('pageview', ...).execute('SELECT count(*) FROM pageview')``.
+    """
+    model, _ = ARCHIVED_MODELS[name]
+    columns = [field.attname for field in model._meta.concrete_fields]
+
+    connection = sqlite3.connect(database)
+    connection.execute(f'CREATE TABLE IF NOT EXISTS {name} ({", ".join(columns)})')
+    insert = f'INSERT INTO {name} VALUES ({", ".join("?" * len(columns))})'
+
+    batch = []
+    for row in iter_archived_rows(name, start_date, end_date):
+        batch.append([
+            json.dumps(row.get(column)) if isinstance(row.get(column), (dict, list)) else row.get(column)
+            for column in columns
+        ])
+        if len(batch) >= 1000:
+            connection.executemany(insert, batch)
+            batch = []
+    if batch:
+        connection.executemany(insert, batch)
+    connection.commit()
+    return connection
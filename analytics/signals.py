@@ -0,0 +1,44 @@
+"""
+Apply the deletions the analytics foreign keys can no longer cascade across databases.
+
+Run once the deleting transaction commits, so a rolled back delete leaves the
+analytics rows alone.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from blog.models import BlogPost
+from properties.models import Property
+
+from .models import PageView, PropertyAnalytics, PropertyDailyAnalytics, SocialShare, UserActivity
+
+
+@receiver(post_delete, sender=Property)
+def delete_property_analytics(sender, instance, using, **kwargs):
+    property_id = instance.pk
+
+    def cleanup():
+        for model in (PageView, SocialShare, PropertyAnalytics, PropertyDailyAnalytics):
+            model.objects.filter(property_id=property_id).delete()
+
+    transaction.on_commit(cleanup, using=using)
+
+
+@receiver(post_delete, sender=BlogPost)
+def delete_blog_post_shares(sender, instance, using, **kwargs):
+    blog_post_id = instance.pk
+    transaction.on_commit(lambda: SocialShare.objects.filter(blog_post_id=blog_post_id).delete(), using=using)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def detach_user_analytics(sender, instance, using, **kwargs):
+    user_id = instance.pk
+
+    def cleanup():
+        PageView.objects.filter(user_id=user_id).update(user=None)
+        SocialShare.objects.filter(user_id=user_id).update(user=None)
+        UserActivity.objects.filter(user_id=user_id).delete()
+
+    transaction.on_commit(cleanup, using=using)
@@ -1,3 +1,617 @@
-from django.test import TestCase
+import json
+import random
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from blog.models import BlogPost
+from properties.models import Property, PropertyType
+from real_estate.db import increment_counters
+from real_estate.routers import AnalyticsRouter
+
+from .buffer import ingest_buffer
+from .hyperloglog import STANDARD_ERROR, HyperLogLog
+from .ingest import MAX_BATCH_EVENTS
+from .retention import archive_and_purge, archived_files, load_archive, retention_cutoff
+from .models import (
+    AnalyticsCheckpoint, PageView, PropertyAnalytics, PropertyDailyAnalytics, SocialShare, SocialShareAnalytics,
+    TrafficAnalytics, UserActivity,
+)
+from .utils import (
+    PAGE_VIEW_CHECKPOINT, SOCIAL_SHARE_CHECKPOINT, rollup_page_views, rollup_social_shares, share_counter_row,
+    unique_sharers_between, unique_visitors_between,
+)
+
+
+class SocialShareCounterConcurrencyTests(TransactionTestCase):
+    """Parallel share requests must not lose counter updates"""
+
+    databases = {'default', 'analytics'}
+    threads = 8
+    shares_per_thread = 25
+
+    def test_parallel_shares_produce_exact_totals(self):
+        errors = []
+
+        def share(platform, content_type):
+            client = Client()
+            try:
+                for _ in range(self.shares_per_thread):
+                    response = client.post(
+                        '/analytics/track-share/',
+                        json.dumps({'platform': platform, 'content_type': content_type, 'url': 'https://example.com/'}),
+                        content_type='application/json',
+                        HTTP_HOST='localhost',
+                    )
+                    if response.status_code != 200:
+                        errors.append(response.content)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=share, args=('facebook', 'blog_post' if i % 2 else 'homepage'))
+            for i in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        expected = self.threads * self.shares_per_thread
+        self.assertEqual(SocialShare.objects.count(), expected)
+
+        analytics = SocialShareAnalytics.objects.get(platform='facebook')
+        self.assertEqual(analytics.total_shares, expected)
+        self.assertEqual(analytics.blog_shares, expected // 2)
+        self.assertEqual(analytics.other_shares, expected // 2)
+        self.assertEqual(analytics.property_shares, 0)
+
+
+@override_settings(INGEST_BUFFER_FLUSH_SECONDS=3600, INGEST_BUFFER_MAX_EVENTS=1000)
+class AsyncTrackingTests(TestCase):
+    """The async endpoints answer before writing; the buffer writes on flush"""
+
+    databases = {'default', 'analytics'}
+
+    async def test_events_are_written_when_the_buffer_flushes(self):
+        client = AsyncClient()
+        share = await client.post(
+            '/analytics/async/track-share/',
+            json.dumps({'platform': 'facebook', 'content_type': 'homepage', 'url': 'https://example.com/'}),
+            content_type='application/json',
+        )
+        batch = await client.post(
+            '/analytics/async/track-batch/',
+            json.dumps({'events': [{'type': 'page_view', 'url': '/'}, {'type': 'share', 'platform': 'nope'}]}),
+            content_type='text/plain',
+        )
+        self.assertEqual((share.status_code, batch.status_code), (204, 204))
+        self.assertEqual(await SocialShare.objects.acount(), 0)
+
+        self.assertEqual(await sync_to_async(ingest_buffer.flush)(), (2, 1))
+        self.assertEqual(await SocialShare.objects.acount(), 1)
+        self.assertEqual(await PageView.objects.acount(), 1)
+        analytics = await SocialShareAnalytics.objects.aget(platform='facebook')
+        self.assertEqual(analytics.total_shares, 1)
+
+    async def test_invalid_share_is_rejected_up_front(self):
+        response = await AsyncClient().post(
+            '/analytics/async/track-share/', json.dumps({'platform': 'nope'}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+def at_noon(day):
+    return timezone.make_aware(datetime.combine(day, time(12)))
+
+
+def add_page_views(views):
+    """Create PageViews from (day, property, session_key) tuples, timestamped at noon that day"""
+    created = PageView.objects.bulk_create(
+        PageView(property=property_obj, session_key=session_key, time_spent=30)
+        for _, property_obj, session_key in views
+    )
+    by_day = {}
+    for page_view, (day, _, _) in zip(created, views):
+        by_day.setdefault(day, []).append(page_view.pk)
+    for day, ids in by_day.items():
+        PageView.objects.filter(pk__in=ids).update(timestamp=at_noon(day))
+
+
+class TrackEventBatchTests(TestCase):
+    """The synchronous batch endpoint: validation and the number of queries per batch"""
+
+    databases = {'default', 'analytics'}
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', 'owner@example.com', 'pw')
+        flat = PropertyType.objects.create(name='Flat')
+        cls.listings = [
+            Property.objects.create(
+                user=owner, title=f'Flat {i}', description='-', property_type=flat,
+                address='-', city='Kathmandu', state='Bagmati', zip_code='44600', price=1000,
+            )
+            for i in range(3)
+        ]
+
+    def post(self, body):
+        return self.client.post('/analytics/track-batch/', json.dumps(body), content_type='text/plain')
+
+    def test_unknown_properties_and_non_dict_events_are_rejected(self):
+        unknown = max(listing.pk for listing in self.listings) + 1
+        events = [
+            *({'type': 'page_view', 'property_id': listing.pk, 'url': '/'} for listing in self.listings),
+            {'type': 'page_view', 'property_id': unknown, 'url': '/'},
+            {'type': 'share', 'platform': 'facebook', 'content_type': 'property', 'content_id': unknown},
+            'page_view',
+            None,
+        ]
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.post({'events': events})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'success': True, 'accepted': 4, 'rejected': 3})
+        self.assertEqual(len([query for query in queries if 'properties_property' in query['sql']]), 1)
+        self.assertEqual(
+            sorted(PageView.objects.values_list('property_id', flat=True)), sorted(listing.pk for listing in self.listings),
+        )
+        self.assertIsNone(SocialShare.objects.get().property_id)
+
+    def test_events_past_the_limit_are_rejected(self):
+        response = self.post([{'type': 'page_view', 'url': '/'}] * (MAX_BATCH_EVENTS + 5))
+        self.assertEqual(response.json(), {'success': True, 'accepted': MAX_BATCH_EVENTS, 'rejected': 5})
+        self.assertEqual(PageView.objects.count(), MAX_BATCH_EVENTS)
+
+    def test_body_must_hold_a_list(self):
+        for body in ({'events': 'page_view'}, 'page_view', {'type': 'page_view'}):
+            with self.subTest(body=body):
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['message'], 'Expected a list of events')
+        self.assertFalse(PageView.objects.exists())
+
+    def test_share_counters_are_upserted_once_per_batch(self):
+        events = [
+            {'type': 'share', 'platform': platform, 'content_type': 'property', 'content_id': listing.pk}
+            for listing in self.listings
+            for platform in ('facebook', 'whatsapp')
+        ] * 2
+        with CaptureQueriesContext(connections['analytics']) as queries:
+            self.post(events)
+
+        upserts = [query for query in queries if 'INTO "analytics_socialshareanalytics"' in query['sql']]
+        self.assertEqual(len(upserts), 1)
+        self.assertEqual(
+            dict(SocialShareAnalytics.objects.values_list('platform', 'property_shares')), {'facebook': 6, 'whatsapp': 6},
+        )
+
+
+class PageViewRollupTests(TestCase):
+    databases = {'default', 'analytics'}
+    days = [date(2026, 3, 2), date(2026, 3, 3), date(2026, 3, 4)]
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', 'owner@example.com', 'pw')
+        cls.listing = Property.objects.create(
+            user=owner, title='Listing', description='-', address='-', city='Kathmandu', state='Bagmati',
+            zip_code='44600', price=1000,
+        )
+
+    def setUp(self):
+        rng = random.Random(26)
+        self.views = [
+            (rng.choice(self.days), self.listing if rng.random() < 0.5 else None, f'visitor{rng.randrange(1500)}')
+            for _ in range(4000)
+        ]
+        add_page_views(self.views)
+
+    def rollup_rows(self):
+        return (
+            list(TrafficAnalytics.objects.order_by('date').values()),
+            list(PropertyDailyAnalytics.objects.order_by('date').values()),
+            list(PropertyAnalytics.objects.values()),
+        )
+
+    def test_rolling_up_again_gives_the_same_rows(self):
+        self.assertEqual(rollup_page_views(batch_size=1000), 1000)
+        while rollup_page_views(batch_size=1000):
+            pass
+        rows = self.rollup_rows()
+        self.assertEqual(sum(row['total_views'] for row in rows[0]), len(self.views))
+
+        self.assertEqual(rollup_page_views(), 0)
+        self.assertEqual(self.rollup_rows(), rows)
+
+        # Replaying every raw row (a lost watermark) recomputes the same aggregates
+        AnalyticsCheckpoint.objects.filter(name=PAGE_VIEW_CHECKPOINT).update(last_id=0)
+        self.assertEqual(rollup_page_views(batch_size=10000), len(self.views))
+        self.assertEqual(self.rollup_rows(), rows)
+
+    def test_watermark_advances_and_late_rows_are_picked_up(self):
+        rollup_page_views(batch_size=10000)
+        checkpoint = AnalyticsCheckpoint.objects.get(name=PAGE_VIEW_CHECKPOINT)
+        self.assertEqual(checkpoint.last_id, PageView.objects.latest('pk').pk)
+        first_day = TrafficAnalytics.objects.get(date=self.days[0])
+
+        # Rows for an earlier day that arrive after its rollup
+        add_page_views([(self.days[0], self.listing, 'late1'), (self.days[0], None, 'late2')])
+        self.assertEqual(rollup_page_views(), 2)
+
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.last_id, PageView.objects.latest('pk').pk)
+        late_day = TrafficAnalytics.objects.get(date=self.days[0])
+        self.assertEqual(late_day.total_views, first_day.total_views + 2)
+        day_visitors = HyperLogLog()
+        day_visitors.update(f's:{key}' for day, _, key in self.views if day == self.days[0])
+        day_visitors.update(['s:late1', 's:late2'])
+        self.assertEqual(late_day.unique_visitors, day_visitors.count())
+        lifetime = PropertyAnalytics.objects.get(property=self.listing)
+        self.assertEqual(
+            lifetime.total_views,
+            sum(1 for _, property_obj, _ in self.views if property_obj) + 1,
+        )
+        # The late view was on the first day; the last view is still on the last
+        self.assertEqual(timezone.localdate(lifetime.last_viewed), self.days[-1])
+
+    def test_unique_visitors_are_within_the_stated_error(self):
+        rollup_page_views(batch_size=10000)
+        exact = len({session_key for _, _, session_key in self.views})
+        estimate = unique_visitors_between(self.days[0], self.days[-1] + timedelta(days=1))
+        self.assertLessEqual(abs(estimate - exact), 3 * STANDARD_ERROR * exact)
+
+        # Past the small-range correction too
+        sketch = HyperLogLog()
+        sketch.update(f'visitor{i}' for i in range(50000))
+        self.assertLessEqual(abs(sketch.count() - 50000), 3 * STANDARD_ERROR * 50000)
+
+    def test_merged_daily_sketches_match_one_sketch_over_the_range(self):
+        rollup_page_views(batch_size=10000)
+        whole_range = HyperLogLog()
+        whole_range.update(f's:{session_key}' for _, _, session_key in self.views)
+
+        merged = HyperLogLog.merged(TrafficAnalytics.objects.values_list('visitor_sketch', flat=True))
+        self.assertEqual(merged.registers, whole_range.registers)
+        self.assertEqual(
+            unique_visitors_between(self.days[0], self.days[-1] + timedelta(days=1)), whole_range.count(),
+        )
+
+
+class RetentionTests(TestCase):
+    databases = {'default', 'analytics'}
+    day = date(2026, 3, 2)  # past the retention window
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', 'owner@example.com', 'pw')
+        cls.listing = Property.objects.create(
+            user=owner, title='Listing', description='-', address='-', city='Kathmandu', state='Bagmati',
+            zip_code='44600', price=1000,
+        )
+
+    def setUp(self):
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        settings_override = override_settings(ANALYTICS_ARCHIVE_ROOT=archive_root.name, ANALYTICS_PURGE_BATCH_SIZE=7)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        add_page_views(
+            [(self.day, self.listing if i % 2 else None, f'visitor{i % 20}') for i in range(50)]
+            + [(timezone.localdate(), self.listing, 'recent')]
+        )
+        rollup_page_views()
+
+    def test_only_rolled_up_rows_past_the_cutoff_are_archived(self):
+        add_page_views([(self.day, None, 'not-rolled-up')])
+
+        self.assertEqual(archive_and_purge('pageview', retention_cutoff(), dry_run=True), (50, []))
+        self.assertEqual(PageView.objects.count(), 52)
+
+        archived, files = archive_and_purge('pageview', retention_cutoff())
+
+        self.assertEqual((archived, len(files)), (50, 1))
+        self.assertEqual(list(PageView.objects.values_list('session_key', flat=True).order_by('pk')), ['recent', 'not-rolled-up'])
+        self.assertEqual(archived_files('pageview', self.day, self.day + timedelta(days=1)), files)
+        archive = load_archive('pageview', self.day, self.day + timedelta(days=1))
+        self.assertEqual(archive.execute('SELECT count(*), count(DISTINCT session_key) FROM pageview').fetchone(), (50, 20))
+        # Nothing but the finished archive is left in its directory
+        self.assertEqual(list(files[0].parent.iterdir()), files)
+
+    def test_late_rows_for_a_purged_day_add_to_its_totals(self):
+        before = TrafficAnalytics.objects.get(date=self.day)
+        property_day_before = PropertyDailyAnalytics.objects.get(property=self.listing, date=self.day)
+        archive_and_purge('pageview', retention_cutoff())
+        self.assertTrue(TrafficAnalytics.objects.get(date=self.day).raw_rows_purged)
+
+        add_page_views([(self.day, self.listing, 'late1'), (self.day, None, 'late2')])
+        self.assertEqual(rollup_page_views(), 2)
+
+        after = TrafficAnalytics.objects.get(date=self.day)
+        self.assertEqual((after.total_views, after.page_views), (before.total_views + 2, before.page_views + 1))
+        self.assertEqual(
+            (after.bounce_rate, after.avg_session_duration), (before.bounce_rate, before.avg_session_duration),
+        )
+        visitors = HyperLogLog()
+        visitors.update([f's:visitor{i}' for i in range(20)] + ['s:late1', 's:late2'])
+        self.assertEqual(after.unique_visitors, visitors.count())
+
+        property_day = PropertyDailyAnalytics.objects.get(property=self.listing, date=self.day)
+        self.assertEqual(property_day.views, property_day_before.views + 1)
+        self.assertEqual(property_day.total_time_spent, property_day_before.total_time_spent + 30)
+        # 25 purged views of the day, the late one and today's
+        self.assertEqual(PropertyAnalytics.objects.get(property=self.listing).total_views, 27)
+
+
+def add_shares(shares):
+    """Record SocialShares from (day, platform, content_type, session_key) tuples the way the endpoints do"""
+    created = SocialShare.objects.bulk_create(
+        SocialShare(
+            platform=platform, content_type=content_type, session_key=session_key,
+            url_shared='https://example.com/', page_title='Home',
+        )
+        for _, platform, content_type, session_key in shares
+    )
+    for share, (day, _, _, _) in zip(created, shares):
+        share.timestamp = at_noon(day)
+        SocialShare.objects.filter(pk=share.pk).update(timestamp=share.timestamp)
+    increment_counters(SocialShareAnalytics, ['date', 'platform'], [share_counter_row(share) for share in created])
+
+
+class SocialShareRollupTests(TestCase):
+    databases = {'default', 'analytics'}
+    start = date(2026, 1, 26)  # a Monday
+    end = date(2026, 3, 10)
+
+    def setUp(self):
+        cache.clear()
+        rng = random.Random(27)
+        span = (self.end - self.start).days + 1
+        self.shares = [
+            (
+                self.start + timedelta(days=rng.randrange(span)),
+                rng.choice(['facebook', 'whatsapp', 'email']),
+                rng.choice(['property', 'blog_post', 'homepage']),
+                f'sharer{rng.randrange(300)}',
+            )
+            for _ in range(600)
+        ]
+        add_shares(self.shares)
+
+    def get_stats(self, granularity):
+        response = self.client.get('/analytics/share-stats/', {
+            'start': self.start.isoformat(), 'end': self.end.isoformat(), 'granularity': granularity,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def expected_series(self, granularity):
+        """Share counts per period straight from the raw SocialShare rows"""
+        counts = {}
+        for share in SocialShare.objects.all():
+            day = timezone.localdate(share.timestamp)
+            if granularity == 'week':
+                day -= timedelta(days=day.weekday())
+            elif granularity == 'month':
+                day = day.replace(day=1)
+            counts[day.isoformat()] = counts.get(day.isoformat(), 0) + 1
+        return [{'date': period, 'total_shares': count} for period, count in sorted(counts.items())]
+
+    def test_rolling_up_again_gives_the_same_rows(self):
+        self.assertEqual(rollup_social_shares(batch_size=250), 250)
+        while rollup_social_shares(batch_size=250):
+            pass
+        rows = list(SocialShareAnalytics.objects.order_by('date', 'platform').values())
+
+        self.assertEqual(rollup_social_shares(), 0)
+        AnalyticsCheckpoint.objects.filter(name=SOCIAL_SHARE_CHECKPOINT).update(last_id=0)
+        self.assertEqual(rollup_social_shares(batch_size=10000), len(self.shares))
+        self.assertEqual(list(SocialShareAnalytics.objects.order_by('date', 'platform').values()), rows)
+
+        sharers = HyperLogLog()
+        sharers.update(f's:{key}' for _, _, _, key in self.shares)
+        self.assertEqual(unique_sharers_between(self.start, self.end + timedelta(days=1)), sharers.count())
+
+    def test_shares_inserted_without_counters_get_their_rows(self):
+        day = self.end + timedelta(days=1)
+        for content_type in ('property', 'blog_post', 'homepage'):
+            SocialShare.objects.create(
+                platform='twitter', content_type=content_type, session_key=f'raw-{content_type}',
+                url_shared='https://example.com/', page_title='Home',
+            )
+        SocialShare.objects.filter(platform='twitter').update(timestamp=at_noon(day))
+
+        rollup_social_shares(batch_size=300)
+        self.assertFalse(SocialShareAnalytics.objects.filter(date=day).exists())
+        while rollup_social_shares(batch_size=300):
+            pass
+
+        row = SocialShareAnalytics.objects.get(date=day, platform='twitter')
+        self.assertEqual(
+            (row.total_shares, row.property_shares, row.blog_shares, row.other_shares, row.unique_users),
+            (3, 1, 1, 1, 3),
+        )
+
+    def test_stats_match_the_raw_shares_at_every_granularity(self):
+        rollup_social_shares()
+        for granularity in ('day', 'week', 'month'):
+            with self.subTest(granularity=granularity):
+                stats = self.get_stats(granularity)
+                self.assertEqual(stats['series'], self.expected_series(granularity))
+                self.assertEqual(stats['total_shares'], len(self.shares))
+                platform_totals = {row['platform']: row['total_shares'] for row in stats['platform_stats']}
+                for platform in ('facebook', 'whatsapp', 'email'):
+                    self.assertEqual(platform_totals[platform], SocialShare.objects.filter(platform=platform).count())
+
+    def test_stats_say_how_current_the_unique_sharers_are(self):
+        stats = self.get_stats('day')
+        self.assertIsNone(stats['unique_users_as_of'])
+        self.assertEqual(stats['total_shares'], len(self.shares))
+        self.assertEqual({row['unique_users'] for row in stats['platform_stats']}, {0})
+
+        while rollup_social_shares():
+            pass
+        cache.clear()
+        stats = self.get_stats('day')
+        rolled_up_at = AnalyticsCheckpoint.objects.get(name=SOCIAL_SHARE_CHECKPOINT).updated_at
+        self.assertEqual(stats['unique_users_as_of'], rolled_up_at.isoformat())
+        self.assertTrue(all(row['unique_users'] > 0 for row in stats['platform_stats']))
+
+    def test_stats_follow_new_shares_once_the_cache_is_invalidated(self):
+        before = self.get_stats('week')
+        add_shares([(self.start, 'facebook', 'property', 'late-sharer')] * 3)
+
+        self.assertEqual(self.get_stats('week'), before)  # still cached
+        cache.clear()
+        for granularity in ('day', 'week', 'month'):
+            with self.subTest(granularity=granularity):
+                stats = self.get_stats(granularity)
+                self.assertEqual(stats['series'], self.expected_series(granularity))
+                self.assertEqual(stats['total_shares'], len(self.shares) + 3)
+
+
+class AnalyticsDatabaseTests(TestCase):
+    """Analytics rows live in another database: cleanup and filtering can't rely on joins or cascades"""
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.sharer = get_user_model().objects.create_user('sharer', 'sharer@example.com', 'pw')
+        self.other = get_user_model().objects.create_user('other', 'other@example.com', 'pw')
+        self.listing = Property.objects.create(
+            user=self.admin, title='Flat', description='-', property_type=PropertyType.objects.create(name='Flat'),
+            address='-', city='Kathmandu', state='Bagmati', zip_code='44600', price=1000,
+        )
+        self.post = BlogPost.objects.create(title='Post', slug='post', author=self.admin, content='-')
+
+    def share(self, platform, user, **fields):
+        fields = {'url_shared': 'https://example.com/', 'page_title': 'Page', **fields}
+        return SocialShare.objects.create(platform=platform, user=user, **fields)
+
+    def test_search_by_username_respects_the_list_filters(self):
+        facebook = self.share('facebook', self.sharer)
+        self.share('twitter', self.sharer)
+        titled = self.share('facebook', self.other, page_title='sharer tips')
+        self.client.force_login(self.admin)
+
+        response = self.client.get('/real-admin/analytics/socialshare/', {'platform__exact': 'facebook', 'q': 'sharer'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({share.pk for share in response.context['cl'].result_list}, {facebook.pk, titled.pk})
+
+    def test_deleting_a_property_deletes_its_analytics(self):
+        other_listing = Property.objects.create(
+            user=self.admin, title='House', description='-', address='-', city='Kathmandu', state='Bagmati',
+            zip_code='44600', price=1000,
+        )
+        for listing in (self.listing, other_listing):
+            PageView.objects.create(url='/properties/', property=listing)
+            self.share('facebook', None, property=listing)
+            PropertyAnalytics.objects.create(property=listing, total_views=1)
+            PropertyDailyAnalytics.objects.create(property=listing, date=date(2026, 1, 1), views=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.delete()
+
+        for model in (PageView, SocialShare, PropertyAnalytics, PropertyDailyAnalytics):
+            with self.subTest(model.__name__):
+                self.assertEqual(list(model.objects.values_list('property_id', flat=True)), [other_listing.pk])
+
+    def test_deleting_a_blog_post_deletes_its_shares(self):
+        self.share('facebook', None, blog_post=self.post, content_type='blog_post')
+        kept = self.share('facebook', None, content_type='homepage')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+
+        self.assertEqual(list(SocialShare.objects.values_list('pk', flat=True)), [kept.pk])
+
+    def test_deleting_a_user_detaches_their_analytics(self):
+        view = PageView.objects.create(url='/', user=self.sharer)
+        share = self.share('facebook', self.sharer)
+        UserActivity.objects.create(user=self.sharer, activity_type='login', description='-')
+        UserActivity.objects.create(user=self.other, activity_type='login', description='-')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sharer.delete()
+
+        view.refresh_from_db()
+        share.refresh_from_db()
+        self.assertIsNone(view.user_id)
+        self.assertIsNone(share.user_id)
+        self.assertEqual(list(UserActivity.objects.values_list('user_id', flat=True)), [self.other.pk])
+
+    def test_deletion_rolled_back_leaves_the_analytics(self):
+        PageView.objects.create(url='/properties/', property=self.listing)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.listing.delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertTrue(PageView.objects.exists())
+
+
+@override_settings(ANALYTICS_DATABASE='analytics')
+class AnalyticsRouterTests(TestCase):
+    def test_analytics_models_are_routed_to_the_analytics_database(self):
+        router = AnalyticsRouter()
+        for model, alias in (
+            (PageView, 'analytics'), (SocialShareAnalytics, 'analytics'),
+            (Property, 'default'), (get_user_model(), 'default'), (BlogPost, 'default'),
+        ):
+            with self.subTest(model.__name__):
+                self.assertEqual(router.db_for_read(model), alias)
+                self.assertEqual(router.db_for_write(model), alias)
+
+        self.assertTrue(router.allow_migrate('analytics', 'analytics', 'pageview'))
+        self.assertFalse(router.allow_migrate('default', 'analytics', 'pageview'))
+        self.assertTrue(router.allow_migrate('default', 'properties', 'property'))
+        self.assertFalse(router.allow_migrate('analytics', 'properties', 'property'))
+        self.assertTrue(router.allow_relation(PageView(), Property()))
+        self.assertIsNone(router.allow_relation(Property(), BlogPost()))
+
+
+class CopyAnalyticsDataTests(TransactionTestCase):
+    """Analytics rows left in the default database from before the split"""
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        with connections[DEFAULT_DB_ALIAS].schema_editor() as editor:
+            editor.create_model(PageView)
+        self.addCleanup(self.drop_legacy_table)
+
+    def drop_legacy_table(self):
+        with connections[DEFAULT_DB_ALIAS].schema_editor() as editor:
+            editor.delete_model(PageView)
+
+    def copy(self):
+        out = StringIO()
+        call_command('copy_analytics_data', '--batch-size', '3', stdout=out)
+        return out.getvalue()
+
+    def test_reports_only_rows_actually_inserted(self):
+        PageView.objects.using(DEFAULT_DB_ALIAS).bulk_create(PageView(url=f'/{i}/') for i in range(7))
+
+        self.assertIn('Copied 7 PageView rows; 0 already present were kept', self.copy())
+        self.assertIn('Copied 0 PageView rows; 7 already present were kept', self.copy())
+
+        PageView.objects.filter(url__in=['/2/', '/5/']).delete()
+        self.assertIn('Copied 2 PageView rows; 5 already present were kept', self.copy())
+        self.assertEqual(
+            sorted(PageView.objects.values_list('url', flat=True)), [f'/{i}/' for i in range(7)],
+        )
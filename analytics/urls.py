@@ -8,5 +8,12 @@ urlpatterns = [
 
     # Social sharing tracking
     path('track-share/', views.TrackSocialShare.as_view(), name='track_social_share'),
+    path('track-batch/', views.TrackEventBatch.as_view(), name='track_event_batch'),
     path('share-stats/', views.get_social_share_stats, name='social_share_stats'),
+
+    # Async endpoints, answered before the events are written (analytics.buffer)
+    path('async/track/<int:pk>/', views.track_event_async, name='track_event_async'),
+    path('async/track-share/', views.track_social_share_async, name='track_social_share_async'),
+    path('async/track-batch/', views.track_event_batch_async, name='track_event_batch_async'),
+    path('async/share-stats/', views.social_share_stats_async, name='social_share_stats_async'),
 ]
@@ -0,0 +1,403 @@
+"""
+Rollup helpers that turn raw PageView and SocialShare rows into the aggregate tables
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import router
+from django.db.models import Case, CharField, Count, Max, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, TruncDate
+from django.utils import timezone
+
+from real_estate.db import immediate_atomic
+
+from .hyperloglog import HyperLogLog
+from .models import (
+    AnalyticsCheckpoint, PageView, PropertyAnalytics, PropertyDailyAnalytics, SocialShare,
+    SocialShareAnalytics, TrafficAnalytics,
+)
+
+PAGE_VIEW_CHECKPOINT = 'page_views'
+SOCIAL_SHARE_CHECKPOINT = 'social_shares'
+
+# Touched days rolled up per aggregate query; bounded so the day__in list stays small
+ROLLUP_DAYS_PER_QUERY = 200
+
+SHARE_CONTENT_COUNTERS = {
+    'property': 'property_shares',
+    'blog_post': 'blog_shares',
+}
+
+
+def visitor_key_expression():
+    """SQL expression identifying a visitor: user id, else session key, else IP address"""
+    return Case(
+        When(user__isnull=False, then=Concat(Value('u:'), Cast('user_id', CharField()))),
+        When(~Q(session_key=''), then=Concat(Value('s:'), 'session_key')),
+        default=Concat(Value('ip:'), Coalesce('ip_address', Value(''))),
+        output_field=CharField(),
+    )
+
+
+def share_counter_row(social_share):
+    """Counter increments one SocialShare contributes to its SocialShareAnalytics row"""
+    return {
+        'date': timezone.localdate(social_share.timestamp),
+        'platform': social_share.platform,
+        'total_shares': 1,
+        SHARE_CONTENT_COUNTERS.get(social_share.content_type, 'other_shares'): 1,
+    }
+
+
+def day_range(day):
+    """Return the half-open [start, end) datetime range covering a local calendar day"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def rollup_page_views(batch_size=5000):
+    """
+    Roll up PageView rows added since the persisted watermark.
+
+    Every day (and property/day pair) touched by the new rows is recomputed from the
+    raw rows of that day only, up to the new watermark, then written with a bulk upsert.
+    The touched days are aggregated together, one grouped query per metric, rather
+    than day by day.
+    A day whose rows have since been archived and purged (raw_rows_purged, see
+    analytics.retention) can't be recomputed; the new rows are added to its stored
+    totals instead. Unique visitors come from HyperLogLog sketches that only absorb the
+    new rows. The aggregates and the watermark are committed together, so re-running
+    after a crash or running twice never double counts, and days that received no new
+    rows are never rescanned.
+
+    Returns the number of PageView rows consumed.
+    """
+    with immediate_atomic(using=router.db_for_write(AnalyticsCheckpoint)):
+        checkpoint, _ = AnalyticsCheckpoint.objects.select_for_update().get_or_create(
+            name=PAGE_VIEW_CHECKPOINT
+        )
+        pending = PageView.objects.filter(id__gt=checkpoint.last_id)
+        upper_id = pending.order_by('id').values_list('id', flat=True)[batch_size - 1:batch_size].first()
+        if upper_id is None:
+            upper_id = pending.aggregate(last_id=Max('id'))['last_id']
+        if upper_id is None:
+            return 0
+
+        batch = pending.filter(id__lte=upper_id)
+        consumed = 0
+        day_sketches = defaultdict(HyperLogLog)
+        property_day_sketches = defaultdict(HyperLogLog)
+        property_sketches = defaultdict(HyperLogLog)
+        new_rows = batch.annotate(
+            day=TruncDate('timestamp'), visitor=visitor_key_expression()
+        ).values_list('day', 'property_id', 'visitor')
+        for day, property_id, visitor in new_rows.iterator(chunk_size=2000):
+            consumed += 1
+            day_sketches[day].add(visitor)
+            if property_id is not None:
+                property_day_sketches[(property_id, day)].add(visitor)
+                property_sketches[property_id].add(visitor)
+
+        stored_days = {row.date: row for row in TrafficAnalytics.objects.filter(date__in=day_sketches)}
+        for day, stored in stored_days.items():
+            day_sketches[day].merge(HyperLogLog.from_bytes(stored.visitor_sketch))
+        stored_property_days = {
+            (row.property_id, row.date): row
+            for row in PropertyDailyAnalytics.objects.filter(
+                date__in={day for _, day in property_day_sketches},
+                property_id__in=property_sketches,
+            ).only('property_id', 'date', 'views', 'total_time_spent', 'visitor_sketch')
+            if (row.property_id, row.date) in property_day_sketches
+        }
+        for key, stored in stored_property_days.items():
+            property_day_sketches[key].merge(HyperLogLog.from_bytes(stored.visitor_sketch))
+
+        new = Q(id__gt=checkpoint.last_id)
+        traffic_rows = []
+        property_daily_rows = []
+        touched_days = sorted(day_sketches)
+        for offset in range(0, len(touched_days), ROLLUP_DAYS_PER_QUERY):
+            days = touched_days[offset:offset + ROLLUP_DAYS_PER_QUERY]
+            start, end = day_range(days[0])[0], day_range(days[-1])[1]
+            day_views = PageView.objects.filter(
+                timestamp__gte=start, timestamp__lt=end, id__lte=upper_id
+            ).annotate(day=TruncDate('timestamp')).filter(day__in=days)
+
+            day_totals = {
+                row['day']: row
+                for row in day_views.values('day').annotate(
+                    total_views=Count('id'),
+                    page_views=Count('id', filter=Q(property__isnull=False)),
+                    new_views=Count('id', filter=new),
+                    new_page_views=Count('id', filter=new & Q(property__isnull=False)),
+                    sessions=Count('session_key', distinct=True, filter=~Q(session_key='')),
+                    time_spent=Coalesce(Sum('time_spent'), 0),
+                )
+            }
+            # Sessions with a single view on their day, counted per day
+            bounced = Counter(
+                day_views.exclude(session_key='').values('day', 'session_key').annotate(
+                    views=Count('id')
+                ).filter(views=1).values_list('day', flat=True).iterator(chunk_size=2000)
+            )
+            for day in days:
+                stored_day = stored_days.get(day)
+                purged = stored_day is not None and stored_day.raw_rows_purged
+                traffic_rows.append(_build_traffic_row(
+                    day, day_totals[day], bounced[day], day_sketches[day], stored_day if purged else None,
+                ))
+
+            per_property = day_views.filter(property__isnull=False).values('day', 'property_id').annotate(
+                views=Count('id'),
+                new_views=Count('id', filter=new),
+                total_time_spent=Coalesce(Sum('time_spent'), 0),
+                new_time_spent=Coalesce(Sum('time_spent', filter=new), 0),
+            )
+            for row in per_property:
+                key = (row['property_id'], row['day'])
+                if key not in property_day_sketches:
+                    continue  # no new views for this property on this day
+                viewers = property_day_sketches[key]
+                stored_day = stored_days.get(row['day'])
+                if stored_day is not None and stored_day.raw_rows_purged:
+                    stored = stored_property_days.get(key)
+                    row['views'] = row['new_views'] + (stored.views if stored else 0)
+                    row['total_time_spent'] = row['new_time_spent'] + (stored.total_time_spent if stored else 0)
+                property_daily_rows.append(PropertyDailyAnalytics(
+                    property_id=row['property_id'],
+                    date=row['day'],
+                    views=row['views'],
+                    unique_viewers=viewers.count(),
+                    total_time_spent=row['total_time_spent'],
+                    visitor_sketch=viewers.to_bytes(),
+                ))
+
+        TrafficAnalytics.objects.bulk_create(
+            traffic_rows,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=[
+                'total_views', 'unique_visitors', 'page_views', 'bounce_rate', 'avg_session_duration',
+                'visitor_sketch',
+            ],
+        )
+        PropertyDailyAnalytics.objects.bulk_create(
+            property_daily_rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['property', 'date'],
+            update_fields=['views', 'unique_viewers', 'total_time_spent', 'visitor_sketch'],
+        )
+
+        if property_sketches:
+            refresh_property_analytics(property_sketches, batch)
+
+        checkpoint.last_id = upper_id
+        checkpoint.save(update_fields=['last_id', 'updated_at'])
+
+    return consumed
+
+
+def _build_traffic_row(day, totals, bounced, visitor_sketch, purged_row=None):
+    """
+    Turn one day's aggregated page view totals into an unsaved TrafficAnalytics row.
+
+    totals has the day's counts over all its rows and, as new_*, over the rows of the
+    batch being rolled up; bounced is its number of single-view sessions. For a day
+    whose raw rows were purged, the new rows are added to the totals of its stored
+    purged_row, whose bounce rate and session duration are kept: they would need the
+    purged sessions.
+    """
+    if purged_row is not None:
+        return TrafficAnalytics(
+            date=day,
+            total_views=purged_row.total_views + totals['new_views'],
+            page_views=purged_row.page_views + totals['new_page_views'],
+            unique_visitors=visitor_sketch.count(),
+            bounce_rate=purged_row.bounce_rate,
+            avg_session_duration=purged_row.avg_session_duration,
+            visitor_sketch=visitor_sketch.to_bytes(),
+        )
+
+    sessions = totals['sessions']
+    return TrafficAnalytics(
+        date=day,
+        total_views=totals['total_views'],
+        page_views=totals['page_views'],
+        unique_visitors=visitor_sketch.count(),
+        bounce_rate=(bounced / sessions * 100) if sessions else 0.0,
+        avg_session_duration=(totals['time_spent'] // sessions) if sessions else 0,
+        visitor_sketch=visitor_sketch.to_bytes(),
+    )
+
+
+def refresh_property_analytics(new_viewer_sketches, new_views):
+    """
+    Rebuild the lifetime PropertyAnalytics rows of the properties in new_viewer_sketches.
+
+    Totals are summed from the (already rolled up) daily rows, which is one row per
+    property per day rather than one per view. Unique viewers come from merging the
+    stored lifetime sketch with the viewers of the new rows, and last_viewed only moves
+    forward, so late rows for an earlier day never set it back.
+    """
+    from contact.models import ContactInquiry
+
+    property_ids = list(new_viewer_sketches)
+    daily_totals = PropertyDailyAnalytics.objects.filter(property_id__in=property_ids).values('property_id').annotate(
+        views=Sum('views'),
+        time_spent=Sum('total_time_spent'),
+    )
+    last_viewed = dict(
+        new_views.filter(property_id__in=property_ids).values('property_id').annotate(
+            last=Max('timestamp')
+        ).values_list('property_id', 'last')
+    )
+    stored = PropertyAnalytics.objects.filter(property_id__in=property_ids).values_list(
+        'property_id', 'visitor_sketch', 'last_viewed'
+    )
+    for property_id, sketch, stored_last_viewed in stored:
+        new_viewer_sketches[property_id].merge(HyperLogLog.from_bytes(sketch))
+        if stored_last_viewed and stored_last_viewed > last_viewed.get(property_id, stored_last_viewed):
+            last_viewed[property_id] = stored_last_viewed
+    inquiries = dict(
+        ContactInquiry.objects.filter(property_id__in=property_ids).values('property_id').annotate(
+            count=Count('id')
+        ).values_list('property_id', 'count')
+    )
+
+    rows = []
+    for row in daily_totals:
+        viewers = new_viewer_sketches[row['property_id']]
+        rows.append(PropertyAnalytics(
+            property_id=row['property_id'],
+            total_views=row['views'],
+            unique_viewers=viewers.count(),
+            avg_time_on_page=(row['time_spent'] // row['views']) if row['views'] else 0,
+            inquiry_count=inquiries.get(row['property_id'], 0),
+            last_viewed=last_viewed.get(row['property_id']),
+            visitor_sketch=viewers.to_bytes(),
+        ))
+
+    PropertyAnalytics.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['property'],
+        update_fields=[
+            'total_views', 'unique_viewers', 'avg_time_on_page', 'inquiry_count', 'last_viewed', 'visitor_sketch',
+        ],
+    )
+
+
+def rollup_social_shares(batch_size=5000):
+    """
+    Fold SocialShare rows added since the watermark into the per day/platform sharer sketches.
+
+    The share counters themselves are maintained when each share is recorded; this only
+    keeps SocialShareAnalytics.unique_users in step with the sketch, and creates the
+    rows of days whose shares were inserted without their counters. Sketches are
+    single-writer here, so concurrent shares can never overwrite each other's registers.
+    The price is that unique_users lags the share counts until the next run; the share
+    stats report when that was as ``unique_users_as_of``.
+
+    Returns the number of SocialShare rows consumed.
+    """
+    with immediate_atomic(using=router.db_for_write(AnalyticsCheckpoint)):
+        checkpoint, _ = AnalyticsCheckpoint.objects.select_for_update().get_or_create(
+            name=SOCIAL_SHARE_CHECKPOINT
+        )
+        pending = SocialShare.objects.filter(id__gt=checkpoint.last_id)
+        upper_id = pending.order_by('id').values_list('id', flat=True)[batch_size - 1:batch_size].first()
+        if upper_id is None:
+            upper_id = pending.aggregate(last_id=Max('id'))['last_id']
+        if upper_id is None:
+            return 0
+
+        consumed = 0
+        sketches = defaultdict(HyperLogLog)
+        new_rows = pending.filter(id__lte=upper_id).order_by().annotate(
+            day=TruncDate('timestamp'), visitor=visitor_key_expression()
+        ).values_list('day', 'platform', 'visitor')
+        for day, platform, visitor in new_rows.iterator(chunk_size=2000):
+            consumed += 1
+            sketches[(day, platform)].add(visitor)
+
+        existing = SocialShareAnalytics.objects.filter(date__in={day for day, _ in sketches})
+        updated = []
+        for analytics in existing:
+            sketch = sketches.get((analytics.date, analytics.platform))
+            if sketch is None:
+                continue
+            sketch.merge(HyperLogLog.from_bytes(analytics.visitor_sketch))
+            analytics.visitor_sketch = sketch.to_bytes()
+            analytics.unique_users = sketch.count()
+            updated.append(analytics)
+        SocialShareAnalytics.objects.bulk_update(updated, ['visitor_sketch', 'unique_users'], batch_size=500)
+
+        # Shares inserted without their counters (seed_benchmark_data, copy_analytics_data)
+        missing = set(sketches) - {(analytics.date, analytics.platform) for analytics in existing}
+        if missing:
+            SocialShareAnalytics.objects.bulk_create(
+                [
+                    SocialShareAnalytics(
+                        date=day, platform=platform, visitor_sketch=sketches[day, platform].to_bytes(),
+                        unique_users=sketches[day, platform].count(), **counters,
+                    )
+                    for (day, platform), counters in _share_counters(missing).items()
+                ],
+                batch_size=500,
+            )
+
+        checkpoint.last_id = upper_id
+        checkpoint.save(update_fields=['last_id', 'updated_at'])
+
+    return consumed
+
+
+def _share_counters(keys):
+    """
+    Share counters of each (day, platform) in keys, counted from all of its SocialShare
+    rows. Only for keys with no SocialShareAnalytics row yet, whose rows therefore never
+    went through increment_counters; rollup_social_shares holds the write lock, so no
+    share can be recorded meanwhile.
+    """
+    counters = {key: {'total_shares': 0} for key in keys}
+    start, _ = day_range(min(day for day, _ in keys))
+    _, end = day_range(max(day for day, _ in keys))
+    rows = SocialShare.objects.filter(
+        timestamp__gte=start, timestamp__lt=end, platform__in={platform for _, platform in keys}
+    ).order_by().annotate(day=TruncDate('timestamp')).values_list('day', 'platform', 'content_type').annotate(
+        shares=Count('id')
+    )
+    for day, platform, content_type, shares in rows:
+        row = counters.get((day, platform))
+        if row is None:
+            continue
+        row['total_shares'] += shares
+        name = SHARE_CONTENT_COUNTERS.get(content_type, 'other_shares')
+        row[name] = row.get(name, 0) + shares
+    return counters
+
+
+def unique_visitors_between(start_date, end_date):
+    """Estimated distinct site visitors for dates in [start_date, end_date)"""
+    return HyperLogLog.merged(
+        TrafficAnalytics.objects.filter(date__gte=start_date, date__lt=end_date).values_list('visitor_sketch', flat=True)
+    ).count()
+
+
+def property_unique_viewers_between(property_id, start_date, end_date):
+    """Estimated distinct viewers of one property for dates in [start_date, end_date)"""
+    return HyperLogLog.merged(
+        PropertyDailyAnalytics.objects.filter(
+            property_id=property_id, date__gte=start_date, date__lt=end_date
+        ).values_list('visitor_sketch', flat=True)
+    ).count()
+
+
+def unique_sharers_between(start_date, end_date, platform=None):
+    """Estimated distinct sharers for dates in [start_date, end_date), optionally for one platform"""
+    rows = SocialShareAnalytics.objects.filter(date__gte=start_date, date__lt=end_date)
+    if platform:
+        rows = rows.filter(platform=platform)
+    return HyperLogLog.merged(rows.values_list('visitor_sketch', flat=True)).count()
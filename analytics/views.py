@@ -1,16 +1,27 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.contrib.sessions.models import Session
 from django.contrib.auth.models import AnonymousUser
 
-from .models import PageView, SocialShare, SocialShareAnalytics
+from .models import AnalyticsCheckpoint, PageView, SocialShare, SocialShareAnalytics
+from .hyperloglog import HyperLogLog
+from .buffer import ingest_buffer
+from .ingest import SHARE_PLATFORMS, arequest_context, record_events, request_context
+from .utils import SOCIAL_SHARE_CHECKPOINT, share_counter_row
 from properties.models import Property
+from real_estate.db import increment_counters
 from blog.models import BlogPost
 import json
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 
 def track_event(request, pk):
     property = Property.objects.get(pk=pk)
@@ -41,7 +52,7 @@ class TrackSocialShare(View):
 
             # Get user and session info
             user = request.user if request.user.is_authenticated else None
-            session_key = request.session.session_key
+            session_key = request.session.session_key or ''
             ip_address = self.get_client_ip(request)
             user_agent = request.META.get('HTTP_USER_AGENT', '')
 
@@ -101,73 +112,208 @@ class TrackSocialShare(View):
         return ip
 
     def update_daily_analytics(self, social_share):
-        """Update the daily social share analytics"""
-        today = timezone.now().date()
-
-        # Get or create analytics record
-        analytics, created = SocialShareAnalytics.objects.get_or_create(
-            date=today,
-            platform=social_share.platform,
-            defaults={
-                'total_shares': 0,
-                'unique_users': 0,
-                'property_shares': 0,
-                'blog_shares': 0,
-                'other_shares': 0
-            }
-        )
-
-        # Update counters
-        analytics.total_shares += 1
-
-        # Track unique users (we'll use IP + user as unique identifier)
-        user_identifier = social_share.user.id if social_share.user else social_share.ip_address
-        # For simplicity, we'll just increment unique_users for now
-        # In a production system, you'd track unique users per day
-        analytics.unique_users += 1
-
-        # Update content type counters
-        if social_share.content_type == 'property':
-            analytics.property_shares += 1
-        elif social_share.content_type == 'blog_post':
-            analytics.blog_shares += 1
-        else:
-            analytics.other_shares += 1
+        """Update the daily social share analytics with a single atomic upsert"""
+        # unique_users is estimated from the sharer sketch by the rollup_analytics job
+        increment_counters(SocialShareAnalytics, ['date', 'platform'], [share_counter_row(social_share)])
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TrackEventBatch(View):
+    """
+    API endpoint accepting a batch of share and page view events.
+
+    The body is a JSON list of events, or an object with an ``events`` list. It is
+    sent with navigator.sendBeacon, so it may arrive as text/plain.
+    """
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
+
+        events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(events, list):
+            return JsonResponse({'success': False, 'message': 'Expected a list of events'}, status=400)
+
+        accepted, rejected = record_events(events, request_context(request))
+        return JsonResponse({'success': True, 'accepted': accepted, 'rejected': rejected}, status=202)
+
+
+# Async tracking endpoints: they validate the request, hand the events to the ingest
+# buffer and answer 204 at once; the rows are written in bulk by the buffer's thread.
+
+@csrf_exempt
+@require_POST
+async def track_event_async(request, pk):
+    """Record a page view of property pk"""
+    url = request.META.get('HTTP_REFERER', '')
+    ingest_buffer.add([{'type': 'page_view', 'property_id': pk, 'url': url}], await arequest_context(request))
+    return HttpResponse(status=204)
+
+
+@csrf_exempt
+@require_POST
+async def track_social_share_async(request):
+    """Record one share; takes the same JSON body as TrackSocialShare"""
+    try:
+        data = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
+    if not isinstance(data, dict) or data.get('platform') not in SHARE_PLATFORMS:
+        return JsonResponse({'success': False, 'message': 'Unknown platform'}, status=400)
+
+    ingest_buffer.add([{**data, 'type': 'share'}], await arequest_context(request))
+    return HttpResponse(status=204)
+
+
+@csrf_exempt
+@require_POST
+async def track_event_batch_async(request):
+    """Record a batch of events; takes the same body as TrackEventBatch"""
+    try:
+        data = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
+
+    events = data.get('events') if isinstance(data, dict) else data
+    if not isinstance(events, list):
+        return JsonResponse({'success': False, 'message': 'Expected a list of events'}, status=400)
+
+    if events:
+        ingest_buffer.add(events, await arequest_context(request))
+    return HttpResponse(status=204)
 
-        analytics.save()
 
 def get_social_share_stats(request):
-    """Get social sharing statistics for dashboard"""
-    from django.db.models import Count, Sum
-    from django.db.models.functions import TruncDate
+    """
+    Get social sharing statistics for dashboard.
 
-    # Get last 30 days of data
-    end_date = timezone.now().date()
+    Served from the pre-aggregated SocialShareAnalytics rows rather than raw shares.
+    Optional query parameters: ``start`` and ``end`` (inclusive ISO dates, default the
+    last 30 days) and ``granularity`` (day, week or month). Responses are cached for
+    SOCIAL_SHARE_STATS_CACHE_TTL seconds.
+
+    Share counts are updated as each share is recorded, but unique_users only moves
+    when rollup_analytics folds new shares into the sharer sketches, so it can lag
+    behind them; ``unique_users_as_of`` is when that last happened (null if never).
+    """
+    params = social_share_stats_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+
+    cache_key = 'social_share_stats:{}:{}:{}'.format(*params)
+    stats = cache.get(cache_key)
+    if stats is None:
+        stats = build_social_share_stats(*params)
+        cache.set(cache_key, stats, settings.SOCIAL_SHARE_STATS_CACHE_TTL)
+    return JsonResponse(stats)
+
+
+async def social_share_stats_async(request):
+    """get_social_share_stats() on the async ORM and cache APIs"""
+    params = social_share_stats_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+
+    cache_key = 'social_share_stats:{}:{}:{}'.format(*params)
+    stats = await cache.aget(cache_key)
+    if stats is None:
+        stats = await abuild_social_share_stats(*params)
+        await cache.aset(cache_key, stats, settings.SOCIAL_SHARE_STATS_CACHE_TTL)
+    return JsonResponse(stats)
+
+
+def social_share_stats_params(request):
+    """(start_date, end_date, granularity) from the query string, or an error response"""
+    end_date = timezone.localdate()
     start_date = end_date - timezone.timedelta(days=30)
+    granularity = request.GET.get('granularity', 'day')
+
+    try:
+        if request.GET.get('start'):
+            start_date = date.fromisoformat(request.GET['start'])
+        if request.GET.get('end'):
+            end_date = date.fromisoformat(request.GET['end'])
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Dates must be in YYYY-MM-DD format'}, status=400)
+
+    if granularity not in STATS_GRANULARITIES:
+        return JsonResponse({'success': False, 'message': 'granularity must be day, week or month'}, status=400)
+    if start_date > end_date or (end_date - start_date).days > MAX_STATS_WINDOW_DAYS:
+        return JsonResponse({'success': False, 'message': 'Invalid date window'}, status=400)
+    return start_date, end_date, granularity
+
+
+STATS_GRANULARITIES = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+MAX_STATS_WINDOW_DAYS = 3 * 366
+
+
+def social_share_stats_queries(start_date, end_date, granularity):
+    """The per-platform rows, time series and sharer sketch freshness queries behind the share stats"""
+    rows = SocialShareAnalytics.objects.filter(
+        date__gte=start_date,
+        date__lt=end_date + timezone.timedelta(days=1),
+    ).order_by()
+    truncate = STATS_GRANULARITIES[granularity]
+    period = truncate('date') if truncate else F('date')
+    series = rows.annotate(period=period).values('period').annotate(
+        total_shares=Sum('total_shares')
+    ).order_by('period')
+    rolled_up_at = AnalyticsCheckpoint.objects.filter(name=SOCIAL_SHARE_CHECKPOINT).values_list('updated_at', flat=True)
+    return rows.values_list('platform', 'total_shares', 'visitor_sketch'), series, rolled_up_at
+
+
+def build_social_share_stats(start_date, end_date, granularity='day'):
+    """Share totals, per-platform unique sharers and a time series for [start_date, end_date]"""
+    platform_rows, series_rows, rolled_up_at = social_share_stats_queries(start_date, end_date, granularity)
+    return summarize_social_share_stats(
+        list(platform_rows), list(series_rows), rolled_up_at.first(), start_date, end_date, granularity
+    )
+
+
+async def abuild_social_share_stats(start_date, end_date, granularity='day'):
+    platform_rows, series_rows, rolled_up_at = social_share_stats_queries(start_date, end_date, granularity)
+    return summarize_social_share_stats(
+        [row async for row in platform_rows], [row async for row in series_rows], await rolled_up_at.afirst(),
+        start_date, end_date, granularity,
+    )
+
+
+def summarize_social_share_stats(platform_rows, series_rows, rolled_up_at, start_date, end_date, granularity):
+    platform_totals = {}
+    platform_sketches = {}
+    for platform, total_shares, sketch in platform_rows:
+        platform_totals[platform] = platform_totals.get(platform, 0) + total_shares
+        platform_sketches.setdefault(platform, HyperLogLog()).merge(HyperLogLog.from_bytes(sketch))
+
+    platform_stats = [
+        {
+            'platform': platform,
+            'total_shares': total,
+            # Distinct sharers come from the merged daily HyperLogLog sketches, not a DISTINCT scan
+            'unique_users': platform_sketches[platform].count(),
+        }
+        for platform, total in sorted(platform_totals.items(), key=lambda item: -item[1])
+    ]
+
+    series = [
+        {'date': row['period'].isoformat(), 'total_shares': row['total_shares']}
+        for row in series_rows
+    ]
 
-    # Aggregate share data by platform
-    platform_stats = SocialShare.objects.filter(
-        timestamp__date__range=[start_date, end_date]
-    ).values('platform').annotate(
-        total_shares=Count('id'),
-        unique_users=Count('ip_address', distinct=True) if hasattr(SocialShare.objects, 'distinct') else Count('id')
-    ).order_by('-total_shares')
-
-    # Daily breakdown for charts
-    daily_stats = SocialShare.objects.filter(
-        timestamp__date__range=[start_date, end_date]
-    ).annotate(
-        date=TruncDate('timestamp')
-    ).values('date').annotate(
-        total_shares=Count('id')
-    ).order_by('date')
-
-    return JsonResponse({
-        'platform_stats': list(platform_stats),
-        'daily_stats': list(daily_stats),
-        'total_shares': SocialShare.objects.filter(
-            timestamp__date__range=[start_date, end_date]
-        ).count(),
+    stats = {
+        'platform_stats': platform_stats,
+        'granularity': granularity,
+        'series': series,
+        'total_shares': sum(platform_totals.values()),
+        # unique_users covers the shares rolled up by then; later shares are only in the counts
+        'unique_users_as_of': rolled_up_at.isoformat() if rolled_up_at else None,
         'start_date': start_date.isoformat(),
-        'end_date': end_date.isoformat()
-    })
+        'end_date': end_date.isoformat(),
+    }
+    if granularity == 'day':
+        stats['daily_stats'] = series
+    return stats
@@ -0,0 +1,89 @@
+from django.contrib import admin
+from django.utils.html import format_html, format_html_join
+from .models import JobRun, RequestProfile, SchedulerLock
+
+
+@admin.register(SchedulerLock)
+class SchedulerLockAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'acquired_at', 'heartbeat_at')
+    readonly_fields = ('name', 'owner', 'acquired_at', 'heartbeat_at')
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'started_at', 'format_duration', 'success')
+    list_filter = ('job', 'success', 'started_at')
+    search_fields = ('job', 'error')
+    readonly_fields = ('job', 'started_at', 'duration_ms', 'success', 'error')
+    date_hierarchy = 'started_at'
+
+    def format_duration(self, obj):
+        return f"{obj.duration_ms:,.0f} ms"
+    format_duration.short_description = "Duration"
+    format_duration.admin_order_field = 'duration_ms'
+
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Profiled requests, slowest first"""
+    list_display = ('route', 'method', 'path', 'status', 'format_duration', 'query_count', 'format_sql', 'trigger', 'created_at')
+    list_filter = ('route', 'trigger', 'method', 'status', 'created_at')
+    search_fields = ('path', 'route')
+    ordering = ('-duration_ms',)
+    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+    fieldsets = (
+        ('Request', {
+            'fields': ('created_at', 'method', 'path', 'route', 'status', 'trigger', 'user')
+        }),
+        ('Timings', {
+            'fields': ('duration_ms', 'query_count', 'sql_ms', 'query_table')
+        }),
+        ('Profile', {
+            'fields': ('call_tree_display', 'functions_display')
+        }),
+    )
+    readonly_fields = (
+        'created_at', 'method', 'path', 'route', 'status', 'trigger', 'user',
+        'duration_ms', 'query_count', 'sql_ms', 'query_table', 'call_tree_display', 'functions_display',
+    )
+
+    def get_queryset(self, request):
+        # The profile texts are only shown on the change page
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('call_tree', 'functions', 'queries')
+        return queryset
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def format_duration(self, obj):
+        return f"{obj.duration_ms:,.0f} ms"
+    format_duration.short_description = "Duration"
+    format_duration.admin_order_field = 'duration_ms'
+
+    def format_sql(self, obj):
+        return f"{obj.sql_ms:,.1f} ms"
+    format_sql.short_description = "SQL time"
+    format_sql.admin_order_field = 'sql_ms'
+
+    def query_table(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((f"{query['ms']:,.1f} ms", query['count'], query['sql']) for query in obj.queries),
+        )
+        return format_html('<table><tr><th>Total</th><th>Count</th><th>Query</th></tr>{}</table>', rows)
+    query_table.short_description = "Queries"
+
+    def call_tree_display(self, obj):
+        return format_html('<pre style="font-size: 12px; overflow-x: auto;">{}</pre>', obj.call_tree)
+    call_tree_display.short_description = "Call tree"
+
+    def functions_display(self, obj):
+        return format_html('<pre style="font-size: 12px; overflow-x: auto;">{}</pre>', obj.functions)
+    functions_display.short_description = "Functions"
@@ -0,0 +1,25 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from real_estate.db import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='apply_sqlite_pragmas')
+
+        from real_estate.routers import install_write_tracker
+        connection_created.connect(install_write_tracker, dispatch_uid='install_write_tracker')
+
+        from .metrics import install_query_timer
+        connection_created.connect(install_query_timer, dispatch_uid='install_query_timer')
+
+        from .profiling import install_query_recorder
+        connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
+
+        if settings.NPLUSONE_ACTION:
+            from .nplusone import install_pattern_recorder
+            connection_created.connect(install_pattern_recorder, dispatch_uid='install_pattern_recorder')
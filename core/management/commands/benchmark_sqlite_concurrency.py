@@ -0,0 +1,138 @@
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from real_estate.db import sqlite_pragma_statements
+
+SCHEMA = (
+    'CREATE TABLE page_view (id INTEGER PRIMARY KEY, property_id INTEGER, timestamp REAL, '
+    'session_key TEXT, time_spent INTEGER)',
+    'CREATE INDEX page_view_property ON page_view (property_id, timestamp)',
+)
+READ_QUERY = 'SELECT COUNT(*), SUM(time_spent) FROM page_view WHERE property_id = ? AND timestamp >= ?'
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure read latency on a scratch SQLite database while writers insert page views '
+        'in bursts, with SQLite defaults and with SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per configuration (default 5)')
+        parser.add_argument('--readers', type=int, default=8, help='Concurrent reader threads (default 8)')
+        parser.add_argument('--writers', type=int, default=2, help='Concurrent writer threads (default 2)')
+        parser.add_argument('--burst', type=int, default=2000, help='Rows inserted per write transaction (default 2000)')
+        parser.add_argument('--seed-rows', type=int, default=200000, help='Rows loaded before measuring (default 200000)')
+        parser.add_argument('--properties', type=int, default=1000, help='Distinct property ids (default 1000)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['readers']} readers, {options['writers']} writers inserting {options['burst']} rows "
+            f"per transaction, {options['duration']:g}s per configuration"
+        )
+        self.stdout.write(f"{'config':<10} {'reads':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+                          f"{'locked':>7} {'rows/s':>8}")
+        with tempfile.TemporaryDirectory() as directory:
+            for label, pragmas in (('default', {}), ('tuned', settings.SQLITE_PRAGMAS)):
+                result = self.run(Path(directory) / f'{label}.sqlite3', pragmas, options)
+                latencies = result['latencies']
+                self.stdout.write(
+                    f"{label:<10} {len(latencies):>7} {percentile(latencies, 0.50):>8.2f} "
+                    f"{percentile(latencies, 0.95):>8.2f} {percentile(latencies, 0.99):>8.2f} "
+                    f"{max(latencies, default=0):>8.2f} {result['errors']:>7} {result['rows_per_second']:>8.0f}"
+                )
+
+    def connect(self, path, pragmas):
+        # Autocommit, like Django's connections; transactions are opened explicitly
+        connection = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        for statement in sqlite_pragma_statements(pragmas):
+            connection.execute(statement)
+        return connection
+
+    def run(self, path, pragmas, options):
+        properties = options['properties']
+        setup = self.connect(path, pragmas)
+        for statement in SCHEMA:
+            setup.execute(statement)
+        now = time.time()
+        setup.execute('BEGIN')
+        setup.executemany(
+            'INSERT INTO page_view (property_id, timestamp, session_key, time_spent) VALUES (?, ?, ?, ?)',
+            ((random.randrange(properties), now - random.uniform(0, 86400 * 30), f's{i}', random.randrange(300))
+             for i in range(options['seed_rows'])),
+        )
+        setup.execute('COMMIT')
+        setup.close()
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        latencies = []
+        counters = {'errors': 0, 'rows': 0}
+        begin = 'BEGIN IMMEDIATE' if pragmas else 'BEGIN'
+
+        def writer():
+            connection = self.connect(path, pragmas)
+            while not stop.is_set():
+                rows = [
+                    (random.randrange(properties), time.time(), 'burst', random.randrange(300))
+                    for _ in range(options['burst'])
+                ]
+                try:
+                    connection.execute(begin)
+                    connection.executemany(
+                        'INSERT INTO page_view (property_id, timestamp, session_key, time_spent) VALUES (?, ?, ?, ?)',
+                        rows,
+                    )
+                    connection.execute('COMMIT')
+                    with lock:
+                        counters['rows'] += len(rows)
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    with lock:
+                        counters['errors'] += 1
+            connection.close()
+
+        def reader():
+            connection = self.connect(path, pragmas)
+            local = []
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    connection.execute(READ_QUERY, (random.randrange(properties), time.time() - 86400 * 7)).fetchone()
+                    local.append((time.perf_counter() - start) * 1000)
+                except sqlite3.OperationalError:
+                    with lock:
+                        counters['errors'] += 1
+            connection.close()
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=writer) for _ in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        return {
+            'latencies': latencies,
+            'errors': counters['errors'],
+            'rows_per_second': counters['rows'] / options['duration'],
+        }
@@ -0,0 +1,120 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        'Request the pages in QUERY_PLAN_CHECKS, run EXPLAIN QUERY PLAN on every SELECT they '
+        'issue and flag full table scans and temporary B-tree sorts'
+    )
+
+    FROM_TABLE = re.compile(r'\bFROM "(\w+)"')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page',
+            action='append',
+            dest='pages',
+            metavar='NAME',
+            help='Only check this page from QUERY_PLAN_CHECKS (repeatable)',
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full plan of every query, not just the flagged ones',
+        )
+        parser.add_argument(
+            '--no-fail',
+            action='store_true',
+            help='Report problems without exiting with an error',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('explain_queries reads SQLite query plans; the default database is '
+                               f'{connection.vendor}')
+
+        checks = settings.QUERY_PLAN_CHECKS
+        if options['pages']:
+            unknown = set(options['pages']) - set(checks)
+            if unknown:
+                raise CommandError(f"Unknown page(s): {', '.join(sorted(unknown))}. Choices: {', '.join(checks)}")
+            checks = {name: checks[name] for name in options['pages']}
+
+        problems = 0
+        # Everything, including the throwaway user and its session, is rolled back
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            client = Client()
+            client.force_login(get_user_model().objects.create_user(
+                'explain-queries', is_staff=True, is_superuser=True, user_type='broker',
+            ))
+            for name, check in checks.items():
+                problems += self.check_page(client, name, check, options)
+            transaction.set_rollback(True)
+
+        if problems:
+            message = f'{problems} query plan problem(s) found'
+            if options['no_fail']:
+                self.stdout.write(self.style.WARNING(message))
+            else:
+                raise CommandError(message)
+        else:
+            self.stdout.write(self.style.SUCCESS('No full scans or temporary sorts found'))
+
+    def check_page(self, client, name, check, options):
+        url = reverse(check['url']) + (f"?{check['query']}" if check.get('query') else '')
+        expected_sorts = check.get('expected_sorts', ())
+        selects = {}
+
+        def record(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                selects.setdefault(sql, params)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = client.get(url)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: GET {url} -> {response.status_code}, {len(selects)} distinct SELECTs'))
+        problems = 0
+        for sql, params in selects.items():
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[3] for row in cursor.fetchall()]
+            issues = [detail for detail in plan if self.is_problem(detail)]
+            # Queries reading no table directly (e.g. FROM a subquery) have no expected sorts
+            table = self.FROM_TABLE.search(sql)
+            if issues and table and table.group(1) in expected_sorts:
+                expected = [detail for detail in issues if detail.startswith('USE TEMP B-TREE')]
+                issues = [detail for detail in issues if detail not in expected]
+            else:
+                expected = []
+            if issues or options['verbose_plans']:
+                self.stdout.write(f'  {sql[:200]}{"..." if len(sql) > 200 else ""}')
+                for detail in plan:
+                    if detail in issues:
+                        self.stdout.write(self.style.ERROR(f'    ! {detail}'))
+                    elif detail in expected:
+                        self.stdout.write(f'      {detail} (expected)')
+                    else:
+                        self.stdout.write(f'      {detail}')
+            problems += len(issues)
+        return problems
+
+    @staticmethod
+    def is_problem(detail):
+        """A full scan of a table outside QUERY_PLAN_IGNORED_TABLES, or a sort through a temporary B-tree"""
+        if detail.startswith('USE TEMP B-TREE'):
+            return True
+        if detail.startswith('SCAN ') and 'USING' not in detail:
+            table = detail.split()[1]
+            if table == 'CONSTANT' or table.startswith('('):
+                return False  # no table involved, or a subquery whose own plan is listed
+            return table not in settings.QUERY_PLAN_IGNORED_TABLES
+        return False
@@ -0,0 +1,255 @@
+import io
+import json
+import sqlite3
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from analytics.models import AnalyticsCheckpoint, PageView, SocialShare
+from analytics.utils import PAGE_VIEW_CHECKPOINT, SOCIAL_SHARE_CHECKPOINT
+from core.nplusone import detect_repeated_queries
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+@contextmanager
+def disposable_copies(databases, replicas):
+    """
+    Point each SQLite database alias at a temporary copy of itself, and each replica
+    at an empty file for sync_replicas to fill, until the block exits.
+    """
+    originals = {}
+    with tempfile.TemporaryDirectory(prefix='run_benchmarks.') as directory:
+        try:
+            for alias in databases:
+                connection = connections[alias]
+                path = str(Path(directory) / f'{alias}.sqlite3')
+                if alias not in replicas:
+                    connection.ensure_connection()
+                    target = sqlite3.connect(path)
+                    try:
+                        connection.connection.backup(target)
+                    finally:
+                        target.close()
+                connection.close()
+                originals[alias] = connection.settings_dict['NAME']
+                connection.settings_dict['NAME'] = path
+            yield
+        finally:
+            for alias, name in originals.items():
+                connections[alias].close()
+                connections[alias].settings_dict['NAME'] = name
+
+
+def rewind_rollups(rows):
+    """Leave only the newest `rows` raw rows of each table pending for rollup_analytics"""
+    for name, model in ((PAGE_VIEW_CHECKPOINT, PageView), (SOCIAL_SHARE_CHECKPOINT, SocialShare)):
+        last_id = model.objects.order_by('-id').values_list('id', flat=True)[rows:rows + 1].first() or 0
+        AnalyticsCheckpoint.objects.update_or_create(name=name, defaults={'last_id': last_id})
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the pages in BENCHMARK_PAGES and the commands in BENCHMARK_COMMANDS, report p50/p95 '
+        'and query counts, and compare them with the baseline (BENCHMARK_BASELINE) saved on this '
+        'machine by an earlier --save-baseline run. '
+        'Everything runs against temporary copies of the SQLite databases, with pages reading '
+        'from replicas as in production. Load realistic volumes first with seed_benchmark_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            action='append',
+            metavar='NAME',
+            help='Only run this page or command benchmark (repeatable)',
+        )
+        parser.add_argument('--iterations', type=int, default=10, help='Timed runs per benchmark (default 10)')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed runs first, to fill caches (default 1)')
+        parser.add_argument('--baseline', default=str(settings.BENCHMARK_BASELINE), help='Baseline file to compare with')
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Store these results as the new baseline instead of comparing',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=settings.BENCHMARK_TOLERANCE,
+            help='Fraction a p95 may exceed its baseline before it counts as a regression',
+        )
+        parser.add_argument(
+            '--no-fail',
+            action='store_true',
+            help='Report regressions without exiting with an error',
+        )
+
+    def handle(self, *args, **options):
+        benchmarks = {
+            **{name: ('page', spec) for name, spec in settings.BENCHMARK_PAGES.items()},
+            **{name: ('command', spec) for name, spec in settings.BENCHMARK_COMMANDS.items()},
+        }
+        if options['only']:
+            unknown = set(options['only']) - set(benchmarks)
+            if unknown:
+                raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}. Choices: {', '.join(benchmarks)}")
+            benchmarks = {name: benchmarks[name] for name in options['only']}
+
+        results = {}
+        self.queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            self.queries += 1
+            return execute(sql, params, many, context)
+
+        databases = list(settings.DATABASES)
+        not_sqlite = [alias for alias in databases if connections[alias].vendor != 'sqlite']
+        if not_sqlite:
+            raise CommandError(
+                f"Benchmarks run against copies of SQLite databases; {', '.join(not_sqlite)} is not SQLite"
+            )
+
+        with ExitStack() as stack:
+            # Not transactions that are rolled back: reads inside one never go to a replica
+            stack.enter_context(disposable_copies(databases, settings.DATABASE_REPLICAS))
+            # Every rollup_analytics run rolls up the same slice, not the whole backlog
+            rewind_rollups(settings.BENCHMARK_ROLLUP_ROWS)
+            for alias in databases:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            stack.enter_context(override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']))
+            # Time what production runs: no N+1 detection (it walks the stack on every query)
+            stack.enter_context(override_settings(NPLUSONE_ACTION=None))
+            stack.enter_context(detect_repeated_queries('command:run_benchmarks'))
+            client = Client()
+            client.force_login(get_user_model().objects.create_user(
+                'run-benchmarks', is_staff=True, is_superuser=True, user_type='broker',
+            ))
+
+            for name, (kind, spec) in benchmarks.items():
+                if kind == 'page':
+                    run = self.page_runner(client, name, spec)
+                else:
+                    run = self.command_runner(spec)
+                if run is None:
+                    continue
+                self.stdout.write(f'Running {name}...')
+                if kind == 'page' and settings.DATABASE_REPLICAS:
+                    # Fresh replicas holding the benchmark user, so pages read from them
+                    call_command('sync_replicas', stdout=io.StringIO())
+                results[name] = self.measure(run, databases, options, rollback=kind == 'command')
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            self.print_results(results, {}, options)
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        regressions = self.print_results(results, baseline, options)
+        if not baseline:
+            self.stdout.write(f'No baseline at {baseline_path}; store one with --save-baseline')
+        elif regressions:
+            message = f'{regressions} benchmark(s) regressed against {baseline_path}'
+            if options['no_fail']:
+                self.stdout.write(self.style.WARNING(message))
+            else:
+                raise CommandError(message)
+        else:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def page_runner(self, client, name, spec):
+        kwargs = {}
+        if spec.get('object'):
+            # The newest row stands in for a typical one
+            obj = apps.get_model(spec['object'])._default_manager.order_by('-pk').first()
+            if obj is None:
+                self.stdout.write(self.style.WARNING(f'{name}: skipped, no {spec["object"]} rows'))
+                return None
+            kwargs['pk'] = obj.pk
+        url = reverse(spec['url'], kwargs=kwargs) + (f"?{spec['query']}" if spec.get('query') else '')
+
+        def run():
+            # Like a fresh visitor's: a write by an earlier page must not pin reads to the primary
+            client.cookies.pop(settings.REPLICA_PIN_COOKIE, None)
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{name}: GET {url} returned {response.status_code}')
+        return run
+
+    def command_runner(self, args):
+        def run():
+            call_command(*args, stdout=io.StringIO(), stderr=io.StringIO())
+        return run
+
+    def measure(self, run, databases, options, rollback=False):
+        """
+        Run warmup + iterations times. With rollback, each run is in a transaction that is
+        rolled back, so every run starts from the same data; page requests run outside
+        transactions, which would keep their reads on the primary.
+        """
+        timings = []
+        queries = []
+        for iteration in range(options['warmup'] + options['iterations']):
+            with ExitStack() as stack:
+                if rollback:
+                    for alias in databases:
+                        stack.enter_context(transaction.atomic(using=alias))
+                self.queries = 0
+                start = time.perf_counter()
+                run()
+                elapsed = (time.perf_counter() - start) * 1000
+                if rollback:
+                    for alias in databases:
+                        transaction.set_rollback(True, using=alias)
+            if iteration >= options['warmup']:
+                timings.append(elapsed)
+                queries.append(self.queries)
+        return {
+            'p50': round(percentile(timings, 0.50), 2),
+            'p95': round(percentile(timings, 0.95), 2),
+            'queries': max(queries),
+        }
+
+    def print_results(self, results, baseline, options):
+        """Print the results table; returns the number of regressions"""
+        self.stdout.write(
+            f"{'benchmark':<24} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}"
+            + (f" {'base p95':>9} {'change':>8} {'base q':>7}" if baseline else '')
+        )
+        regressions = 0
+        for name, result in results.items():
+            line = f"{name:<24} {result['p50']:>9.1f} {result['p95']:>9.1f} {result['queries']:>8}"
+            base = baseline.get(name)
+            if base is None:
+                if baseline:
+                    line += f" {'-':>9} {'new':>8} {'-':>7}"
+                self.stdout.write(line)
+                continue
+            change = result['p95'] / base['p95'] - 1 if base['p95'] else 0.0
+            line += f" {base['p95']:>9.1f} {change:>+8.0%} {base['queries']:>7}"
+            if change > options['tolerance'] or result['queries'] > base['queries']:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            elif change < -options['tolerance'] or result['queries'] < base['queries']:
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
+        return regressions
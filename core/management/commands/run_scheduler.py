@@ -0,0 +1,58 @@
+import logging
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run the periodic jobs from SCHEDULER_JOBS in one long-lived process'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Show the configured jobs and their next run time, then exit',
+        )
+        parser.add_argument(
+            '--run',
+            metavar='JOB',
+            help='Run a single job once now, then exit',
+        )
+
+    def handle(self, *args, **options):
+        scheduler = Scheduler()
+
+        if options['list']:
+            now = timezone.now()
+            for job in scheduler.jobs.values():
+                self.stdout.write(f'{job.name:<24} {str(job.schedule):<24} next run {job.schedule.next_after(now):%Y-%m-%d %H:%M:%S}')
+            return
+
+        if options['run']:
+            job = scheduler.jobs.get(options['run'])
+            if job is None:
+                raise CommandError(f"Unknown job '{options['run']}'. Choices: {', '.join(scheduler.jobs)}")
+            if not scheduler.run_job(job):
+                raise CommandError(f"Job '{job.name}' failed")
+            self.stdout.write(self.style.SUCCESS(f"Ran {job.name} in {scheduler.stats[job.name].last_ms:.0f} ms"))
+            return
+
+        # Finish the running job, release the lock and exit on SIGTERM / Ctrl+C
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+
+        self.stdout.write(self.style.SUCCESS(f'Scheduler started as {scheduler.owner} with {len(scheduler.jobs)} jobs'))
+        scheduler.run_forever()
+
+        self.stdout.write(self.style.SUCCESS('Scheduler stopped. Job timings:'))
+        for name, stats in scheduler.stats.items():
+            if stats.runs:
+                self.stdout.write(
+                    f'  {name}: {stats.runs} runs, {stats.failures} failed, '
+                    f'avg {stats.avg_ms:.0f} ms, max {stats.max_ms:.0f} ms'
+                )
@@ -0,0 +1,352 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from analytics.models import PageView, SocialShare
+from properties import lookups
+from properties.models import Amenity, Company, Image, Location, Property, PropertyType, SavedSearch
+from properties.ranking import VISIBLE_IMAGE_STATUSES, compute_rank_score
+
+# (name, state, latitude, longitude, share of listings)
+CITIES = (
+    ('Kathmandu', 'Bagmati', '27.71720000', '85.32400000', 30),
+    ('Lalitpur', 'Bagmati', '27.66440000', '85.31880000', 12),
+    ('Bhaktapur', 'Bagmati', '27.67100000', '85.42980000', 6),
+    ('Pokhara', 'Gandaki', '28.20960000', '83.98560000', 10),
+    ('Bharatpur', 'Bagmati', '27.68330000', '84.43330000', 5),
+    ('Biratnagar', 'Koshi', '26.45250000', '87.27180000', 5),
+    ('Birgunj', 'Madhesh', '27.01040000', '84.87700000', 4),
+    ('Butwal', 'Lumbini', '27.70060000', '83.44830000', 4),
+    ('Dharan', 'Koshi', '26.80650000', '87.28460000', 3),
+    ('Hetauda', 'Bagmati', '27.42870000', '85.03220000', 3),
+    ('Itahari', 'Koshi', '26.66500000', '87.27180000', 3),
+    ('Janakpur', 'Madhesh', '26.72880000', '85.92660000', 3),
+    ('Nepalgunj', 'Lumbini', '28.05000000', '81.61670000', 3),
+    ('Dhangadhi', 'Sudurpashchim', '28.69400000', '80.59370000', 3),
+    ('Tulsipur', 'Lumbini', '28.13100000', '82.29730000', 2),
+)
+# (name, lowest price, highest price in NPR)
+PROPERTY_TYPES = (
+    ('House', 8_000_000, 150_000_000),
+    ('Apartment', 5_000_000, 60_000_000),
+    ('Land', 2_000_000, 300_000_000),
+    ('Office', 10_000_000, 400_000_000),
+    ('Retail', 6_000_000, 200_000_000),
+    ('Warehouse', 15_000_000, 500_000_000),
+)
+AMENITIES = (
+    'Parking', 'Garden', 'Security', 'Elevator', 'Backup Power', 'Water Supply', 'Internet',
+    'Gym', 'Swimming Pool', 'Air Conditioning', 'Balcony', 'Furnished', 'Solar Water Heater',
+    'Road Access', 'CCTV', 'Lift Backup', 'Rooftop', 'Servant Quarter',
+)
+STATUSES = (('for_sale', 60), ('for_lease', 30), ('sold', 6), ('leased', 4))
+IMAGE_STATUSES = (('approved', 80), ('pending', 14), ('flagged', 4), ('rejected', 2))
+IMAGE_WIDTHS = (800, 1024, 1280, 1920, 4000)
+PLATFORMS = (
+    ('facebook', 35), ('whatsapp', 25), ('messenger', 10), ('copy-link', 10),
+    ('twitter', 6), ('email', 5), ('linkedin', 4), ('native-share', 4), ('other', 1),
+)
+USER_AGENTS = (
+    'Mozilla/5.0 (Linux; Android 14; SM-A546E) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0',
+)
+REFERRERS = ('', '', '', 'https://www.google.com/', 'https://www.facebook.com/', 'https://t.co/')
+
+
+def weighted(rng, choices):
+    """A function drawing from (value, weight) pairs"""
+    values = [value for value, _ in choices]
+    weights = [weight for _, weight in choices]
+    return lambda: rng.choices(values, weights)[0]
+
+
+class Inserter:
+    """Multi-row INSERTs through the database cursor, skipping model instances and signals"""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.using = router.db_for_write(model)
+        self.connection = connections[self.using]
+        quote = self.connection.ops.quote_name
+        columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        self.sql = f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+        self.adapt_datetime = self.connection.ops.adapt_datetimefield_value
+        self.count = 0
+
+    def insert(self, rows):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(self.sql, rows)
+        self.count += len(rows)
+
+    def next_id(self):
+        return (self.model._default_manager.using(self.using).aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+    def reset_sequence(self):
+        """Explicit ids were inserted; move the database's id sequence past them"""
+        with self.connection.cursor() as cursor:
+            for statement in self.connection.ops.sequence_reset_sql(no_style(), [self.model]):
+                cursor.execute(statement)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate benchmark volumes of users, listings (with locations, amenities and images), '
+        'saved searches, page views and social shares. The same --seed produces the same data. '
+        'Rows are inserted in bulk, bypassing model signals; run rollup_analytics afterwards to '
+        'build the analytics rollups.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; also names the generated users (default 1)')
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiply every volume, e.g. 0.01 for a quick local data set (default 1)')
+        parser.add_argument('--users', type=int, default=100_000, help='Users, 10%% of them brokers (default 100000)')
+        parser.add_argument('--properties', type=int, default=1_000_000, help='Listings (default 1000000)')
+        parser.add_argument('--companies', type=int, default=2_000, help='Companies (default 2000)')
+        parser.add_argument('--saved-searches', type=int, default=200_000, help='Saved searches (default 200000)')
+        parser.add_argument('--page-views', type=int, default=50_000_000, help='Page views (default 50000000)')
+        parser.add_argument('--social-shares', type=int, default=5_000_000, help='Social shares (default 5000000)')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per INSERT transaction (default 10000)')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        volumes = {
+            name: max(1, int(options[name] * options['scale']))
+            for name in ('users', 'properties', 'companies', 'saved_searches', 'page_views', 'social_shares')
+        }
+        self.prefix = f"bench{options['seed']}_"
+        if get_user_model().objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f"Users named {self.prefix}* already exist; use another --seed or a fresh database")
+
+        self.stdout.write(', '.join(f"{count:,} {name.replace('_', ' ')}" for name, count in volumes.items()))
+        self.seed_lookups()
+        brokers, buyers = self.seed_users(volumes['users'])
+        companies = self.seed_companies(volumes['companies'])
+        properties = self.seed_properties(volumes['properties'], brokers, companies)
+        self.seed_saved_searches(volumes['saved_searches'], buyers)
+        self.seed_page_views(volumes['page_views'], properties, buyers)
+        self.seed_social_shares(volumes['social_shares'], properties, buyers)
+
+        for table in lookups.TABLES.values():
+            table.invalidate()
+        self.stdout.write(self.style.SUCCESS('Benchmark data ready; run rollup_analytics to build the rollups'))
+
+    def run(self, inserter, rows, label):
+        """Insert rows, batch_size per transaction, and report the rate"""
+        start = time.perf_counter()
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            with transaction.atomic(using=inserter.using):
+                inserter.insert(batch)
+        self.report(label, inserter.count, start)
+
+    def report(self, label, count, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"  {label}: {count:,} rows in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f}/s)")
+
+    def moment(self, days):
+        """A time within the last days"""
+        return self.now - timedelta(seconds=self.rng.random() * days * 86400)
+
+    def seed_lookups(self):
+        self.locations = []
+        for name, state, latitude, longitude, share in CITIES:
+            location, _ = Location.objects.get_or_create(
+                name=name, type='city', state=state,
+                defaults={'country': 'Nepal', 'latitude': Decimal(latitude), 'longitude': Decimal(longitude)},
+            )
+            self.locations.append(((location.pk, name, state), share))
+        self.property_types = [
+            ((PropertyType.objects.get_or_create(name=name)[0].pk, name, low, high), 1)
+            for name, low, high in PROPERTY_TYPES
+        ]
+        self.amenity_ids = [Amenity.objects.get_or_create(name=name)[0].pk for name in AMENITIES]
+
+    def seed_users(self, count):
+        User = get_user_model()
+        inserter = Inserter(User, (
+            'id', 'username', 'email', 'password', 'first_name', 'last_name', 'user_type', 'phone_number',
+            'is_staff', 'is_superuser', 'is_active', 'date_joined', 'agree_terms',
+        ))
+        first_id = inserter.next_id()
+        password = make_password('benchmark')  # one hash for everyone; hashing per user would take hours
+        broker_count = max(1, count // 10)
+
+        def rows():
+            for i in range(count):
+                username = f'{self.prefix}{i}'
+                yield (
+                    first_id + i, username, f'{username}@example.com', password, 'Bench', f'User {i}',
+                    'broker' if i < broker_count else 'buyer', f'98{self.rng.randrange(10 ** 8):08d}',
+                    False, False, True, inserter.adapt_datetime(self.moment(1095)), True,
+                )
+
+        self.run(inserter, rows(), 'users')
+        inserter.reset_sequence()
+        ids = range(first_id, first_id + count)
+        return ids[:broker_count], ids[broker_count:] or ids
+
+    def seed_companies(self, count):
+        inserter = Inserter(Company, ('id', 'name', 'description', 'email', 'address', 'is_active', 'created_at', 'updated_at'))
+        first_id = inserter.next_id()
+
+        def rows():
+            for i in range(count):
+                created_at = inserter.adapt_datetime(self.moment(1095))
+                yield (first_id + i, f'Bench Realty {i}', '', f'office{i}@example.com', '', True, created_at, created_at)
+
+        self.run(inserter, rows(), 'companies')
+        inserter.reset_sequence()
+        return range(first_id, first_id + count)
+
+    def seed_properties(self, count, brokers, companies):
+        """Listings with their images and amenities, in the same transactions"""
+        properties = Inserter(Property, (
+            'id', 'user_id', 'company_id', 'title', 'description', 'property_type_id', 'address', 'location_id',
+            'city', 'state', 'zip_code', 'country', 'price', 'square_footage', 'year_built', 'status',
+            'broker_name', 'broker_email', 'broker_phone', 'is_premium', 'is_verified', 'rank_score',
+            'created_at', 'updated_at',
+        ))
+        images = Inserter(Image, (
+            'property_id', 'image', 'caption', 'status', 'file_size', 'width', 'height', 'is_duplicate',
+            'created_at', 'updated_at',
+        ))
+        amenities = Inserter(Property.amenities.through, ('property_id', 'amenity_id'))
+        first_id = properties.next_id()
+        location = weighted(self.rng, self.locations)
+        property_type = weighted(self.rng, self.property_types)
+        status = weighted(self.rng, STATUSES)
+        image_status = weighted(self.rng, IMAGE_STATUSES)
+
+        start = time.perf_counter()
+        for batch_start in range(0, count, self.batch_size):
+            property_rows, image_rows, amenity_rows = [], [], []
+            for property_id in range(first_id + batch_start, first_id + min(count, batch_start + self.batch_size)):
+                location_id, city, state = location()
+                type_id, type_name, low, high = property_type()
+                created = self.moment(1095)
+                created_at = properties.adapt_datetime(created)
+                verified = self.rng.random() < 0.6
+                visible = hd = 0
+                for _ in range(self.rng.choice((0, 1, 2, 3, 3, 4, 5, 6))):
+                    width, state_of_image = self.rng.choice(IMAGE_WIDTHS), image_status()
+                    if state_of_image in VISIBLE_IMAGE_STATUSES:
+                        visible += 1
+                        hd = hd or width >= settings.PROPERTY_RANK_HD_IMAGE_WIDTH
+                    image_rows.append((
+                        property_id, f'property_images/benchmark/{self.rng.randrange(500)}.jpg', None,
+                        state_of_image, width * width // 8, width, width * 3 // 4, False, created_at, created_at,
+                    ))
+                amenity_rows.extend(
+                    (property_id, amenity_id)
+                    for amenity_id in self.rng.sample(self.amenity_ids, self.rng.randrange(7))
+                )
+                broker = self.rng.choice(brokers)
+                property_rows.append((
+                    property_id, broker, self.rng.choice(companies) if self.rng.random() < 0.4 else None,
+                    f'{type_name} in {city} #{property_id}',
+                    f'A {type_name.lower()} listed for benchmarking in {city}, {state}.',
+                    type_id, f'Ward {self.rng.randrange(1, 33)}, {city}', location_id, city, state, '44600', 'Nepal',
+                    Decimal(int(low * (high / low) ** self.rng.random())), self.rng.randrange(400, 20_000),
+                    self.rng.randrange(1980, 2026), status(), None, None, None, False, verified,
+                    compute_rank_score(created, None, verified, visible, hd), created_at, created_at,
+                ))
+            with transaction.atomic(using=properties.using):
+                properties.insert(property_rows)
+                images.insert(image_rows)
+                amenities.insert(amenity_rows)
+        for inserter in (properties, images, amenities):
+            inserter.reset_sequence()
+        self.report('properties', properties.count, start)
+        self.stdout.write(f"    with {images.count:,} images and {amenities.count:,} amenities")
+        return range(first_id, first_id + count)
+
+    def seed_saved_searches(self, count, users):
+        inserter = Inserter(SavedSearch, ('user_id', 'name', 'filters', 'alert_enabled', 'created_at'))
+        cities = [city for (_, city, _), _ in self.locations]
+        property_types = [name for (_, name, _, _), _ in self.property_types]
+
+        def rows():
+            for i in range(count):
+                city, property_type = self.rng.choice(cities), self.rng.choice(property_types)
+                max_price = self.rng.choice((10, 25, 50, 100, 250)) * 1_000_000
+                yield (
+                    self.rng.choice(users), f'{property_type} in {city}',
+                    f'city={city}&property_type={property_type}&max_price={max_price}',
+                    self.rng.random() < 0.3, inserter.adapt_datetime(self.moment(365)),
+                )
+
+        self.run(inserter, rows(), 'saved searches')
+
+    def ip_address(self):
+        host = self.rng.getrandbits(24)
+        return f'10.{host >> 16}.{host >> 8 & 255}.{host & 255}'
+
+    def popular(self, ids):
+        """An id, most often one of the first: a few listings get most of the traffic"""
+        return ids[int(len(ids) * self.rng.random() ** 3)]
+
+    def seed_page_views(self, count, properties, users):
+        inserter = Inserter(PageView, (
+            'property_id', 'user_id', 'url', 'ip_address', 'user_agent', 'session_key', 'timestamp',
+            'referrer', 'time_spent',
+        ))
+        days = settings.ANALYTICS_RETENTION_DAYS
+
+        def rows():
+            for _ in range(count):
+                if self.rng.random() < 0.8:
+                    property_id = self.popular(properties)
+                    url = f'/properties/{property_id}/'
+                else:
+                    property_id, url = None, self.rng.choice(('/', '/properties/', '/blog/', '/premium/'))
+                yield (
+                    property_id, self.rng.choice(users) if self.rng.random() < 0.2 else None, url,
+                    self.ip_address(),
+                    self.rng.choice(USER_AGENTS), f'{self.rng.getrandbits(128):032x}', inserter.adapt_datetime(self.moment(days)),
+                    self.rng.choice(REFERRERS), int(self.rng.expovariate(1 / 45)),
+                )
+
+        self.run(inserter, rows(), 'page views')
+
+    def seed_social_shares(self, count, properties, users):
+        inserter = Inserter(SocialShare, (
+            'user_id', 'property_id', 'platform', 'content_type', 'url_shared', 'page_title', 'ip_address',
+            'user_agent', 'session_key', 'timestamp', 'referrer', 'success', 'metadata',
+        ))
+        platform = weighted(self.rng, PLATFORMS)
+        days = settings.ANALYTICS_RETENTION_DAYS
+
+        def rows():
+            for _ in range(count):
+                if self.rng.random() < 0.7:
+                    property_id = self.popular(properties)
+                    content_type, path, title = 'property', f'/properties/{property_id}/', f'Listing {property_id}'
+                else:
+                    property_id, content_type, path, title = None, 'homepage', '/', 'Real Estate Net'
+                yield (
+                    self.rng.choice(users) if self.rng.random() < 0.3 else None, property_id, platform(),
+                    content_type, f'https://example.com{path}', title,
+                    self.ip_address(),
+                    self.rng.choice(USER_AGENTS), f'{self.rng.getrandbits(128):032x}', inserter.adapt_datetime(self.moment(days)),
+                    '', True, '{}',
+                )
+
+        self.run(inserter, rows(), 'social shares')
@@ -0,0 +1,52 @@
+import sqlite3
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from real_estate.routers import sync_marker_path
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the default SQLite database onto its replica files (settings.DATABASE_REPLICAS) '
+        'with the SQLite online backup API, once or every --interval seconds'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Keep syncing every this many seconds')
+        parser.add_argument('--replica', action='append', help='Only sync this replica alias (repeatable)')
+
+    def handle(self, *args, **options):
+        replicas = options['replica'] or settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('No replicas configured; set DATABASE_REPLICA_PATHS')
+        for alias in [DEFAULT_DB_ALIAS, *replicas]:
+            if alias not in settings.DATABASES:
+                raise CommandError(f'Unknown database alias: {alias}')
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias} is not SQLite; its replication is handled by the database server')
+
+        while True:
+            for alias in replicas:
+                self.sync(alias)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, alias):
+        start = time.monotonic()
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'], timeout=30)
+        try:
+            # One step: readers of the replica see either the old or the new copy
+            source.connection.backup(target)
+        finally:
+            target.close()
+        Path(sync_marker_path(alias)).touch()
+        self.stdout.write(self.style.SUCCESS(
+            f'Synced {alias} in {(time.monotonic() - start) * 1000:.0f} ms'
+        ))
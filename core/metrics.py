@@ -0,0 +1,202 @@
+"""
+In-process request metrics, exposed in Prometheus text format at /metrics.
+
+MetricsMiddleware (real_estate.middleware) opens a RequestMetrics for every request;
+database queries (through an execute wrapper installed on every connection) and
+top-level template renders (through TimedDjangoTemplates) add to it, and when the
+response is ready it is recorded in REGISTRY under the resolved URL name, so
+/properties/12/ and /properties/13/ share the ``properties:property_detail`` series.
+
+Each process keeps its own totals; scrape every worker (or sum the series) when
+running several.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_seconds', 'template_seconds', 'template_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+
+def start_request_metrics():
+    """Start collecting for the current request; returns (metrics, reset token)"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request_metrics(token):
+    _current.reset(token)
+
+
+def query_timer(execute, sql, params, many, context):
+    """Execute wrapper adding each query's count and time to the current request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver putting query_timer on every connection"""
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Only the outermost render counts; templates rendered from inside it are part of it
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing renders for the request metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}{format_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self):
+        for labels, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labels, labels)} {counts[-1]}'
+            yield f'{self.name}_count{format_labels(self.labels, labels)} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter(
+            'http_requests_total', 'Requests handled, by route, method and status', ('route', 'method', 'status'),
+        )
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'Time to build the response', ('route', 'method'), LATENCY_BUCKETS,
+        )
+        self.queries = Histogram(
+            'http_request_db_queries', 'Database queries per request', ('route',), QUERY_COUNT_BUCKETS,
+        )
+        self.db_time = Histogram(
+            'http_request_db_seconds', 'Time spent in database queries per request', ('route',), LATENCY_BUCKETS,
+        )
+        self.template_time = Histogram(
+            'http_request_template_seconds',
+            'Time spent rendering templates per request, including the queries they trigger',
+            ('route',), LATENCY_BUCKETS,
+        )
+        self.response_size = Histogram(
+            'http_response_size_bytes', 'Response body size (streaming responses excluded)', ('route',), SIZE_BUCKETS,
+        )
+        self.metrics = (self.requests, self.latency, self.queries, self.db_time, self.template_time, self.response_size)
+
+    def record(self, route, method, status, duration, metrics, size=None):
+        with self.lock:
+            self.requests.inc((route, method, status))
+            self.latency.observe((route, method), duration)
+            self.queries.observe((route,), metrics.queries)
+            self.db_time.observe((route,), metrics.db_seconds)
+            if metrics.template_seconds:
+                self.template_time.observe((route,), metrics.template_seconds)
+            if size is not None:
+                self.response_size.observe((route,), size)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def route_label(request):
+    """The resolved URL name (e.g. properties:property_detail), never the raw path"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name
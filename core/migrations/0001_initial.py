@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('owner', models.CharField(help_text='host:pid of the process holding the lock', max_length=255)),
+                ('acquired_at', models.DateTimeField()),
+                ('heartbeat_at', models.DateTimeField(help_text='The lock is considered abandoned once this is older than SCHEDULER_LOCK_TTL')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('started_at', models.DateTimeField()),
+                ('duration_ms', models.FloatField()),
+                ('success', models.BooleanField(default=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', 'started_at'], name='core_jobrun_job_c2c160_idx')],
+            },
+        ),
+    ]
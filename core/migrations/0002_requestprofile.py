@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('route', models.CharField(help_text='Resolved URL name', max_length=200)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('trigger', models.CharField(choices=[('header', 'Header'), ('query', 'Query flag'), ('sample', 'Sampled')], max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField()),
+                ('sql_ms', models.FloatField()),
+                ('call_tree', models.TextField(help_text='Calls taking at least PROFILE_MIN_FRACTION of the request')),
+                ('functions', models.TextField(help_text='Functions by cumulative time')),
+                ('queries', models.JSONField(default=list, help_text='Query shapes by total time')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['route', 'duration_ms'], name='core_reques_route_69330e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.db import models
+
+
+class SchedulerLock(models.Model):
+    """Single-instance lock held by the running scheduler process"""
+    name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=255, help_text="host:pid of the process holding the lock")
+    acquired_at = models.DateTimeField()
+    heartbeat_at = models.DateTimeField(help_text="The lock is considered abandoned once this is older than SCHEDULER_LOCK_TTL")
+
+    def __str__(self):
+        return f"{self.name} held by {self.owner}"
+
+
+class JobRun(models.Model):
+    """Timing of one scheduled job execution"""
+    job = models.CharField(max_length=100)
+    started_at = models.DateTimeField()
+    duration_ms = models.FloatField()
+    success = models.BooleanField(default=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['job', 'started_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.job} at {self.started_at} ({self.duration_ms:.0f} ms)"
+
+
+class RequestProfile(models.Model):
+    """cProfile call tree and SQL timings of one profiled request (core.profiling)"""
+    TRIGGER_CHOICES = (
+        ('header', 'Header'),
+        ('query', 'Query flag'),
+        ('sample', 'Sampled'),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    route = models.CharField(max_length=200, help_text="Resolved URL name")
+    status = models.PositiveSmallIntegerField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    sql_ms = models.FloatField()
+    call_tree = models.TextField(help_text="Calls taking at least PROFILE_MIN_FRACTION of the request")
+    functions = models.TextField(help_text="Functions by cumulative time")
+    queries = models.JSONField(default=list, help_text="Query shapes by total time")
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['route', 'duration_ms']),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,178 @@
+"""
+Repeated-query (N+1) detection for development and tests.
+
+While a request (real_estate.middleware.QueryPatternMiddleware) or a management
+command using RepeatedQueryCheckMixin runs, every query is reduced to its shape,
+with literals and IN lists collapsed, and counted per call site: the innermost frame
+in our own code.
+A shape run NPLUSONE_THRESHOLD times or more from one call site is an N+1. It is
+logged as a warning when NPLUSONE_ACTION is 'warn' (the default under DEBUG) and
+raised as RepeatedQueriesError when it is 'raise' (the default under
+``manage.py test``), with the stack of the call site, template lines included.
+
+Repeats matching a pattern in NPLUSONE_ALLOWLIST are ignored. The patterns are
+searched in the query shape, in each stack line and in the scope label
+("GET /properties/", "command:manage_subscriptions").
+"""
+import logging
+import re
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.template.base import TokenType
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('query_patterns', default=None)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+SELECT_LIST = re.compile(r'^SELECT .{80,}? FROM ')
+
+
+class RepeatedQueriesError(AssertionError):
+    """Raised for an N+1 when NPLUSONE_ACTION is 'raise'"""
+
+
+def query_shape(sql):
+    """sql with literals and IN lists collapsed, so every iteration of a loop looks the same"""
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    return IN_LIST.sub('IN (...)', sql)
+
+
+# Our files that every query passes through; they are never the call site
+PLUMBING = (
+    'manage.py', 'real_estate/middleware.py', 'real_estate/routers.py',
+    'core/metrics.py', 'core/nplusone.py', 'core/profiling.py',
+)
+
+
+def is_project_file(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+        and not filename.endswith(PLUMBING)
+    )
+
+
+def call_site():
+    """(file, line) of the innermost frame in our own code, or None"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if is_project_file(frame.f_code.co_filename):
+            return frame.f_code.co_filename, frame.f_lineno
+        frame = frame.f_back
+    return None
+
+
+def project_stack():
+    """The current stack, innermost last, limited to our code and the template lines being rendered"""
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if is_project_file(code.co_filename):
+            path = Path(code.co_filename).relative_to(settings.BASE_DIR)
+            frames.append(f'{path}:{frame.f_lineno} in {code.co_name}')
+        elif code.co_name == 'render_annotated' and 'self' in frame.f_locals:
+            node = frame.f_locals['self']
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                tag = '{{ %s }}' if token.token_type == TokenType.VAR else '{%% %s %%}'
+                frames.append(f'{origin.template_name}:{token.lineno} ' + tag % token.contents)
+        frame = frame.f_back
+    # Consecutive template nodes of one template line (a tag and the nodes inside it) read as one
+    deduplicated = [line for i, line in enumerate(frames) if not i or line != frames[i - 1]]
+    return deduplicated[::-1]
+
+
+class QueryPatterns:
+    def __init__(self, label):
+        self.label = label
+        self.counts = {}  # (shape, call site) -> count
+        self.stacks = {}  # (shape, call site) -> stack, kept once a shape repeats
+
+    def add(self, sql):
+        key = (query_shape(sql), call_site())
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        if count == settings.NPLUSONE_THRESHOLD:
+            self.stacks[key] = project_stack()
+
+    def repeats(self):
+        """[(count, shape, stack)] of the N+1s not covered by NPLUSONE_ALLOWLIST"""
+        allowlist = [re.compile(pattern) for pattern in settings.NPLUSONE_ALLOWLIST]
+        if any(pattern.search(self.label) for pattern in allowlist):
+            return []
+        found = []
+        for key, stack in self.stacks.items():
+            shape = key[0]
+            if not any(pattern.search(text) for pattern in allowlist for text in (shape, *stack)):
+                found.append((self.counts[key], shape, stack))
+        return sorted(found, key=lambda repeat: -repeat[0])
+
+    def report(self):
+        repeats = self.repeats()
+        if not repeats:
+            return
+        message = '\n\n'.join(
+            f'{count} x {SELECT_LIST.sub("SELECT ... FROM ", shape)}\n' + '\n'.join(f'    {line}' for line in stack)
+            for count, shape, stack in repeats
+        )
+        message = f'Repeated queries in {self.label}:\n\n{message}'
+        if settings.NPLUSONE_ACTION == 'raise':
+            raise RepeatedQueriesError(message)
+        logger.warning(message)
+
+
+def pattern_recorder(execute, sql, params, many, context):
+    """Execute wrapper counting each query in the current scope"""
+    patterns = _current.get()
+    if patterns is not None:
+        patterns.add(sql)
+    return execute(sql, params, many, context)
+
+
+def install_pattern_recorder(sender, connection, **kwargs):
+    """connection_created receiver putting pattern_recorder on every connection"""
+    if pattern_recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(pattern_recorder)
+
+
+@contextmanager
+def detect_repeated_queries(label):
+    """
+    Check the queries run inside the block, reporting N+1s when it completes. With
+    NPLUSONE_ACTION unset the block isn't checked, not even by an enclosing scope.
+    """
+    if not settings.NPLUSONE_ACTION:
+        token = _current.set(None)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+        return
+    patterns = QueryPatterns(label)
+    token = _current.set(patterns)
+    try:
+        yield patterns
+    finally:
+        _current.reset(token)
+    patterns.report()
+
+
+class RepeatedQueryCheckMixin:
+    """
+    BaseCommand mixin running the command inside detect_repeated_queries, for commands
+    that loop over rows. Commands that repeat queries on purpose (polling loops, batch
+    after batch) simply don't opt in.
+    """
+
+    def execute(self, *args, **options):
+        with detect_repeated_queries(f'command:{type(self).__module__.rsplit(".", 1)[-1]}'):
+            return super().execute(*args, **options)
@@ -0,0 +1,224 @@
+"""
+Opt-in profiling of single requests, stored as RequestProfile rows for the admin.
+
+ProfilingMiddleware (real_estate.middleware) profiles a request with cProfile when
+a superuser asks for it, with an ``X-Profile: 1`` header or a ``_profile=1`` query
+parameter, and, with PROFILE_SAMPLE_RATE = N, one request in N from anyone. A
+profile keeps the call tree, the functions with the most cumulative time and the
+request's queries grouped by shape with their times. Only the newest
+PROFILE_MAX_ROWS profiles are kept.
+
+cProfile follows one thread: under ASGI it sees the event loop (async views and
+middleware, and whatever else the loop runs meanwhile) but not sync code handed to
+worker threads, whose queries are still timed. One request is profiled at a time per
+process: Python 3.12+ refuses to enable a second profiler while one is active, so a
+request arriving meanwhile simply runs unprofiled.
+"""
+import cProfile
+import random
+import sysconfig
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from real_estate.routers import outside_request_routing
+
+from .metrics import route_label
+from .models import RequestProfile
+from .nplusone import query_shape
+
+TOP_FUNCTIONS = 60
+TOP_QUERIES = 50
+MAX_TREE_DEPTH = 40
+MAX_TREE_LINES = 400
+
+_current = ContextVar('profiled_queries', default=None)
+_active = threading.Lock()  # held while a request is being profiled
+
+
+def requested_trigger(request):
+    """'header' or 'query' if the request asks to be profiled; honoured for superusers only"""
+    if request.headers.get('X-Profile') == '1':
+        return 'header'
+    if request.GET.get('_profile') == '1':
+        return 'query'
+    return None
+
+
+def profile_trigger(request, user):
+    """Why this request should be profiled ('header', 'query' or 'sample'), or None"""
+    trigger = requested_trigger(request)
+    if trigger and user.is_superuser:
+        return trigger
+    if settings.PROFILE_SAMPLE_RATE and random.randrange(settings.PROFILE_SAMPLE_RATE) == 0:
+        return 'sample'
+    return None
+
+
+def query_recorder(execute, sql, params, many, context):
+    """Execute wrapper timing each query of a profiled request"""
+    queries = _current.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append((sql, time.perf_counter() - start))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver putting query_recorder on every connection"""
+    if query_recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_recorder)
+
+
+def function_label(func):
+    """'django/db/models/query.py:1234(count)' for a pstats function key"""
+    filename, line, name = func
+    if filename == '~':
+        return name  # a builtin, e.g. <method 'execute' of 'sqlite3.Cursor' objects>
+    # site-packages lives under the standard library directory, so it is tried first
+    paths = sysconfig.get_paths()
+    for prefix in (settings.BASE_DIR, paths['purelib'], paths['platlib'], paths['stdlib']):
+        prefix = f'{prefix}/'
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f'{filename}:{line}({name})'
+
+
+def call_tree(stats, total, min_seconds):
+    """
+    The calls taking at least min_seconds, indented under their callers. cProfile
+    records caller/callee pairs, not full paths, so a function called from several
+    places shows the same children under each of them.
+    """
+    children = {}
+    for func, (*_, callers) in stats.items():
+        for caller, (caller_calls, _, _, caller_cumulative) in callers.items():
+            children.setdefault(caller, []).append((caller_cumulative, caller_calls, func))
+    roots = [(cumulative, calls, func) for func, (_, calls, _, cumulative, callers) in stats.items() if not callers]
+
+    lines = [f'{total * 1000:9.1f} ms  (request)']
+
+    def walk(entries, depth, path):
+        for seconds, calls, func in sorted(entries, key=lambda entry: -entry[0]):
+            if seconds < min_seconds or func in path or len(lines) >= MAX_TREE_LINES:
+                continue
+            lines.append(f'{seconds * 1000:9.1f} ms {calls:>6}x  {"  " * depth}{function_label(func)}')
+            if depth < MAX_TREE_DEPTH:
+                walk(children.get(func, ()), depth + 1, path | {func})
+
+    walk(roots, 0, frozenset())
+    return '\n'.join(lines)
+
+
+def top_functions(stats):
+    ranked = sorted(stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]
+    lines = [f'{"cumulative":>12} {"own":>10} {"calls":>7}  function']
+    for func, (_, calls, own, cumulative, _) in ranked:
+        lines.append(f'{cumulative * 1000:9.1f} ms {own * 1000:7.1f} ms {calls:>7}  {function_label(func)}')
+    return '\n'.join(lines)
+
+
+def group_queries(queries):
+    """[{'sql', 'count', 'ms'}] per query shape, slowest total first"""
+    shapes = {}
+    for sql, seconds in queries:
+        entry = shapes.setdefault(query_shape(sql), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+    ranked = sorted(shapes.items(), key=lambda item: -item[1][1])[:TOP_QUERIES]
+    return [{'sql': sql, 'count': count, 'ms': round(seconds * 1000, 2)} for sql, (count, seconds) in ranked]
+
+
+# The roots of the call tree. Django's handler calls itself through the middleware
+# chain, so it can't be one: the profile lists it among its own callers.
+def profiled_request(get_response, request):
+    return get_response(request)
+
+
+async def aprofiled_request(get_response, request):
+    return await get_response(request)
+
+
+class RequestProfiler:
+    def __init__(self, trigger):
+        self.trigger = trigger
+        self.profile = cProfile.Profile()
+        self.queries = []
+
+    @classmethod
+    def acquire(cls, trigger):
+        """A profiler for the request, or None while another request is being profiled"""
+        if not _active.acquire(blocking=False):
+            return None
+        try:
+            return cls(trigger)
+        except BaseException:
+            _active.release()
+            raise
+
+    def run(self, get_response, request):
+        """get_response(request), profiled"""
+        self.start()
+        try:
+            return profiled_request(get_response, request)
+        finally:
+            self.stop()
+
+    async def arun(self, get_response, request):
+        self.start()
+        try:
+            return await aprofiled_request(get_response, request)
+        finally:
+            self.stop()
+
+    def start(self):
+        """Start profiling; the profiler must come from acquire(), and stop() releases it"""
+        self.token = _current.set(self.queries)
+        self.started = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self):
+        try:
+            self.profile.disable()
+            self.duration = time.perf_counter() - self.started
+            _current.reset(self.token)
+        finally:
+            _active.release()
+
+    def save(self, request, response, user):
+        self.profile.create_stats()
+        stats = self.profile.stats
+        # Storing the profile is not the client's write, so it mustn't pin the client's
+        # reads to the primary (real_estate.routers)
+        with outside_request_routing():
+            RequestProfile.objects.create(
+                method=request.method,
+                path=request.get_full_path()[:500],
+                route=route_label(request)[:200],
+                status=response.status_code,
+                trigger=self.trigger,
+                user_id=user.pk if user.is_authenticated else None,
+                duration_ms=self.duration * 1000,
+                query_count=len(self.queries),
+                sql_ms=sum(seconds for _, seconds in self.queries) * 1000,
+                call_tree=call_tree(stats, self.duration, self.duration * settings.PROFILE_MIN_FRACTION),
+                functions=top_functions(stats),
+                queries=group_queries(self.queries),
+            )
+            trim_profiles()
+
+
+def trim_profiles():
+    """Delete all but the newest PROFILE_MAX_ROWS profiles"""
+    profiles = RequestProfile.objects.using(DEFAULT_DB_ALIAS)
+    newest = profiles.order_by('-pk').values_list('pk', flat=True)
+    oldest_kept = newest[settings.PROFILE_MAX_ROWS - 1:settings.PROFILE_MAX_ROWS]
+    if oldest_kept:
+        profiles.filter(pk__lt=oldest_kept[0]).delete()
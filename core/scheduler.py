@@ -0,0 +1,321 @@
+"""
+In-process job scheduler used by the run_scheduler command.
+
+Jobs come from settings.SCHEDULER_JOBS; each has an interval (seconds) or a cron
+expression, optional jitter, and either a management command or a dotted callable
+(called with the Scheduler, so it can add timers).
+Only the process holding the database SchedulerLock runs jobs; others wait on
+standby and take over when its heartbeat goes stale. One-off timers (e.g. a premium
+listing's expiry) share the same run loop.
+"""
+import heapq
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import JobRun, SchedulerLock
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalSchedule:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def next_after(self, moment):
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return f"every {self.seconds}s"
+
+
+class CronSchedule:
+    """
+    Five-field cron expression (minute hour day-of-month month day-of-week) in local time.
+
+    Fields accept ``*``, numbers, ranges (``1-5``), steps (``*/15``, ``0-30/10``) and
+    comma-separated lists. Day of week is 0-6 with 0 = Sunday. As in cron, when both day
+    fields are restricted (neither starts with ``*``) a day matching either one runs.
+    """
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self.parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        )
+        self.either_day = not fields[2].startswith('*') and not fields[4].startswith('*')
+
+    @staticmethod
+    def parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            value_range, _, step = part.partition('/')
+            if value_range == '*':
+                start, end = low, high
+            elif '-' in value_range:
+                start, end = (int(value) for value in value_range.split('-'))
+            else:
+                start = end = int(value_range)
+            if step and value_range != '*' and '-' not in value_range:
+                end = high
+            if start < low or end > high:
+                raise ValueError(f"Cron field {field!r} outside {low}-{high}")
+            values.update(range(start, end + 1, int(step or 1)))
+        return values
+
+    def next_after(self, moment):
+        """First matching minute strictly after moment"""
+        candidate = timezone.localtime(moment).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 4)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self.matches_day(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+    def matches_day(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        return (day or weekday) if self.either_day else (day and weekday)
+
+    def __str__(self):
+        return f"cron '{self.expression}'"
+
+
+class Job:
+    def __init__(self, name, func, schedule, jitter=0, run_on_start=False):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.jitter = jitter
+        self.run_on_start = run_on_start
+
+    @classmethod
+    def from_setting(cls, name, spec):
+        if 'cron' in spec:
+            schedule = CronSchedule(spec['cron'])
+        else:
+            schedule = IntervalSchedule(spec['interval'])
+
+        if 'command' in spec:
+            args = spec.get('args', [])
+            func = lambda scheduler: call_command(spec['command'], *args, verbosity=0)
+        else:
+            func = import_string(spec['callable'])
+        return cls(name, func, schedule, spec.get('jitter', 0), spec.get('run_on_start', False))
+
+    def next_run(self, after):
+        run_at = self.schedule.next_after(after)
+        if self.jitter:
+            # Spread jobs of several deployments so they don't fire in lockstep
+            run_at += timedelta(seconds=random.uniform(0, self.jitter))
+        return run_at
+
+
+class JobStats:
+    """In-memory timing metrics of one job"""
+
+    def __init__(self):
+        self.runs = self.failures = 0
+        self.total_ms = self.max_ms = 0.0
+        self.last_ms = None
+
+    def record(self, duration_ms, success):
+        self.runs += 1
+        self.failures += 0 if success else 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.last_ms = duration_ms
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.runs if self.runs else 0.0
+
+
+class Scheduler:
+    lock_name = 'scheduler'
+
+    def __init__(self, jobs=None, tick=None):
+        self.jobs = {job.name: job for job in (jobs or load_jobs())}
+        self.tick = tick or settings.SCHEDULER_TICK_SECONDS
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop_event = threading.Event()
+        self.stats = {name: JobStats() for name in self.jobs}
+        self.queue = []  # heap of (run_at, sequence, kind, key)
+        self.timers = {}  # timer key -> (run_at, func)
+        self.sequence = 0
+        self.has_lock = False
+
+    # Locking
+
+    def acquire_lock(self):
+        """Take or refresh the single-instance lock; returns whether this process holds it"""
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.SCHEDULER_LOCK_TTL)
+        taken = SchedulerLock.objects.filter(
+            Q(owner=self.owner) | Q(heartbeat_at__lt=stale), name=self.lock_name
+        ).update(owner=self.owner, heartbeat_at=now)
+        if not taken:
+            try:
+                SchedulerLock.objects.create(
+                    name=self.lock_name, owner=self.owner, acquired_at=now, heartbeat_at=now
+                )
+                taken = 1
+            except IntegrityError:
+                taken = 0
+        if taken and not self.has_lock:
+            SchedulerLock.objects.filter(name=self.lock_name, owner=self.owner).update(acquired_at=now)
+            logger.info(f"Scheduler lock acquired by {self.owner}")
+        elif self.has_lock and not taken:
+            logger.warning(f"Scheduler lock lost by {self.owner}; going to standby")
+        self.has_lock = bool(taken)
+        return self.has_lock
+
+    def heartbeat(self):
+        """Keep the lock fresh from a side thread while long jobs run"""
+        interval = settings.SCHEDULER_LOCK_TTL / 3
+        try:
+            while not self.stop_event.wait(interval):
+                if self.has_lock:
+                    SchedulerLock.objects.filter(name=self.lock_name, owner=self.owner).update(
+                        heartbeat_at=timezone.now()
+                    )
+        finally:
+            connection.close()
+
+    def release_lock(self):
+        SchedulerLock.objects.filter(name=self.lock_name, owner=self.owner).delete()
+        self.has_lock = False
+
+    # Queue
+
+    def push(self, run_at, kind, key):
+        self.sequence += 1
+        heapq.heappush(self.queue, (run_at, self.sequence, kind, key))
+
+    def schedule_jobs(self, now=None):
+        now = now or timezone.now()
+        self.queue = [entry for entry in self.queue if entry[2] != 'job']
+        heapq.heapify(self.queue)
+        for job in self.jobs.values():
+            self.push(now if job.run_on_start else job.next_run(now), 'job', job.name)
+
+    def add_timer(self, key, run_at, func):
+        """
+        Run func once at run_at. Re-adding a key replaces its timer, so callers can
+        resync timers without creating duplicates.
+        """
+        current = self.timers.get(key)
+        if current and current[0] == run_at:
+            return
+        self.timers[key] = (run_at, func)
+        self.push(run_at, 'timer', key)
+
+    def cancel_timer(self, key):
+        self.timers.pop(key, None)
+
+    # Running
+
+    def run_job(self, job):
+        started_at = timezone.now()
+        start = time.monotonic()
+        error = ''
+        try:
+            job.func(self)
+        except Exception as e:
+            logger.exception(f"Scheduled job {job.name} failed")
+            error = f"{type(e).__name__}: {e}"
+        duration_ms = (time.monotonic() - start) * 1000
+
+        self.stats[job.name].record(duration_ms, not error)
+        JobRun.objects.create(
+            job=job.name, started_at=started_at, duration_ms=duration_ms, success=not error, error=error
+        )
+        if self.stats[job.name].runs % settings.SCHEDULER_JOB_RUN_HISTORY == 0:
+            prune_job_runs(job.name)
+        return not error
+
+    def run_due(self, now=None):
+        """Run every job and timer that is due; returns the number run"""
+        now = now or timezone.now()
+        ran = 0
+        while self.queue and self.queue[0][0] <= now and not self.stop_event.is_set():
+            run_at, _, kind, key = heapq.heappop(self.queue)
+            close_old_connections()
+            if kind == 'job':
+                job = self.jobs[key]
+                self.run_job(job)
+                self.push(job.next_run(max(now, timezone.now())), 'job', key)
+            else:
+                timer = self.timers.get(key)
+                if timer is None or timer[0] != run_at:
+                    continue  # cancelled or rescheduled
+                del self.timers[key]
+                try:
+                    timer[1]()
+                except Exception:
+                    logger.exception(f"Timer {key} failed")
+            ran += 1
+        return ran
+
+    def seconds_until_next(self):
+        if not self.queue:
+            return self.tick
+        wait = (self.queue[0][0] - timezone.now()).total_seconds()
+        return min(max(wait, 0), self.tick)
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def run_forever(self):
+        """Main loop; returns after stop() once the current job has finished"""
+        self.schedule_jobs()
+        heartbeat = threading.Thread(target=self.heartbeat, name='scheduler-heartbeat', daemon=True)
+        heartbeat.start()
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                if self.acquire_lock():
+                    self.run_due()
+                self.stop_event.wait(self.seconds_until_next() if self.has_lock else self.tick)
+        finally:
+            self.stop_event.set()
+            heartbeat.join()
+            if self.has_lock:
+                self.release_lock()
+
+
+def load_jobs():
+    return [Job.from_setting(name, spec) for name, spec in settings.SCHEDULER_JOBS.items()]
+
+
+def prune_job_runs(job):
+    """Keep the latest SCHEDULER_JOB_RUN_HISTORY runs of a job"""
+    keep = settings.SCHEDULER_JOB_RUN_HISTORY
+    cutoff = list(
+        JobRun.objects.filter(job=job).order_by('-started_at').values_list('started_at', flat=True)[keep:keep + 1]
+    )
+    if cutoff:
+        JobRun.objects.filter(job=job, started_at__lte=cutoff[0]).delete()
@@ -0,0 +1,534 @@
+import json
+import os
+import random
+import re
+import runpy
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from analytics.models import PageView
+from properties.models import Property, PropertyType
+from real_estate.exports import start_background_export
+from real_estate.middleware import ConnectionTimingMiddleware, ReplicaPinningMiddleware
+from real_estate.routers import _replica_lag, end_request_routing, start_request_routing
+
+from .management.commands.explain_queries import Command as ExplainQueriesCommand
+from .models import RequestProfile, SchedulerLock
+from .profiling import RequestProfiler
+from .scheduler import CronSchedule, IntervalSchedule, Job, Scheduler
+
+
+@override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_MAX_ROWS=2)
+class RequestProfileTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def test_superuser_profiles_a_request_on_demand(self):
+        self.client.get('/?_profile=1')
+        self.assertFalse(RequestProfile.objects.exists())
+
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        for _ in range(3):
+            response = self.client.get('/', HTTP_X_PROFILE='1')
+        self.assertNotIn('primary_pin', response.cookies)
+
+        self.assertEqual(RequestProfile.objects.count(), 2)
+        profile = RequestProfile.objects.first()
+        self.assertEqual((profile.route, profile.trigger, profile.status), ('home', 'header', 200))
+        self.assertIn('properties/views.py', profile.call_tree)
+
+    def test_request_arriving_while_another_is_profiled_runs_unprofiled(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        profiler = RequestProfiler.acquire('header')
+        self.assertIsNone(RequestProfiler.acquire('header'))
+        profiler.start()
+        try:
+            response = self.client.get('/', HTTP_X_PROFILE='1')
+        finally:
+            profiler.stop()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(RequestProfile.objects.exists())
+        self.client.get('/', HTTP_X_PROFILE='1')
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+
+class WriteTrackingTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def routing_after(self, work):
+        token = start_request_routing()
+        try:
+            work()
+        finally:
+            routing = end_request_routing(token)
+        return routing
+
+    def test_only_statements_modifying_the_primary_count_as_writes(self):
+        self.assertFalse(self.routing_after(lambda: router.db_for_write(Property)).wrote)
+        self.assertFalse(self.routing_after(lambda: PageView.objects.create(url='https://example.com/')).wrote)
+        self.assertTrue(self.routing_after(lambda: Property.objects.filter(pk=0).update(price=1)).wrote)
+
+
+class SqlitePragmaTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def journal_mode(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def test_every_database_uses_wal(self):
+        for alias in ('default', 'analytics'):
+            with self.subTest(alias):
+                self.assertEqual(self.journal_mode(connections[alias]), 'wal')
+
+    def test_wal_is_opt_in(self):
+        default = connections[DEFAULT_DB_ALIAS]
+        with tempfile.TemporaryDirectory() as directory:
+            for wal, expected in ((False, ('delete', 2)), (True, ('wal', 1))):
+                with self.subTest(wal=wal), override_settings(SQLITE_WAL=wal):
+                    connection = type(default)(
+                        {**default.settings_dict, 'NAME': str(Path(directory) / f'{wal}.sqlite3')}, DEFAULT_DB_ALIAS,
+                    )
+                    try:
+                        with connection.cursor() as cursor:
+                            cursor.execute('PRAGMA synchronous')
+                            self.assertEqual((self.journal_mode(connection), cursor.fetchone()[0]), expected)
+                    finally:
+                        connection.close()
+
+
+@override_settings(SERVER_TIMING=True)
+class ServerTimingTests(TransactionTestCase):
+    databases = {'default', 'analytics'}
+
+    def timings(self, view):
+        response = ConnectionTimingMiddleware(view)(RequestFactory().get('/'))
+        return {
+            name: desc for name, desc in re.findall(r'(db-\w+);dur=\d+\.\d\d;desc="([^"]*)"', response['Server-Timing'])
+        }
+
+    def query(self, request):
+        PropertyType.objects.count()
+        return HttpResponse()
+
+    def test_opened_and_checked_connections_are_reported(self):
+        connections[DEFAULT_DB_ALIAS].close()
+        self.assertEqual(self.timings(self.query)['db-default'], '1 opened, 0 checked')
+
+        def reuse(request):
+            close_old_connections()  # what request_started does outside the test client
+            return self.query(request)
+        self.assertEqual(self.timings(reuse)['db-default'], '0 opened, 1 checked')
+
+    def test_connections_the_request_did_not_use_are_left_out(self):
+        connections['analytics'].close()
+        self.assertNotIn('db-analytics', self.timings(self.query))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        response = ConnectionTimingMiddleware(self.query)(RequestFactory().get('/'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class ConnectionSettingsTests(TestCase):
+    """CONN_MAX_AGE, CONN_HEALTH_CHECKS and pool options derived for each database in settings.py"""
+
+    def databases_with(self, **environ):
+        environ = {'DATABASE_REPLICA_URLS': 'postgres://app:pw@standby:5432/real_estate', **environ}
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(str(settings.BASE_DIR / 'real_estate' / 'settings.py'))['DATABASES']
+
+    def test_persistent_health_checked_connections_by_default(self):
+        databases = self.databases_with()
+        self.assertEqual(set(databases), {'default', 'analytics', 'replica1'})
+        for alias, database in databases.items():
+            with self.subTest(alias):
+                self.assertEqual(database['CONN_MAX_AGE'], 600)
+                self.assertIs(database['CONN_HEALTH_CHECKS'], True)
+                self.assertNotIn('pool', database.get('OPTIONS', {}))
+
+    def test_conn_max_age_none_keeps_connections_open(self):
+        for database in self.databases_with(DATABASE_CONN_MAX_AGE='none').values():
+            self.assertIsNone(database['CONN_MAX_AGE'])
+
+    def test_pool_is_only_for_postgresql(self):
+        databases = self.databases_with(DATABASE_POOL='true', DATABASE_POOL_MAX_SIZE='4')
+        self.assertEqual(databases['replica1']['CONN_MAX_AGE'], 0)
+        self.assertEqual(databases['replica1']['OPTIONS']['pool'], {'min_size': 2, 'max_size': 4, 'timeout': 10})
+        for alias in ('default', 'analytics'):
+            with self.subTest(alias):
+                self.assertEqual(databases[alias]['CONN_MAX_AGE'], 600)
+                self.assertNotIn('OPTIONS', databases[alias])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], REPLICA_MAX_LAG_SECONDS=10, REPLICA_LAG_CHECK_SECONDS=3600)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        self.set_lag(replica1=0, replica2=3)
+        self.addCleanup(_replica_lag.clear)
+        self.factory = RequestFactory()
+
+    def set_lag(self, **lags):
+        for alias, lag in lags.items():
+            _replica_lag[alias] = (time.monotonic(), lag)
+
+    def reads_from(self, request, work=None):
+        """The database a request's Property read goes to (after running work), and its response"""
+        def view(request):
+            if work:
+                work()
+            return HttpResponse(router.db_for_read(Property))
+        response = ReplicaPinningMiddleware(view)(request)
+        return response.content.decode(), response
+
+    def test_get_requests_read_from_fresh_replicas(self):
+        self.assertEqual(router.db_for_read(Property), DEFAULT_DB_ALIAS)
+        self.assertEqual(
+            {self.reads_from(self.factory.get('/'))[0] for _ in range(50)}, {'replica1', 'replica2'},
+        )
+
+        token = start_request_routing()
+        try:
+            self.assertEqual(router.db_for_read(Session), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(PageView), 'analytics')
+            self.assertEqual(router.db_for_write(Property), DEFAULT_DB_ALIAS)
+        finally:
+            end_request_routing(token)
+
+    def test_lagging_replicas_are_skipped(self):
+        self.set_lag(replica2=11)
+        self.assertEqual({self.reads_from(self.factory.get('/'))[0] for _ in range(20)}, {'replica1'})
+
+        self.set_lag(replica1=None)
+        self.assertEqual(self.reads_from(self.factory.get('/'))[0], DEFAULT_DB_ALIAS)
+
+    def test_unsafe_methods_and_pinned_clients_read_from_the_primary(self):
+        self.assertEqual(self.reads_from(self.factory.post('/'))[0], DEFAULT_DB_ALIAS)
+
+        pinned = self.factory.get('/')
+        pinned.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        self.assertEqual(self.reads_from(pinned)[0], DEFAULT_DB_ALIAS)
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        database, response = self.reads_from(self.factory.get('/'))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        database, response = self.reads_from(
+            self.factory.get('/'), lambda: Property.objects.filter(pk=0).update(price=1),
+        )
+        self.assertEqual(database, DEFAULT_DB_ALIAS)
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        token = start_request_routing()
+        try:
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Property), DEFAULT_DB_ALIAS)
+            self.assertIn(router.db_for_read(Property), ('replica1', 'replica2'))
+        finally:
+            end_request_routing(token)
+
+
+def at(text):
+    return timezone.make_aware(datetime.fromisoformat(text))
+
+
+class CronScheduleTests(TestCase):
+    def assertRuns(self, expression, after, *expected):
+        schedule = CronSchedule(expression)
+        moment = at(after)
+        for text in expected:
+            moment = schedule.next_after(moment)
+            self.assertEqual(moment, at(text))
+
+    def test_next_after(self):
+        self.assertRuns('0 2 * * *', '2026-03-02 01:30', '2026-03-02 02:00', '2026-03-03 02:00')
+        self.assertRuns('*/15 * * * *', '2026-03-02 10:07:30', '2026-03-02 10:15', '2026-03-02 10:30')
+        self.assertRuns('30 3 1 * *', '2026-01-31 04:00', '2026-02-01 03:30', '2026-03-01 03:30')
+        self.assertRuns('0 0 29 2 *', '2026-03-01 00:00', '2028-02-29 00:00')
+        # Weekdays only: Friday, then Monday
+        self.assertRuns('0 9 * * 1-5', '2026-03-05 12:00', '2026-03-06 09:00', '2026-03-09 09:00')
+
+    def test_both_day_fields_restricted_match_either(self):
+        # The 13th (a Monday in April 2026) or any Friday
+        self.assertRuns('0 0 13 * 5', '2026-04-09 12:00', '2026-04-10 00:00', '2026-04-13 00:00', '2026-04-17 00:00')
+        # A stepped day of month counts as unrestricted: Sundays on odd days only
+        self.assertRuns('0 0 */2 * 0', '2026-03-01 12:00', '2026-03-15 00:00', '2026-03-29 00:00')
+
+    def test_invalid_expressions(self):
+        for expression in ('0 2 * *', '60 * * * *', '0 0 32 * *', '0 0 * * 7'):
+            with self.subTest(expression), self.assertRaises(ValueError):
+                CronSchedule(expression)
+
+
+class JobJitterTests(TestCase):
+    def test_jitter_delays_within_its_window(self):
+        now = at('2026-03-02 10:00')
+        self.assertEqual(Job('tick', None, IntervalSchedule(60)).next_run(now), now + timedelta(seconds=60))
+
+        random.seed(36)
+        job = Job('tick', None, IntervalSchedule(60), jitter=10)
+        delays = {(job.next_run(now) - now).total_seconds() for _ in range(50)}
+        self.assertTrue(all(60 <= delay <= 70 for delay in delays))
+        self.assertGreater(max(delays) - min(delays), 5)
+
+
+class SchedulerLockTests(TransactionTestCase):
+    def scheduler(self, owner):
+        scheduler = Scheduler(jobs=[Job('tick', None, IntervalSchedule(60))])
+        scheduler.owner = owner
+        return scheduler
+
+    def test_one_instance_holds_the_lock_until_its_heartbeat_goes_stale(self):
+        first, second = self.scheduler('host:1'), self.scheduler('host:2')
+        self.assertTrue(first.acquire_lock())
+        self.assertFalse(second.acquire_lock())
+        self.assertTrue(first.acquire_lock())
+
+        SchedulerLock.objects.update(heartbeat_at=timezone.now() - timedelta(seconds=61))
+        self.assertTrue(second.acquire_lock())
+        self.assertEqual(SchedulerLock.objects.get().owner, 'host:2')
+        self.assertFalse(first.acquire_lock())
+        self.assertFalse(first.has_lock)
+
+        second.release_lock()
+        self.assertTrue(first.acquire_lock())
+
+    @override_settings(SCHEDULER_LOCK_TTL=0.3)
+    def test_heartbeat_keeps_only_its_own_lock_fresh(self):
+        holder = self.scheduler('host:1')
+        self.assertTrue(holder.acquire_lock())
+        started = SchedulerLock.objects.get().heartbeat_at
+
+        heartbeat = threading.Thread(target=holder.heartbeat)
+        heartbeat.start()
+        try:
+            time.sleep(0.35)
+            refreshed = SchedulerLock.objects.get().heartbeat_at
+            self.assertGreater(refreshed, started)
+            self.assertFalse(self.scheduler('host:2').acquire_lock())
+
+            # Taken over while this process was stalled: its heartbeat doesn't take it back
+            SchedulerLock.objects.update(owner='host:2', heartbeat_at=timezone.now())
+            time.sleep(0.25)
+            self.assertEqual(SchedulerLock.objects.get().owner, 'host:2')
+        finally:
+            holder.stop()
+            heartbeat.join()
+
+
+class CsvExportTests(TransactionTestCase):
+    """The background export runs in another thread, which only sees committed rows"""
+    databases = {'default', 'analytics'}
+    changelist = '/real-admin/properties/property/'
+
+    def setUp(self):
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        self.root = Path(export_root.name)
+        settings_override = override_settings(EXPORT_ROOT=self.root, EXPORT_STREAM_MAX_ROWS=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        office = PropertyType.objects.create(name='Office')
+        self.listings = [
+            Property.objects.create(
+                user=self.admin, title=f'Listing {i}', description='-', property_type=office,
+                address='-', city='Kathmandu', state='Bagmati', zip_code='44600', price=1000,
+            )
+            for i in range(3)
+        ]
+        self.client.force_login(self.admin)
+
+    def export(self, listings):
+        return self.client.post(self.changelist, {
+            'action': 'export_properties', '_selected_action': [listing.pk for listing in listings],
+        })
+
+    def join_exports(self):
+        for thread in threading.enumerate():
+            if thread.name.startswith('export-'):
+                thread.join()
+
+    def test_small_selection_is_streamed(self):
+        response = self.export(self.listings[:2])
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Listing 0', lines[1])
+        self.assertIn('Listing 1', lines[2])
+        self.assertEqual(list(self.root.iterdir()), [])
+
+    def test_large_selection_is_exported_in_the_background(self):
+        response = self.export(self.listings)
+        self.assertEqual(response.status_code, 302)
+        self.join_exports()
+
+        [export_path] = self.root.iterdir()
+        self.assertRegex(export_path.name, r'^properties_export_\d{8}_\d{6}_[0-9a-f]{8}\.csv$')
+        response = self.client.get(f'{self.changelist}exports/{export_path.name}/')
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+    def test_failed_export_is_reported(self):
+        filename = 'properties_export_20261019_120000_0badc0de.csv'
+        with self.assertLogs('real_estate.exports', 'ERROR'):
+            start_background_export(filename, [('Title', 'no_such_field')], Property.objects.all()).join()
+        self.assertEqual([path.name for path in self.root.iterdir()], [f'{filename}.failed'])
+
+        response = self.client.get(f'{self.changelist}exports/{filename}/', follow=True)
+        self.assertRedirects(response, self.changelist)
+        self.assertContains(response, f'Export {filename} failed: FieldError')
+
+    def test_unfinished_and_foreign_exports_are_not_served(self):
+        running = 'properties_export_20261019_120000_00000001.csv'
+        interrupted = 'properties_export_20261019_120000_00000002.csv'
+        (self.root / f'{running}.partial').write_text('Title\n')
+        (self.root / f'{interrupted}.partial').write_text('Title\n')
+        stale = time.time() - settings.EXPORT_STALE_SECONDS - 1
+        os.utime(self.root / f'{interrupted}.partial', (stale, stale))
+        (self.root / 'pageviews_export_20261019_120000_00000003.csv').write_text('URL\n')
+        (self.root / 'properties_export_20261019_120000_00000004.txt').write_text('Title\n')
+
+        for filename in (
+            running, 'pageviews_export_20261019_120000_00000003.csv',
+            'properties_export_20261019_120000_00000004.txt', 'properties_export_missing.csv',
+        ):
+            with self.subTest(filename):
+                response = self.client.get(f'{self.changelist}exports/{filename}/')
+                self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(f'{self.changelist}exports/{interrupted}/', follow=True)
+        self.assertContains(response, f'Export {interrupted} failed: Interrupted before it finished')
+        self.assertFalse((self.root / f'{interrupted}.partial').exists())
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape-token')
+class MetricsEndpointTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def home_requests(self, exposition):
+        match = re.search(r'^http_request_duration_seconds_count\{route="home",method="GET"\} (\d+)$', exposition, re.M)
+        return int(match.group(1)) if match else 0
+
+    def test_access_needs_a_superuser_or_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        self.client.force_login(get_user_model().objects.create_user('user', 'user@example.com', 'pw'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.scrape(HTTP_AUTHORIZATION='Bearer scrape-token')
+
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.scrape()
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_configured_accepts_no_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_requests_are_recorded_per_route(self):
+        before = self.home_requests(self.scrape(HTTP_AUTHORIZATION='Bearer scrape-token'))
+        self.client.get('/')
+        exposition = self.scrape(HTTP_AUTHORIZATION='Bearer scrape-token')
+
+        self.assertEqual(self.home_requests(exposition), before + 1)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', exposition)
+        self.assertRegex(exposition, r'http_requests_total\{route="home",method="GET",status="200"\} \d+')
+        self.assertRegex(exposition, r'http_request_duration_seconds_bucket\{route="home",method="GET",le="\+Inf"\} \d+')
+        self.assertRegex(exposition, r'http_request_db_queries_count\{route="home"\} \d+')
+        # Labelled by URL name, never by the raw path
+        self.assertNotIn('route="/"', exposition)
+
+
+class ExplainQueriesTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    # The properties 0010 indexes each QUERY_PLAN_CHECKS page relies on
+    PAGE_INDEXES = {
+        'home': ['property_premium_rank_idx', 'property_created_idx'],
+        'property_list_filtered': ['property_status_price_idx'],
+        'search': ['property_status_rank_idx'],
+        'premium_dashboard': ['property_user_premium_idx'],
+        'premium_analytics': ['property_user_premium_idx'],
+    }
+
+    def setUp(self):
+        # A cached premium_analytics page issues no Property queries
+        cache.clear()
+
+    def test_pages_use_the_property_indexes_without_scans_or_sorts(self):
+        for page, indexes in self.PAGE_INDEXES.items():
+            with self.subTest(page):
+                out = StringIO()
+                call_command('explain_queries', '--page', page, '--verbose-plans', stdout=out)
+                for index in indexes:
+                    self.assertIn(f'USING INDEX {index}', out.getvalue())
+                self.assertIn('No full scans or temporary sorts found', out.getvalue())
+
+    def test_every_page_passes(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('No full scans or temporary sorts found', out.getvalue())
+
+    def test_query_without_a_table_is_still_checked(self):
+        class SubqueryClient:
+            def get(self, url):
+                with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                    cursor.execute('SELECT x FROM (SELECT 1 AS x UNION ALL SELECT 2) ORDER BY x')
+                return HttpResponse()
+
+        out = StringIO()
+        check = {'url': 'home', 'expected_sorts': ['properties_property']}
+        problems = ExplainQueriesCommand(stdout=out).check_page(SubqueryClient(), 'subquery', check, {'verbose_plans': False})
+        self.assertEqual(problems, 1)
+        self.assertIn('! USE TEMP B-TREE FOR ORDER BY', out.getvalue())
+
+
+class BenchmarkSmokeTests(TransactionTestCase):
+    """seed_benchmark_data and run_benchmarks at a tiny scale; run_benchmarks reopens the databases"""
+    databases = {'default', 'analytics'}
+
+    def test_seed_then_save_and_compare_a_baseline(self):
+        call_command('seed_benchmark_data', '--scale', '0.0001', stdout=StringIO())
+        self.assertEqual(Property.objects.count(), 100)
+        self.assertEqual(PageView.objects.count(), 5000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = Path(directory) / 'baseline.json'
+            options = ['--iterations', '1', '--warmup', '0', '--baseline', str(baseline)]
+            call_command('run_benchmarks', *options, '--save-baseline', stdout=StringIO())
+            results = json.loads(baseline.read_text())
+            self.assertEqual(set(results), {*settings.BENCHMARK_PAGES, *settings.BENCHMARK_COMMANDS})
+
+            out = StringIO()
+            call_command('run_benchmarks', *options, '--only', 'home', '--no-fail', stdout=out)
+            self.assertIn('home', out.getvalue())
+
+        # Everything ran against copies: the benchmark user never reached the test database
+        self.assertFalse(get_user_model().objects.filter(username='run-benchmarks').exists())
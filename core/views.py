@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from .metrics import REGISTRY
+
+
+def metrics_allowed(request):
+    """A superuser, or a scraper sending ``Authorization: Bearer <METRICS_TOKEN>``"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if settings.METRICS_TOKEN and scheme.lower() == 'bearer':
+        return constant_time_compare(token.strip(), settings.METRICS_TOKEN)
+    return request.user.is_authenticated and request.user.is_superuser
+
+
+@require_GET
+def metrics(request):
+    """This process's request metrics in Prometheus text format"""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden("Metrics access denied")
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,8 +1,9 @@
 from django.core.management.base import BaseCommand
+from core.nplusone import RepeatedQueryCheckMixin
 from legal.models import LegalPage
 
 
-class Command(BaseCommand):
+class Command(RepeatedQueryCheckMixin, BaseCommand):
     help = 'Create or update initial legal pages (Privacy Policy and Terms of Service)'
 
     def handle(self, *args, **options):
@@ -3,8 +3,9 @@ from django.urls import reverse, path
 from django.shortcuts import redirect
 from django.utils import timezone
 from datetime import timedelta
-from .models import PremiumListing, PromoCode, EmailNotification
+from .models import PremiumListing, PromoCode, PromoRedemption, EmailNotification
 from properties.models import Property
+from properties.ranking import refresh_rank_scores
 from accounts.models import User
 import uuid
 
@@ -53,18 +54,22 @@ class PremiumListingAdmin(admin.ModelAdmin):
     days_remaining.short_description = 'Days Left'
 
     def activate_premium(self, request, queryset):
+        property_ids = list(queryset.values_list('property_id', flat=True))
         count = queryset.update(is_active=True)
         # Update property premium status
-        for listing in queryset:
-            Property.objects.filter(id=listing.property.id).update(is_premium=True)
+        properties = Property.objects.filter(pk__in=property_ids)
+        properties.update(is_premium=True)
+        refresh_rank_scores(properties)
         self.message_user(request, f"✅ {count} premium listings activated.")
     activate_premium.short_description = "Activate selected premium listings"
 
     def deactivate_premium(self, request, queryset):
+        property_ids = list(queryset.values_list('property_id', flat=True))
         count = queryset.update(is_active=False)
         # Update property premium status
-        for listing in queryset:
-            Property.objects.filter(id=listing.property.id).update(is_premium=False)
+        properties = Property.objects.filter(pk__in=property_ids)
+        properties.update(is_premium=False)
+        refresh_rank_scores(properties)
         self.message_user(request, f"⚪ {count} premium listings deactivated.")
     deactivate_premium.short_description = "Deactivate selected premium listings"
 
@@ -207,9 +212,19 @@ class PromoCodeAdmin(admin.ModelAdmin):
     deactivate_promo_codes.short_description = "Deactivate selected promo codes"
 
 
+@admin.register(PromoRedemption)
+class PromoRedemptionAdmin(admin.ModelAdmin):
+    list_display = ('promo_code', 'user', 'property', 'listing', 'redeemed_at')
+    list_filter = ('redeemed_at',)
+    search_fields = ('promo_code__code', 'user__username', 'property__title')
+    list_select_related = ('promo_code', 'user', 'property', 'listing__property')
+    raw_id_fields = ('user', 'property', 'listing')
+    readonly_fields = ('redeemed_at',)
+
+
 @admin.register(EmailNotification)
 class EmailNotificationAdmin(admin.ModelAdmin):
-    list_display = ('notification_type', 'user', 'recipient_email', 'is_sent', 'sent_at', 'created_at')
+    list_display = ('notification_type', 'user', 'recipient_email', 'is_sent', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
     list_filter = ('notification_type', 'is_sent', 'created_at')
     search_fields = ('user__username', 'user__email', 'recipient_email')
     readonly_fields = ('created_at', 'sent_at')
@@ -223,34 +238,12 @@ class EmailNotificationAdmin(admin.ModelAdmin):
             'fields': ('subject', 'message')
         }),
         ('📡 Status', {
-            'fields': ('is_sent', 'sent_at', 'error_message')
+            'fields': ('is_sent', 'sent_at', 'attempts', 'next_attempt_at', 'error_message')
         }),
     )
 
     def resend_notifications(self, request, queryset):
-        from django.core.mail import send_mail
-        from django.conf import settings
-
-        success_count = 0
-        for notification in queryset.filter(is_sent=False):
-            try:
-                # Re-send email
-                send_mail(
-                    subject=notification.subject,
-                    message=notification.message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[notification.recipient_email],
-                    fail_silently=False,
-                )
-                notification.sent_at = timezone.now()
-                notification.is_sent = True
-                notification.save()
-                success_count += 1
-            except Exception as e:
-                error_msg = f"Failed to resend: {str(e)}"
-                notification.error_message = error_msg
-                notification.save()
-
-        if success_count > 0:
-            self.message_user(request, f"📧 Successfully resent {success_count} notifications.")
+        # Requeue for the outbox worker instead of sending inside the request
+        count = queryset.filter(is_sent=False).update(attempts=0, next_attempt_at=timezone.now(), error_message=None)
+        self.message_user(request, f"📧 Queued {count} notifications for resending.")
     resend_notifications.short_description = "Resend selected notifications"
@@ -0,0 +1,124 @@
+"""
+Payment gateway adapters.
+
+A gateway receives a pending PremiumListing and returns immediately; the outcome is
+reported later through the payment callback view (premium.views.payment_callback),
+which hands it to premium.payments.apply_payment_result.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def sign_payload(body):
+    """HMAC-SHA256 signature of a callback body (bytes), as sent in X-Payment-Signature"""
+    return hmac.new(settings.PAYMENT_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature):
+    if not (settings.PAYMENT_WEBHOOK_SECRET and signature):
+        return False
+    return hmac.compare_digest(sign_payload(body), signature)
+
+
+class BaseGateway:
+    """Interface for payment gateway adapters"""
+
+    def submit(self, premium_listing):
+        """
+        Hand a pending listing to the gateway and return without waiting for the result.
+
+        Returns a dict of gateway details that is stored in payment_details.
+        """
+        raise NotImplementedError
+
+
+class LocalGateway(BaseGateway):
+    """
+    In-process stand-in for a real gateway.
+
+    Payments are settled on a worker pool after a simulated processing delay, and the
+    result goes through the same signed callback path a remote gateway would use, so
+    hundreds of concurrent checkouts can be load-tested without blocking web workers.
+    """
+
+    success_rates = {
+        'esewa': 0.95,
+        'khalti': 0.93,
+        'credit_card': 0.90,
+        'bank_transfer': 0.85,
+        'mobile_banking': 0.88,
+        'cash': 1.0,  # Always successful for cash
+    }
+
+    _executor = None
+
+    @classmethod
+    def executor(cls):
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(
+                max_workers=settings.PAYMENT_LOCAL_GATEWAY['workers'],
+                thread_name_prefix='local-gateway',
+            )
+        return cls._executor
+
+    def submit(self, premium_listing):
+        details = {
+            'gateway': 'local',
+            'gateway_payment_id': f"PAY_{uuid.uuid4().hex[:8].upper()}",
+        }
+        self.executor().submit(
+            self.settle,
+            premium_listing.payment_reference,
+            premium_listing.payment_method,
+            premium_listing.amount_paid,
+            details['gateway_payment_id'],
+        )
+        return details
+
+    def settle(self, reference, payment_method, amount, gateway_payment_id):
+        """Worker: decide the outcome and deliver it as a signed callback"""
+        from .payments import handle_callback
+
+        min_delay, max_delay = settings.PAYMENT_LOCAL_GATEWAY['delay']
+        time.sleep(random.uniform(min_delay, max_delay))
+
+        success = random.random() < self.success_rates.get(payment_method, 0.80)
+        payload = {
+            'reference': reference,
+            'status': 'completed' if success else 'failed',
+            'details': {
+                'payment_id': gateway_payment_id,
+                'method': payment_method,
+                'amount': str(amount),
+                'currency': 'NPR',
+                'processed_at': timezone.now().isoformat(),
+            },
+        }
+        if not success:
+            payload['details']['error'] = f"{(payment_method or 'payment').upper()} payment failed. Please try again or use a different payment method."
+
+        body = json.dumps(payload).encode()
+        try:
+            handle_callback(body, sign_payload(body))
+        except Exception:
+            logger.exception(f"Local gateway callback failed for {reference}")
+        finally:
+            connection.close()
+
+
+def get_gateway():
+    """The gateway configured in settings.PAYMENT_GATEWAY"""
+    return import_string(settings.PAYMENT_GATEWAY)()
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued email notifications from the outbox over one email connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+            help='Notifications claimed per batch',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll the outbox every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=10,
+            help='Seconds between polls when running with --loop',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed and rescheduled'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
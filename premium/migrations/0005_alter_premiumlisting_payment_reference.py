@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def deduplicate_references(apps, schema_editor):
+    """Blank references become NULL; a reference shared by several listings is kept by the oldest only"""
+    PremiumListing = apps.get_model('premium', 'PremiumListing')
+    PremiumListing.objects.filter(payment_reference='').update(payment_reference=None)
+    duplicated = (
+        PremiumListing.objects.exclude(payment_reference=None)
+        .values('payment_reference').annotate(count=Count('pk')).filter(count__gt=1)
+        .values_list('payment_reference', flat=True)
+    )
+    for reference in list(duplicated):
+        for listing in PremiumListing.objects.filter(payment_reference=reference).order_by('pk')[1:]:
+            listing.payment_reference = f'{reference}-{listing.pk}'
+            listing.save(update_fields=['payment_reference'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('premium', '0004_emailnotification_promocode'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_references, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='premiumlisting',
+            name='payment_reference',
+            field=models.CharField(blank=True, help_text='Transaction reference number', max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('premium', '0005_alter_premiumlisting_payment_reference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailnotification',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emailnotification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='emailnotification',
+            name='notification_type',
+            field=models.CharField(choices=[('premium_activated', 'Premium Activated'), ('premium_expiring', 'Premium Expiring Soon'), ('premium_expired', 'Premium Expired'), ('payment_received', 'Payment Received'), ('payment_failed', 'Payment Failed'), ('image_moderation', 'Image Moderation')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='emailnotification',
+            index=models.Index(fields=['is_sent', 'next_attempt_at'], name='premium_ema_is_sent_72b2ce_idx'),
+        ),
+    ]
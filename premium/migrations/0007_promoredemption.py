@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('premium', '0006_emailnotification_attempts_and_more'),
+        ('properties', '0008_alter_image_options_image_created_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromoRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_reference', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('redeemed_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='premium.premiumlisting')),
+                ('promo_code', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='premium.promocode')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='properties.property')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-redeemed_at'],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
 from properties.models import Property
 from django.conf import settings
 from django.utils import timezone
@@ -38,16 +39,69 @@ class PromoCode(models.Model):
         else:
             return max(0, amount - self.discount_value)
 
-    def use_code(self):
-        if self.is_valid():
-            self.times_used += 1
-            self.save()
+    def redeem(self, user, listing):
+        """
+        Redeem the code for user's checkout of listing; returns whether it applies.
+
+        The usage counter is bumped by one conditional UPDATE, so concurrent checkouts
+        can never push times_used past max_uses, and each redemption is recorded in the
+        PromoRedemption ledger under the checkout's payment_reference. Redeeming again
+        for the same checkout (e.g. a reloaded processing page) is accepted without
+        using the code a second time; a renewal is a new checkout and uses it again.
+        The use is given back if the payment fails (PromoRedemption.release).
+        """
+        if PromoRedemption.objects.filter(promo_code=self, payment_reference=listing.payment_reference).exists():
             return True
-        return False
+
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                claimed = PromoCode.objects.filter(
+                    Q(max_uses__isnull=True) | Q(times_used__lt=F('max_uses')),
+                    pk=self.pk, is_active=True, valid_from__lte=now, valid_until__gte=now,
+                ).update(times_used=F('times_used') + 1)
+                if not claimed:
+                    return False
+                PromoRedemption.objects.create(
+                    promo_code=self, user=user, property_id=listing.property_id, listing=listing,
+                    payment_reference=listing.payment_reference,
+                )
+        except IntegrityError:
+            # A concurrent request redeemed a code for this checkout; our increment rolled back
+            return PromoRedemption.objects.filter(promo_code=self, payment_reference=listing.payment_reference).exists()
+        return True
 
     class Meta:
         ordering = ['-created_at']
 
+class PromoRedemption(models.Model):
+    """Ledger of promo code uses: one row per checkout (payment reference)"""
+    promo_code = models.ForeignKey(PromoCode, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    property = models.ForeignKey(Property, on_delete=models.CASCADE)
+    listing = models.ForeignKey('PremiumListing', on_delete=models.SET_NULL, null=True, blank=True)
+    payment_reference = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    redeemed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.promo_code.code} - {self.property.title}"
+
+    @classmethod
+    def release(cls, payment_reference):
+        """Give back the use redeemed for a checkout whose payment didn't go through"""
+        with transaction.atomic():
+            redemption = cls.objects.select_for_update().filter(payment_reference=payment_reference).first()
+            if redemption is None:
+                return False
+            redemption.delete()
+            PromoCode.objects.filter(pk=redemption.promo_code_id, times_used__gt=0).update(
+                times_used=F('times_used') - 1
+            )
+        return True
+
+    class Meta:
+        ordering = ['-redeemed_at']
+
 class EmailNotification(models.Model):
     NOTIFICATION_TYPE_CHOICES = (
         ('premium_activated', 'Premium Activated'),
@@ -55,6 +109,7 @@ class EmailNotification(models.Model):
         ('premium_expired', 'Premium Expired'),
         ('payment_received', 'Payment Received'),
         ('payment_failed', 'Payment Failed'),
+        ('image_moderation', 'Image Moderation'),
     )
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -67,11 +122,19 @@ class EmailNotification(models.Model):
     error_message = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Outbox delivery state: unsent rows with a next_attempt_at are picked up by the
+    # send_queued_emails worker; it is cleared once delivery is given up
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"{self.notification_type} - {self.user.username}"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_sent', 'next_attempt_at']),
+        ]
 
 class PremiumListing(models.Model):
     PLAN_CHOICES = (
@@ -103,7 +166,7 @@ class PremiumListing(models.Model):
     payment_id = models.CharField(max_length=100, blank=True)
     payment_method = models.CharField(max_length=50, choices=PAYMENT_METHOD_CHOICES, blank=True, null=True)
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
-    payment_reference = models.CharField(max_length=100, blank=True, null=True, help_text="Transaction reference number")
+    payment_reference = models.CharField(max_length=100, blank=True, null=True, unique=True, help_text="Transaction reference number")
     payment_details = models.JSONField(blank=True, null=True, help_text="Additional payment information")
     start_date = models.DateTimeField(auto_now_add=True)
     end_date = models.DateTimeField(default=timezone.now)
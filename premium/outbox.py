@@ -0,0 +1,133 @@
+"""
+Outgoing mail outbox on top of EmailNotification.
+
+Requests and commands only insert rows (queue_email / queue_emails); the
+send_queued_emails worker drains them in batches over one email connection,
+retrying failures with exponential backoff.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import EmailNotification
+
+logger = logging.getLogger(__name__)
+
+
+def build_notification(user, notification_type, subject, message, recipient_email=None):
+    """Unsaved EmailNotification scheduled for immediate delivery"""
+    return EmailNotification(
+        user=user,
+        notification_type=notification_type,
+        subject=subject,
+        message=message,
+        recipient_email=recipient_email or user.email,
+        next_attempt_at=timezone.now(),
+    )
+
+
+def queue_email(user, notification_type, subject, message, recipient_email=None):
+    notification = build_notification(user, notification_type, subject, message, recipient_email)
+    notification.save()
+    return notification
+
+
+def queue_emails(notifications):
+    """Insert many unsaved notifications (see build_notification) in one query"""
+    return EmailNotification.objects.bulk_create(notifications)
+
+
+def pending_notifications(now=None):
+    return EmailNotification.objects.filter(
+        is_sent=False, next_attempt_at__lte=now or timezone.now()
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt after `attempts` failed ones"""
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size):
+    """
+    Lease a batch of due notifications to this worker.
+
+    Claimed rows get next_attempt_at pushed past the lease, so a concurrent worker
+    (or a crashed one) does not send them again until the lease runs out.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS)
+    ids = list(pending_notifications(now).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    EmailNotification.objects.filter(
+        id__in=ids, is_sent=False, next_attempt_at__lte=now
+    ).update(next_attempt_at=lease_until)
+    return list(EmailNotification.objects.filter(id__in=ids, next_attempt_at=lease_until).order_by('id'))
+
+
+def drain_outbox(batch_size=None, max_batches=None, connection=None):
+    """
+    Send due notifications batch by batch over a single email connection.
+
+    Returns (sent, failed) counts. Failed rows are rescheduled with exponential
+    backoff until EMAIL_OUTBOX_MAX_ATTEMPTS, then left unsent with next_attempt_at
+    cleared.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    connection = connection or get_connection()
+    sent = failed = batches = 0
+
+    connection.open()
+    try:
+        while max_batches is None or batches < max_batches:
+            notifications = claim_batch(batch_size)
+            if not notifications:
+                break
+            batches += 1
+
+            sent_ids = []
+            retries = []
+            for notification in notifications:
+                message = EmailMessage(
+                    subject=notification.subject,
+                    body=notification.message,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[notification.recipient_email],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                    sent_ids.append(notification.id)
+                except Exception as e:
+                    logger.warning(f"Failed to send {notification.notification_type} to {notification.recipient_email}: {e}")
+                    notification.attempts += 1
+                    notification.error_message = str(e)
+                    if notification.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                        notification.next_attempt_at = None
+                    else:
+                        notification.next_attempt_at = timezone.now() + retry_delay(notification.attempts)
+                    retries.append(notification)
+                    # The connection may be broken; start the next message on a fresh one
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception:
+                        pass  # send() reconnects on its own
+
+            if sent_ids:
+                EmailNotification.objects.filter(id__in=sent_ids).update(
+                    is_sent=True, sent_at=timezone.now(), next_attempt_at=None, error_message=None
+                )
+            if retries:
+                EmailNotification.objects.bulk_update(retries, ['attempts', 'error_message', 'next_attempt_at'])
+
+            sent += len(sent_ids)
+            failed += len(retries)
+    finally:
+        connection.close()
+
+    return sent, failed
@@ -0,0 +1,212 @@
+"""
+Premium checkout state machine.
+
+    pending --(gateway callback)--> completed | failed
+    pending --(PAYMENT_PENDING_TIMEOUT)--> failed
+
+start_checkout creates (or reuses) a pending PremiumListing and hands it to the
+configured gateway without waiting. The gateway reports the outcome through the
+callback view; apply_payment_result moves the listing out of ``pending`` with a
+conditional UPDATE, so a callback delivered more than once is applied exactly once.
+A checkout the gateway never settles (LocalGateway loses its queue on a restart) is
+failed once it has been pending for PAYMENT_PENDING_TIMEOUT seconds, by the next
+checkout of the property or by the scheduler's expire_stale_checkouts job.
+"""
+import json
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from properties.models import Property
+from properties.ranking import refresh_rank_scores
+
+from . import utils
+from .gateways import get_gateway, verify_signature
+from .models import PremiumListing, PromoRedemption
+
+PLAN_PRICES = {
+    'basic': 500,      # 1 week
+    'featured': 2000,  # 1 month
+    'premium': 5000,   # 3 months
+}
+
+PLAN_DURATIONS = {
+    'basic': 7,        # days
+    'featured': 30,    # days
+    'premium': 90,     # days
+}
+
+FINAL_STATUSES = ('completed', 'failed')
+
+TIMEOUT_ERROR = "The payment was not confirmed in time. Please try again."
+
+
+class AlreadyPremium(Exception):
+    """The property already has an active, paid premium listing"""
+
+
+def start_checkout(user, property_obj, plan_type, payment_method, promo_code=None):
+    """
+    Create a pending PremiumListing for property_obj and submit it to the gateway.
+
+    A checkout that is still pending is returned as is, so reloading the processing
+    page never submits a second payment; one pending for longer than
+    PAYMENT_PENDING_TIMEOUT is failed and a new payment is started. Failed, cancelled
+    or expired listings are reused, since a property has at most one PremiumListing.
+
+    promo_code (a PromoCode) is redeemed for a newly started checkout before it is
+    submitted, so a fast failed callback always finds the redemption to give back;
+    if it applies, the discounted price is charged and its code is recorded in
+    payment_details['promo_code'].
+    """
+    price = PLAN_PRICES.get(plan_type, 500)
+    duration_days = PLAN_DURATIONS.get(plan_type, 7)
+
+    fields = {
+        'user': user,
+        'plan_type': plan_type,
+        'amount_paid': price,
+        'payment_method': payment_method,
+        'payment_status': 'pending',
+        'payment_reference': f"REF_{uuid.uuid4().hex[:12].upper()}",
+        'payment_details': {'duration_days': duration_days, 'submitted_at': timezone.now().isoformat()},
+        'is_active': False,
+    }
+
+    listing = PremiumListing.objects.filter(property=property_obj).first()
+    if listing is None:
+        try:
+            with transaction.atomic():
+                listing = PremiumListing.objects.create(property=property_obj, **fields)
+        except IntegrityError:
+            # A concurrent request created it first
+            return PremiumListing.objects.get(property=property_obj)
+    else:
+        if listing.payment_status == 'pending':
+            if not is_stale(listing):
+                return listing
+            listing, _ = apply_payment_result(listing.payment_reference, 'failed', {'error': TIMEOUT_ERROR})
+        if listing.payment_status == 'completed' and listing.is_active and not listing.is_expired():
+            raise AlreadyPremium(property_obj.title)
+        # Conditional on the status we read, so two concurrent retries submit only once
+        restarted = PremiumListing.objects.filter(
+            pk=listing.pk, payment_status=listing.payment_status
+        ).update(updated_at=timezone.now(), **fields)
+        listing.refresh_from_db()
+        if not restarted:
+            return listing
+
+    if promo_code is not None and promo_code.redeem(user, listing):
+        listing.amount_paid = Decimal(promo_code.apply_discount(price)).quantize(Decimal('0.01'))
+        listing.payment_details = {**listing.payment_details, 'promo_code': promo_code.code}
+        PremiumListing.objects.filter(pk=listing.pk, payment_status='pending').update(
+            amount_paid=listing.amount_paid, payment_details=listing.payment_details
+        )
+
+    gateway_details = get_gateway().submit(listing)
+    # Only while still pending: a fast gateway may already have settled the payment
+    listing.payment_details = {**listing.payment_details, **gateway_details}
+    PremiumListing.objects.filter(pk=listing.pk, payment_status='pending').update(
+        payment_details=listing.payment_details
+    )
+    return listing
+
+
+def is_stale(listing, now=None):
+    """Whether a pending listing has waited longer than PAYMENT_PENDING_TIMEOUT for its result"""
+    submitted_at = (listing.payment_details or {}).get('submitted_at')
+    submitted_at = datetime.fromisoformat(submitted_at) if submitted_at else listing.updated_at
+    return submitted_at <= (now or timezone.now()) - timedelta(seconds=settings.PAYMENT_PENDING_TIMEOUT)
+
+
+def expire_stale_checkouts(scheduler=None):
+    """
+    Fail the pending checkouts the gateway never settled; scheduler job.
+
+    Returns the number of listings failed.
+    """
+    now = timezone.now()
+    # submitted_at is set together with updated_at, so this narrows the candidates in SQL
+    candidates = PremiumListing.objects.filter(
+        payment_status='pending',
+        updated_at__lte=now - timedelta(seconds=settings.PAYMENT_PENDING_TIMEOUT),
+    ).only('payment_reference', 'payment_details', 'updated_at')
+
+    expired = 0
+    for listing in candidates:
+        if is_stale(listing, now):
+            expired += apply_payment_result(listing.payment_reference, 'failed', {'error': TIMEOUT_ERROR})[1]
+    return expired
+
+
+def apply_payment_result(reference, status, details=None):
+    """
+    Move the listing with payment_reference out of ``pending``.
+
+    Returns (listing, applied); applied is False when the result had already been
+    recorded, in which case nothing is changed and no email is sent.
+    Raises PremiumListing.DoesNotExist for an unknown reference.
+    """
+    if status not in FINAL_STATUSES:
+        raise ValueError(f"Unsupported payment status: {status}")
+
+    listing = PremiumListing.objects.select_related('property', 'user').get(payment_reference=reference)
+    if listing.payment_status != 'pending':
+        return listing, False
+
+    now = timezone.now()
+    payment_details = {**(listing.payment_details or {}), 'result': details or {}}
+    changes = {'payment_status': status, 'payment_details': payment_details, 'updated_at': now}
+    if status == 'completed':
+        changes.update(
+            start_date=now,
+            end_date=now + timedelta(days=payment_details.get('duration_days', 7)),
+            is_active=True,
+        )
+
+    with transaction.atomic():
+        applied = PremiumListing.objects.filter(
+            pk=listing.pk, payment_status='pending'
+        ).update(**changes)
+        if not applied:
+            listing.refresh_from_db()
+            return listing, False
+
+        for field, value in changes.items():
+            setattr(listing, field, value)
+
+        if status == 'completed':
+            Property.objects.filter(pk=listing.property_id).update(is_premium=True)
+            refresh_rank_scores(Property.objects.filter(pk=listing.property_id))
+            transaction.on_commit(
+                lambda: utils.send_premium_activated_email(listing.user, listing.property, listing)
+            )
+        else:
+            PromoRedemption.release(reference)
+            transaction.on_commit(
+                lambda: utils.send_payment_failed_email(
+                    listing.user, listing.property, listing, (details or {}).get('payment_id')
+                )
+            )
+
+    return listing, True
+
+
+def handle_callback(body, signature):
+    """
+    Verify and apply a gateway callback body (bytes).
+
+    Raises PermissionDenied for a bad signature and ValueError for a malformed body.
+    """
+    if not verify_signature(body, signature):
+        raise PermissionDenied("Invalid payment callback signature")
+
+    payload = json.loads(body)
+    if not isinstance(payload, dict) or not payload.get('reference'):
+        raise ValueError("Callback must include a payment reference")
+    return apply_payment_result(payload['reference'], payload.get('status'), payload.get('details'))
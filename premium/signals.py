@@ -0,0 +1,20 @@
+"""
+Re-rank a property when its premium listing changes (see properties.ranking).
+
+Set-based updates (expiry, payment results, admin bulk actions) bypass these and
+call refresh_rank_scores themselves.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from properties.models import Property
+from properties.ranking import refresh_rank_scores
+
+from .models import PremiumListing
+
+
+@receiver(post_save, sender=PremiumListing)
+@receiver(post_delete, sender=PremiumListing)
+def rank_premium_property(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_rank_scores(Property.objects.filter(pk=instance.property_id))
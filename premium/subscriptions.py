@@ -0,0 +1,80 @@
+"""
+Premium subscription expiry, shared by the manage_subscriptions command and the
+per-listing expiry timers of the scheduler.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from properties.models import Property
+from properties.ranking import refresh_rank_scores
+
+from . import utils
+from .models import PremiumListing
+
+NOTIFICATION_CHUNK_SIZE = 2000
+
+# Columns the premium email templates read (see premium.utils.render_premium_email)
+NOTIFICATION_FIELDS = (
+    'plan_type', 'amount_paid', 'start_date', 'end_date', 'payment_id',
+    'property__title',
+    'user__username', 'user__first_name', 'user__last_name', 'user__email',
+)
+
+
+def queue_notifications(notification_type, listings):
+    """Queue one email per listing in the outbox, a chunk of listings at a time"""
+    queued = 0
+    chunk = []
+    listings = listings.select_related('property', 'user').only(*NOTIFICATION_FIELDS)
+    for listing in listings.iterator(chunk_size=NOTIFICATION_CHUNK_SIZE):
+        chunk.append((listing.user, listing.property, listing))
+        if len(chunk) >= NOTIFICATION_CHUNK_SIZE:
+            queued += utils.send_bulk_notification(notification_type, chunk)[0]
+            chunk = []
+    if chunk:
+        queued += utils.send_bulk_notification(notification_type, chunk)[0]
+    return queued
+
+
+def expire_listings(listings=None, now=None):
+    """
+    Deactivate active listings whose end date has passed and queue their expiry emails.
+
+    listings optionally narrows the candidates (e.g. to one listing). Two UPDATEs in
+    one transaction: Property.is_premium is cleared (and the properties re-ranked)
+    through a subquery first, while the listings still match as active, then the
+    listings are deactivated.
+    Returns the number of listings expired.
+    """
+    now = now or timezone.now()
+    listings = PremiumListing.objects.all() if listings is None else listings
+    expired_listings = listings.filter(is_active=True, end_date__lte=now)
+
+    with transaction.atomic():
+        expired_properties = Property.objects.filter(pk__in=expired_listings.values('property_id'))
+        expired_properties.update(is_premium=False)
+        refresh_rank_scores(expired_properties)
+        queue_notifications('premium_expired', expired_listings)
+        return expired_listings.update(is_active=False, updated_at=now)
+
+
+def sync_expiry_timers(scheduler):
+    """
+    Scheduler job: give every active listing ending within PREMIUM_EXPIRY_TIMER_HORIZON
+    a timer that expires it at its exact end date.
+
+    Runs periodically, so listings activated or extended since the last pass are picked
+    up; a timer that fires for a listing that was extended does nothing.
+    """
+    now = timezone.now()
+    horizon = now + timedelta(seconds=settings.PREMIUM_EXPIRY_TIMER_HORIZON)
+    ending = PremiumListing.objects.filter(is_active=True, end_date__lte=horizon).values_list('id', 'end_date')
+    for listing_id, end_date in ending.iterator():
+        scheduler.add_timer(
+            f'premium_expiry:{listing_id}',
+            max(end_date, now),
+            lambda listing_id=listing_id: expire_listings(PremiumListing.objects.filter(pk=listing_id)),
+        )
@@ -1,3 +1,517 @@
-from django.test import TestCase
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from analytics.models import AnalyticsCheckpoint, PropertyAnalytics, PropertyDailyAnalytics
+from analytics.utils import PAGE_VIEW_CHECKPOINT
+from contact.models import ContactInquiry
+from properties.models import Property
+from properties.ranking import compute_rank_score
+
+from .admin import PromoCodeAdmin
+from .gateways import BaseGateway, sign_payload
+from .models import EmailNotification, PremiumListing, PromoCode, PromoRedemption
+from .outbox import drain_outbox, queue_email
+from .payments import PLAN_PRICES, apply_payment_result, expire_stale_checkouts, start_checkout
+from .subscriptions import expire_listings
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+
+    def test_drain_sends_queued_notifications(self):
+        for i in range(5):
+            queue_email(self.user, 'payment_received', f'Subject {i}', 'Body')
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(drain_outbox(batch_size=2), (5, 0))
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+        self.assertFalse(EmailNotification.objects.filter(is_sent=False).exists())
+        self.assertEqual(drain_outbox(), (0, 0))
+
+    def test_failed_sends_back_off_then_give_up(self):
+        notification = queue_email(self.user, 'payment_received', 'Subject', 'Body')
+
+        with override_settings(EMAIL_BACKEND='premium.tests.FailingBackend'):
+            self.assertEqual(drain_outbox(), (0, 1))
+            notification.refresh_from_db()
+            self.assertEqual(notification.attempts, 1)
+            self.assertGreater(notification.next_attempt_at, timezone.now())
+
+            EmailNotification.objects.filter(pk=notification.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(drain_outbox(), (0, 1))
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 2)
+        self.assertIsNone(notification.next_attempt_at)
+        self.assertFalse(notification.is_sent)
+
+
+class PromoRedemptionTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.promo = PromoCode.objects.create(
+            code='SPIKE10', discount_value=10, max_uses=10,
+            valid_from=timezone.now() - timedelta(days=1), valid_until=timezone.now() + timedelta(days=1),
+        )
+
+    def create_checkouts(self, count):
+        """A pending PremiumListing (checkout) on each of count new properties"""
+        Property.objects.bulk_create(
+            Property(
+                user=self.user, title=f'Property {i}', description='Test', address='Street',
+                city='Kathmandu', state='Bagmati', zip_code='44600', price=1000000,
+            )
+            for i in range(count)
+        )
+        PremiumListing.objects.bulk_create(
+            PremiumListing(
+                property=property_obj, user=self.user, payment_id=f'PREM_{property_obj.pk}',
+                payment_reference=f'REF_{property_obj.pk}', payment_details={'duration_days': 7}, is_active=False,
+            )
+            for property_obj in Property.objects.filter(user=self.user)
+        )
+        return list(PremiumListing.objects.filter(user=self.user))
+
+    def test_parallel_redemptions_never_exceed_max_uses(self):
+        listings = self.create_checkouts(200)
+        workers = 50
+        # Release the redemptions in waves of `workers` at the same instant
+        start = threading.Barrier(workers)
+
+        def redeem(listing):
+            try:
+                start.wait()
+                return PromoCode.objects.get(pk=self.promo.pk).redeem(self.user, listing)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(redeem, listings))
+
+        self.promo.refresh_from_db()
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(self.promo.times_used, 10)
+        self.assertEqual(PromoRedemption.objects.filter(promo_code=self.promo).count(), 10)
+
+    def test_redeeming_again_for_the_same_checkout_uses_the_code_once(self):
+        listing = self.create_checkouts(1)[0]
+
+        self.assertTrue(self.promo.redeem(self.user, listing))
+        self.assertTrue(self.promo.redeem(self.user, listing))
+
+        self.promo.refresh_from_db()
+        self.assertEqual(self.promo.times_used, 1)
+        self.assertEqual(PromoRedemption.objects.count(), 1)
+
+    def test_renewal_uses_the_code_again(self):
+        listing = self.create_checkouts(1)[0]
+        self.assertTrue(self.promo.redeem(self.user, listing))
+        apply_payment_result(listing.payment_reference, 'completed')
+
+        # Renewing starts a new checkout with a new payment reference
+        PremiumListing.objects.filter(pk=listing.pk).update(payment_status='pending', payment_reference='REF_RENEWAL')
+        listing.refresh_from_db()
+        self.assertTrue(self.promo.redeem(self.user, listing))
+
+        self.promo.refresh_from_db()
+        self.assertEqual(self.promo.times_used, 2)
+        self.assertEqual(
+            set(PromoRedemption.objects.values_list('payment_reference', flat=True)),
+            {f'REF_{listing.property_id}', 'REF_RENEWAL'},
+        )
+
+    def test_failed_payment_gives_the_use_back(self):
+        self.promo.max_uses = 1
+        self.promo.save()
+        failed, retried = self.create_checkouts(2)
+        self.assertTrue(self.promo.redeem(self.user, failed))
+        self.assertFalse(self.promo.redeem(self.user, retried))
+
+        apply_payment_result(failed.payment_reference, 'failed')
+
+        self.promo.refresh_from_db()
+        self.assertEqual(self.promo.times_used, 0)
+        self.assertFalse(PromoRedemption.objects.exists())
+        self.assertTrue(self.promo.redeem(self.user, retried))
+        # A completed payment keeps its redemption
+        apply_payment_result(retried.payment_reference, 'completed')
+        self.promo.refresh_from_db()
+        self.assertEqual(self.promo.times_used, 1)
+
+
+@override_settings(PAYMENT_GATEWAY='premium.tests.RecordingGateway', PAYMENT_PENDING_TIMEOUT=600)
+class PaymentCallbackTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        RecordingGateway.submitted = []
+        RecordingGateway.redeemed = []
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.property = Property.objects.create(
+            user=self.user, title='Flat', description='Test', address='Street',
+            city='Kathmandu', state='Bagmati', zip_code='44600', price=1000000,
+        )
+        self.listing = start_checkout(self.user, self.property, 'featured', 'esewa')
+
+    def callback(self, status, signature=None, reference=None):
+        body = json.dumps({
+            'reference': reference or self.listing.payment_reference,
+            'status': status,
+            'details': {'payment_id': 'PAY_TEST'},
+        }).encode()
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('premium:payment_callback'), body, content_type='application/json',
+                HTTP_X_PAYMENT_SIGNATURE=sign_payload(body) if signature is None else signature,
+            )
+
+    def emails(self, notification_type):
+        return EmailNotification.objects.filter(user=self.user, notification_type=notification_type).count()
+
+    def test_checkout_is_submitted_once_and_left_pending(self):
+        self.assertEqual(self.listing.payment_status, 'pending')
+        self.assertEqual(start_checkout(self.user, self.property, 'featured', 'esewa').pk, self.listing.pk)
+        self.assertEqual(RecordingGateway.submitted, [self.listing.payment_reference])
+
+    def test_bad_signature_is_rejected(self):
+        for signature in ('', 'forged'):
+            response = self.callback('completed', signature=signature)
+            self.assertEqual(response.status_code, 403)
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.payment_status, 'pending')
+        self.assertFalse(self.listing.is_active)
+
+    def test_completed_payment_activates_the_listing_once(self):
+        response = self.callback('completed')
+        self.assertEqual(response.json(), {'success': True, 'status': 'completed', 'duplicate': False})
+
+        self.listing.refresh_from_db()
+        self.property.refresh_from_db()
+        self.assertTrue(self.listing.is_active)
+        self.assertTrue(self.property.is_premium)
+        self.assertEqual(self.listing.end_date - self.listing.start_date, timedelta(days=30))
+        self.assertEqual(self.emails('premium_activated'), 1)
+
+        # A redelivery, or a late failure for the same reference, changes nothing
+        self.assertEqual(self.callback('completed').json()['duplicate'], True)
+        self.assertEqual(self.callback('failed').json(), {'success': True, 'status': 'completed', 'duplicate': True})
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.payment_status, 'completed')
+        self.assertEqual(self.emails('premium_activated'), 1)
+        self.assertEqual(self.emails('payment_failed'), 0)
+
+    def test_failed_payment_sends_one_failure_email(self):
+        self.assertEqual(self.callback('failed').json()['status'], 'failed')
+        self.assertEqual(self.callback('failed').json()['duplicate'], True)
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.payment_status, 'failed')
+        self.assertFalse(self.listing.is_active)
+        notification = EmailNotification.objects.get(user=self.user, notification_type='payment_failed')
+        self.assertIn('NPR 2000', notification.message)
+        self.assertIn('PAY_TEST', notification.message)
+
+    def test_unknown_reference_and_status(self):
+        self.assertEqual(self.callback('completed', reference='REF_UNKNOWN').status_code, 404)
+        self.assertEqual(self.callback('refunded').status_code, 400)
+
+    def test_checkout_left_pending_past_the_timeout_is_failed(self):
+        self.assertEqual(expire_stale_checkouts(), 0)
+
+        submitted_at = timezone.now() - timedelta(minutes=11)
+        PremiumListing.objects.filter(pk=self.listing.pk).update(
+            updated_at=submitted_at,
+            payment_details={**self.listing.payment_details, 'submitted_at': submitted_at.isoformat()},
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_stale_checkouts(), 1)
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.payment_status, 'failed')
+        self.assertEqual(self.emails('payment_failed'), 1)
+        # The lost settlement's callback no longer matches, and a new checkout starts
+        retry = start_checkout(self.user, self.property, 'featured', 'esewa')
+        self.assertEqual(retry.payment_status, 'pending')
+        self.assertNotEqual(retry.payment_reference, self.listing.payment_reference)
+        self.assertEqual(self.callback('completed').status_code, 404)
+        self.assertEqual(len(RecordingGateway.submitted), 2)
+
+    def test_stale_checkout_is_failed_and_resubmitted_on_the_next_checkout(self):
+        submitted_at = timezone.now() - timedelta(minutes=11)
+        PremiumListing.objects.filter(pk=self.listing.pk).update(
+            payment_details={**self.listing.payment_details, 'submitted_at': submitted_at.isoformat()},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            retry = start_checkout(self.user, self.property, 'featured', 'esewa')
+
+        self.assertEqual(retry.payment_status, 'pending')
+        self.assertEqual(RecordingGateway.submitted, [self.listing.payment_reference, retry.payment_reference])
+        self.assertEqual(self.emails('payment_failed'), 1)
+
+
+@override_settings(PAYMENT_GATEWAY='premium.tests.RecordingGateway')
+class PromoCheckoutTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        RecordingGateway.submitted = []
+        RecordingGateway.redeemed = []
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.promo = PromoCode.objects.create(
+            code='SPIKE10', discount_value=10, max_uses=10,
+            valid_from=timezone.now() - timedelta(days=1), valid_until=timezone.now() + timedelta(days=1),
+        )
+        self.client.force_login(self.user)
+
+    def checkout(self, title, promo_code=None):
+        property_obj = Property.objects.create(
+            user=self.user, title=title, description='Test', address='Street',
+            city='Kathmandu', state='Bagmati', zip_code='44600', price=1000000,
+        )
+        if promo_code:
+            session = self.client.session
+            session['promo_code'] = promo_code
+            session.save()
+        response = self.client.get(reverse('premium:payment_processing', args=['basic', property_obj.pk, 'esewa']))
+        self.assertEqual(response.status_code, 200)
+        return response.context['premium_listing']
+
+    def test_promo_code_is_redeemed_before_submitting_and_for_one_checkout_only(self):
+        listing = self.checkout('First', 'SPIKE10')
+
+        self.assertEqual(listing.payment_details['promo_code'], 'SPIKE10')
+        self.assertEqual(RecordingGateway.redeemed, [True])
+        self.assertEqual(listing.amount_paid, Decimal('450.00'))  # basic plan, 10% off
+        self.assertNotIn('promo_code', self.client.session)
+
+        # The next checkout in the same session pays without the code
+        second = self.checkout('Second')
+        self.assertNotIn('promo_code', second.payment_details)
+        self.assertEqual(second.amount_paid, PLAN_PRICES['basic'])
+        self.promo.refresh_from_db()
+        self.assertEqual(self.promo.times_used, 1)
+        self.assertEqual(
+            list(PromoRedemption.objects.values_list('payment_reference', flat=True)), [listing.payment_reference],
+        )
+
+    def test_used_up_promo_code_warns_and_checks_out_without_it(self):
+        PromoCode.objects.filter(pk=self.promo.pk).update(times_used=10)
+
+        listing = self.checkout('First', 'SPIKE10')
+
+        self.assertNotIn('promo_code', listing.payment_details)
+        self.assertEqual(listing.amount_paid, PLAN_PRICES['basic'])
+        self.assertFalse(PromoRedemption.objects.exists())
+        self.assertEqual(RecordingGateway.submitted, [listing.payment_reference])
+
+
+class PromoCodeAdminTests(TestCase):
+    def test_deactivate_action(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        now = timezone.now()
+        for code in ('ONE', 'TWO', 'KEEP'):
+            PromoCode.objects.create(
+                code=code, discount_value=10, valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1),
+            )
+        request = RequestFactory().post('/')
+        request.user = admin_user
+        request._messages = CookieStorage(request)
+
+        PromoCodeAdmin(PromoCode, site).deactivate_promo_codes(request, PromoCode.objects.filter(code__in=['ONE', 'TWO']))
+
+        self.assertEqual(
+            dict(PromoCode.objects.values_list('code', 'is_active')), {'ONE': False, 'TWO': False, 'KEEP': True},
+        )
+        self.assertEqual([str(message) for message in request._messages], ['⚪ 2 promo codes deactivated.'])
+
+
+@override_settings(PREMIUM_ANALYTICS_DAYS=3)
+class PremiumAnalyticsTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.flat, self.house, self.plot = (
+            Property.objects.create(
+                user=self.user, title=title, description='Test', address='Street', city='Kathmandu',
+                state='Bagmati', zip_code='44600', price=1000000, is_premium=is_premium,
+            )
+            for title, is_premium in (('Flat', True), ('House', True), ('Plot', False))
+        )
+        for listing, count in ((self.flat, 3), (self.plot, 2)):
+            for _ in range(count):
+                self.inquire(listing)
+        PropertyAnalytics.objects.create(property=self.flat, total_views=60)
+        PropertyAnalytics.objects.create(property=self.plot, total_views=10)
+        today = timezone.localdate()
+        PropertyDailyAnalytics.objects.bulk_create([
+            PropertyDailyAnalytics(property=self.flat, date=today, views=5),
+            PropertyDailyAnalytics(property=self.flat, date=today - timedelta(days=2), views=7),
+            PropertyDailyAnalytics(property=self.flat, date=today - timedelta(days=3), views=11),
+            PropertyDailyAnalytics(property=self.plot, date=today, views=4),
+        ])
+        self.client.force_login(self.user)
+
+    def inquire(self, listing):
+        ContactInquiry.objects.create(name='Buyer', email='buyer@example.com', message='Hi', property=listing)
+
+    def analytics(self):
+        response = self.client.get(reverse('premium:premium_analytics'))
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_numbers_come_from_the_rollups_and_inquiries(self):
+        context = self.analytics()
+        today = timezone.localdate()
+
+        self.assertEqual(
+            [(row['property']['title'], row['views'], row['inquiries'], row['daily_views']) for row in context['property_analytics']],
+            [('House', 0, 0, [0, 0, 0]), ('Flat', 60, 3, [7, 0, 5])],
+        )
+        self.assertEqual(context['property_analytics'][1]['conversion_rate'], 5.0)
+        self.assertEqual((context['total_views'], context['total_inquiries'], context['avg_conversion_rate']), (60, 3, 5.0))
+        self.assertEqual(context['chart_data']['days'], [
+            (today - timedelta(days=offset)).isoformat() for offset in (2, 1, 0)
+        ])
+
+    def test_cache_is_invalidated_by_the_rollup_watermark(self):
+        self.assertEqual(self.analytics()['total_inquiries'], 3)
+        self.inquire(self.flat)
+        PropertyAnalytics.objects.filter(property=self.flat).update(total_views=80)
+        self.assertEqual(self.analytics()['total_inquiries'], 3)
+
+        AnalyticsCheckpoint.objects.create(name=PAGE_VIEW_CHECKPOINT, last_id=42)
+        context = self.analytics()
+        self.assertEqual((context['total_views'], context['total_inquiries']), (80, 4))
+
+
+class SubscriptionExpiryTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def listing(self, title, ends_in, is_active=True):
+        user = User.objects.create_user(title.lower(), f'{title.lower()}@example.com', 'password')
+        property_obj = Property.objects.create(
+            user=user, title=title, description='Test', address='Street',
+            city='Kathmandu', state='Bagmati', zip_code='44600', price=1000000, is_premium=is_active,
+        )
+        return PremiumListing.objects.create(
+            property=property_obj, user=user, plan_type='premium', is_active=is_active,
+            end_date=self.now + ends_in,
+        )
+
+    def emails(self, notification_type):
+        return sorted(EmailNotification.objects.filter(
+            notification_type=notification_type
+        ).values_list('user__username', flat=True))
+
+    def test_expire_listings_updates_only_expired_active_listings(self):
+        expired = self.listing('Expired', -timedelta(hours=1))
+        active = self.listing('Active', timedelta(days=3))
+        inactive = self.listing('Inactive', -timedelta(days=10), is_active=False)
+        premium_score = Property.objects.get(pk=expired.property_id).rank_score
+
+        self.assertEqual(expire_listings(now=self.now), 1)
+
+        self.assertEqual(
+            {listing.pk: listing.is_active for listing in PremiumListing.objects.all()},
+            {expired.pk: False, active.pk: True, inactive.pk: False},
+        )
+        expired_property = Property.objects.get(pk=expired.property_id)
+        self.assertFalse(expired_property.is_premium)
+        self.assertEqual(expired_property.rank_score, compute_rank_score(expired_property.created_at))
+        self.assertLess(expired_property.rank_score, premium_score)
+        self.assertTrue(Property.objects.get(pk=active.property_id).is_premium)
+        self.assertEqual(self.emails('premium_expired'), ['expired'])
+
+        self.assertEqual(expire_listings(now=self.now), 0)
+        self.assertEqual(self.emails('premium_expired'), ['expired'])
+
+    def test_daily_runs_send_one_reminder_per_listing(self):
+        self.listing('Soon', timedelta(days=6, hours=12))
+        self.listing('Later', timedelta(days=7, hours=12))
+        self.listing('Much_later', timedelta(days=20))
+        self.listing('Expired', -timedelta(hours=1))
+
+        for day in range(3):
+            with self.subTest(day=day):
+                call_command('manage_subscriptions', stdout=StringIO())
+                # A day passes
+                PremiumListing.objects.update(end_date=F('end_date') - timedelta(days=1))
+
+        self.assertEqual(self.emails('premium_expiring'), ['later', 'soon'])
+        self.assertEqual(self.emails('premium_expired'), ['expired'])
+
+    def test_users_without_an_email_address_are_skipped(self):
+        self.listing('Soon', timedelta(days=6, hours=12))
+        self.listing('Unreachable', timedelta(days=6, hours=12))
+        User.objects.filter(username='unreachable').update(email='')
+
+        call_command('manage_subscriptions', stdout=StringIO())
+
+        self.assertEqual(self.emails('premium_expiring'), ['soon'])
+
+    def test_dry_run_changes_nothing(self):
+        self.listing('Soon', timedelta(days=6, hours=12))
+        self.listing('Expired', -timedelta(hours=1))
+
+        out = StringIO()
+        call_command('manage_subscriptions', '--dry-run', stdout=out)
+
+        self.assertIn('Would send 1 expiry reminders', out.getvalue())
+        self.assertIn('Would expire 1 listings', out.getvalue())
+        self.assertFalse(EmailNotification.objects.exists())
+        self.assertEqual(PremiumListing.objects.filter(is_active=True).count(), 2)
+
+
+class FailingBackend:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP unavailable")
+
+
+class RecordingGateway(BaseGateway):
+    """Accepts payments without settling them; the tests deliver the callbacks"""
+
+    submitted = []
+    redeemed = []
+
+    def submit(self, premium_listing):
+        self.submitted.append(premium_listing.payment_reference)
+        self.redeemed.append(PromoRedemption.objects.filter(payment_reference=premium_listing.payment_reference).exists())
+        return {'gateway': 'test'}
@@ -11,6 +11,8 @@ urlpatterns = [
     path('checkout/<str:plan_type>/<int:property_pk>/', views.premium_checkout, name='premium_checkout'),
     path('qr-payment/<str:plan_type>/<int:property_pk>/', views.qr_payment, name='qr_payment'),
     path('processing/<str:plan_type>/<int:property_pk>/<str:payment_method>/', views.payment_processing, name='payment_processing'),
+    path('payment-status/<str:reference>/', views.payment_status, name='payment_status'),
+    path('payment-callback/', views.payment_callback, name='payment_callback'),
     path('badge/', views.premium_badge, name='premium_badge'),
     path('create/<int:property_pk>/', views.premium_create, name='premium_create'),
     path('<int:pk>/update/', views.premium_update, name='premium_update'),
@@ -1,16 +1,72 @@
-from django.core.mail import send_mail
 from django.conf import settings
-from django.utils import timezone
 from django.urls import reverse
 from .models import EmailNotification
+from .outbox import build_notification, queue_email, queue_emails
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=1024)
+def absolute_url(viewname, **kwargs):
+    return f"{settings.SITE_URL}{reverse(viewname, kwargs=kwargs or None)}"
+
+
+def render_premium_email(user, notification_type, property_obj=None, premium_listing=None, **extra_context):
+    """Subject and body of a premium email, from the templates in settings"""
+    # Get email templates from settings
+    subject = settings.PREMIUM_EMAIL_SUBJECTS[notification_type]
+    template = settings.PREMIUM_EMAIL_TEMPLATES[notification_type]
+
+    # Build context
+    context = {
+        'user_name': user.get_full_name() or user.username,
+        'user_email': user.email,
+    }
+
+    # Add property context if available
+    if property_obj:
+        context.update({
+            'property_title': property_obj.title,
+            'property_id': property_obj.id,
+        })
+
+    # Add premium listing context if available
+    if premium_listing:
+        context.update({
+            'plan_type': premium_listing.plan_type,
+            'amount_paid': premium_listing.amount_paid,
+            'start_date': premium_listing.start_date.strftime('%B %d, %Y'),
+            'end_date': premium_listing.end_date.strftime('%B %d, %Y'),
+            'payment_id': premium_listing.payment_id,
+            'days_remaining': premium_listing.days_remaining(),
+        })
+
+    # Add URL context (only the links the template uses; reverse() is costly in bulk)
+    plan_type = premium_listing.plan_type if premium_listing else 'basic'
+    url_builders = {
+        'dashboard_url': lambda: absolute_url('accounts:dashboard'),
+        'plans_url': lambda: absolute_url('premium:premium_plans'),
+        'renewal_url': lambda: f"{absolute_url('premium:premium_form')}?plan={plan_type}",
+        'checkout_url': lambda: absolute_url(
+            'premium:premium_checkout', plan_type=plan_type, property_pk=property_obj.id if property_obj else 0
+        ),
+    }
+    context.update({
+        name: build() for name, build in url_builders.items() if f'{{{name}}}' in template
+    })
+
+    # Add extra context
+    context.update(extra_context)
+
+    # Format the message
+    return subject, template.format(**context)
+
+
 def send_premium_email(user, notification_type, property_obj=None, premium_listing=None, **extra_context):
     """
-    Send premium-related emails to users
+    Queue a premium-related email to a user in the outbox
 
     Args:
         user: User instance
@@ -23,105 +79,60 @@ def send_premium_email(user, notification_type, property_obj=None, premium_listi
     if notification_type not in settings.PREMIUM_EMAIL_SUBJECTS:
         logger.error(f"Unknown notification type: {notification_type}")
         return False
+    if not user.email:
+        logger.warning(f"No email address for {user.username}; {notification_type} not queued")
+        return False
 
     try:
-        # Get email templates from settings
-        subject = settings.PREMIUM_EMAIL_SUBJECTS[notification_type]
-        template = settings.PREMIUM_EMAIL_TEMPLATES[notification_type]
-
-        # Build context
-        context = {
-            'user_name': user.get_full_name() or user.username,
-            'user_email': user.email,
-        }
-
-        # Add property context if available
-        if property_obj:
-            context.update({
-                'property_title': property_obj.title,
-                'property_id': property_obj.id,
-            })
-
-        # Add premium listing context if available
-        if premium_listing:
-            context.update({
-                'plan_type': premium_listing.plan_type,
-                'amount_paid': premium_listing.amount_paid,
-                'start_date': premium_listing.start_date.strftime('%B %d, %Y'),
-                'end_date': premium_listing.end_date.strftime('%B %d, %Y'),
-                'payment_id': premium_listing.payment_id,
-                'days_remaining': premium_listing.days_remaining(),
-            })
-
-        # Add URL context
-        context.update({
-            'dashboard_url': f"{settings.SITE_URL}{reverse('accounts:dashboard')}",
-            'plans_url': f"{settings.SITE_URL}{reverse('premium:premium_plans')}",
-            'renewal_url': f"{settings.SITE_URL}{reverse('premium:premium_form')}?plan={premium_listing.plan_type if premium_listing else 'basic'}",
-            'checkout_url': f"{settings.SITE_URL}{reverse('premium:premium_checkout', kwargs={'plan_type': premium_listing.plan_type if premium_listing else 'basic', 'property_pk': property_obj.id if property_obj else 0})}",
-        })
-
-        # Add extra context
-        context.update(extra_context)
-
-        # Format the message
-        message = template.format(**context)
-
-        # Send email
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
+        subject, message = render_premium_email(user, notification_type, property_obj, premium_listing, **extra_context)
+        queue_email(user, notification_type, subject, message)
 
-        # Log the email notification
-        EmailNotification.objects.create(
-            user=user,
-            notification_type=notification_type,
-            subject=subject,
-            message=message,
-            recipient_email=user.email,
-            is_sent=True,
-            sent_at=timezone.now(),
-        )
-
-        logger.info(f"Premium email sent successfully: {notification_type} to {user.email}")
+        logger.info(f"Premium email queued: {notification_type} to {user.email}")
         return True
 
     except Exception as e:
-        # Log failed email
+        # Log failed email (never picked up by the outbox worker)
         EmailNotification.objects.create(
             user=user,
             notification_type=notification_type,
-            subject=subject if 'subject' in locals() else "Email Send Failed",
+            subject=settings.PREMIUM_EMAIL_SUBJECTS.get(notification_type, "Email Send Failed"),
             message=str(e),
             recipient_email=user.email,
             is_sent=False,
             error_message=str(e),
         )
 
-        logger.error(f"Failed to send premium email {notification_type} to {user.email}: {str(e)}")
+        logger.error(f"Failed to queue premium email {notification_type} to {user.email}: {str(e)}")
         return False
 
 
 def send_bulk_notification(notification_type, users_with_properties):
     """
-    Send bulk notifications to multiple users
+    Queue bulk notifications to multiple users with one insert
 
     Args:
         notification_type: Type of notification
         users_with_properties: List of tuples (user, property, premium_listing)
     """
-    success_count = 0
     total_count = len(users_with_properties)
+    if notification_type not in settings.PREMIUM_EMAIL_SUBJECTS:
+        logger.error(f"Unknown notification type: {notification_type}")
+        return 0, total_count
 
+    notifications = []
     for user, property_obj, premium_listing in users_with_properties:
-        if send_premium_email(user, notification_type, property_obj, premium_listing):
-            success_count += 1
+        if not user.email:
+            logger.warning(f"No email address for {user.username}; {notification_type} not queued")
+            continue
+        try:
+            subject, message = render_premium_email(user, notification_type, property_obj, premium_listing)
+        except Exception as e:
+            logger.error(f"Failed to render premium email {notification_type} to {user.email}: {str(e)}")
+            continue
+        notifications.append(build_notification(user, notification_type, subject, message))
 
-    return success_count, total_count
+    queue_emails(notifications)
+    return len(notifications), total_count
 
 
 # Specific notification functions for common scenarios
@@ -168,25 +179,13 @@ def send_payment_received_email(user, property_obj, premium_listing):
     )
 
 
-def send_payment_failed_email(user, property_obj, plan_type, amount, payment_id):
+def send_payment_failed_email(user, property_obj, premium_listing, payment_id=None):
     """Send notification when payment fails"""
-    context = {
-        'amount': amount,
-        'payment_id': payment_id if payment_id else 'N/A'
-    }
-
-    # Create a temporary premium listing object for context
-    class TempListing:
-        def __init__(self, plan_type, payment_id):
-            self.plan_type = plan_type
-            self.payment_id = payment_id
-
-    temp_listing = TempListing(plan_type, payment_id)
-
     return send_premium_email(
         user=user,
         notification_type='payment_failed',
         property_obj=property_obj,
-        premium_listing=temp_listing,
-        **context
+        premium_listing=premium_listing,
+        amount=premium_listing.amount_paid,
+        payment_id=payment_id or premium_listing.payment_id or 'N/A',
     )
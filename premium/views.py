@@ -1,14 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
 from django.utils import timezone
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from datetime import timedelta
+from analytics.models import AnalyticsCheckpoint, PropertyAnalytics, PropertyDailyAnalytics
+from analytics.utils import PAGE_VIEW_CHECKPOINT
+from contact.models import ContactInquiry
+from properties.lookups import attach_lookups
 from properties.models import Property
 from accounts.models import User
 from .models import PremiumListing, PromoCode
 from .forms import PremiumListingForm
-from . import utils
+from . import payments
 import uuid
 
 def premium_form(request):
@@ -17,11 +30,12 @@ def premium_form(request):
         # Get plan from URL parameter
         selected_plan = request.GET.get('plan', '')
 
-        # Get user's properties that aren't already premium
+        # Get user's properties that aren't already premium or mid-checkout
         available_properties = Property.objects.filter(
             user=request.user
         ).exclude(
-            premium_listing__isnull=False
+            Q(premium_listing__payment_status='pending') |
+            Q(premium_listing__payment_status='completed', premium_listing__is_active=True)
         )
 
         if request.method == 'POST':
@@ -33,7 +47,7 @@ def premium_form(request):
                 return redirect('premium:qr_payment', plan_type=plan_type, property_pk=property_id)
 
         context = {
-            'available_properties': available_properties,
+            'available_properties': attach_lookups(available_properties, 'property_type'),
             'selected_plan': selected_plan,
         }
         return render(request, 'premium/premium_form.html', context)
@@ -194,78 +208,78 @@ def qr_payment(request, plan_type, property_pk):
 
 @login_required
 def payment_processing(request, plan_type, property_pk, payment_method):
-    """Show payment processing simulation"""
+    """Start the checkout and show its progress; the gateway settles it asynchronously"""
     property = get_object_or_404(Property, pk=property_pk, user=request.user)
 
-    # Plan pricing
-    plan_prices = {
-        'basic': 500,      # 1 week
-        'featured': 2000,  # 1 month
-        'premium': 5000,   # 3 months
-    }
+    # Applies to this checkout only
+    promo_code = request.session.pop('promo_code', None)
+    promo = PromoCode.objects.filter(code=promo_code).first() if promo_code else None
 
-    plan_durations = {
-        'basic': 7,        # days
-        'featured': 30,    # days
-        'premium': 90,     # days
-    }
+    try:
+        premium_listing = payments.start_checkout(request.user, property, plan_type, payment_method, promo)
+    except payments.AlreadyPremium:
+        messages.warning(request, "This property already has an active premium listing.")
+        return redirect('premium:premium_dashboard')
 
-    price = plan_prices.get(plan_type, 500)
-    duration_days = plan_durations.get(plan_type, 7)
+    if promo_code and (premium_listing.payment_details or {}).get('promo_code') != promo_code:
+        messages.warning(request, "Sorry, this promo code has reached its usage limit.")
 
-    # Calculate subscription dates
+    price = premium_listing.amount_paid
+    duration_days = (premium_listing.payment_details or {}).get('duration_days', payments.PLAN_DURATIONS.get(plan_type, 7))
     start_date = timezone.now()
-    end_date = start_date + timedelta(days=duration_days)
-
-    # Simulate payment processing result
-    # In real app, this would be webhook/callback result
-    payment_success = process_payment_simulation(payment_method, price, request.user)
-
-    if payment_success['success']:
-        # Create premium listing
-        premium_listing = PremiumListing.objects.create(
-            property=property,
-            user=request.user,
-            plan_type=plan_type,
-            amount_paid=price,
-            payment_method=payment_method,
-            payment_status='completed',
-            payment_reference=payment_success.get('reference', ''),
-            payment_details=payment_success,
-            start_date=start_date,
-            end_date=end_date,
-            is_active=True
-        )
-
-        # Update property premium status
-        property.is_premium = True
-        property.save()
-
-        # Send success email
-        utils.send_premium_activated_email(request.user, property, premium_listing)
-
-        messages.success(request, f"Premium listing activated successfully! Your property '{property.title}' is now premium.")
-
-    else:
-        # Log failed payment attempt
-        utils.send_payment_failed_email(request.user, property, plan_type, price,
-                                      payment_success.get('payment_id', 'N/A'))
-        messages.error(request, "Payment failed. Please try again or contact support.")
 
     context = {
         'property': property,
-        'plan_type': plan_type,
-        'payment_method': payment_method,
+        'premium_listing': premium_listing,
+        'plan_type': premium_listing.plan_type,
+        'payment_method': premium_listing.payment_method,
         'price': price,
         'duration_days': duration_days,
         'start_date': start_date,
-        'end_date': end_date,
+        'end_date': start_date + timedelta(days=duration_days),
         'payment_date': start_date,
-        'payment_success': payment_success['success'],
-        'payment_details': payment_success,
+        'status_url': reverse('premium:payment_status', args=[premium_listing.payment_reference]),
     }
     return render(request, 'premium/payment_processing.html', context)
 
+@login_required
+def payment_status(request, reference):
+    """Current state of a checkout, polled by the processing page"""
+    premium_listing = get_object_or_404(PremiumListing, payment_reference=reference, user=request.user)
+    result = (premium_listing.payment_details or {}).get('result', {})
+    return JsonResponse({
+        'status': premium_listing.payment_status,
+        'reference': premium_listing.payment_reference,
+        'payment_id': result.get('payment_id', premium_listing.payment_id),
+        'error': result.get('error', ''),
+    })
+
+@csrf_exempt
+@require_POST
+def payment_callback(request):
+    """
+    Gateway webhook reporting the outcome of a payment.
+
+    Signed with PAYMENT_WEBHOOK_SECRET (X-Payment-Signature header) and idempotent on
+    the payment reference: repeated deliveries are acknowledged without side effects.
+    """
+    try:
+        premium_listing, applied = payments.handle_callback(
+            request.body, request.headers.get('X-Payment-Signature', '')
+        )
+    except PermissionDenied:
+        return JsonResponse({'success': False, 'message': 'Invalid signature'}, status=403)
+    except PremiumListing.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Unknown payment reference'}, status=404)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'status': premium_listing.payment_status,
+        'duplicate': not applied,
+    })
+
 @login_required
 def premium_checkout(request, plan_type, property_pk):
     """Payment checkout simulation for premium upgrade"""
@@ -303,14 +317,11 @@ def premium_checkout(request, plan_type, property_pk):
             try:
                 promo_obj = PromoCode.objects.get(code=promo_code, is_active=True)
                 if promo_obj.is_valid():
+                    # Redeemed by start_checkout once the checkout has a payment reference
                     discount_amount = promo_obj.apply_discount(original_price)
                     discounted_price = promo_obj.apply_discount(original_price)
-                    if promo_obj.use_code():
-                        messages.success(request, f"Promo code applied! You saved NPR {discount_amount:.2f}")
-                        promo_code_obj = promo_obj
-                    else:
-                        messages.error(request, "Sorry, this promo code has reached its usage limit.")
-                        return redirect('premium:premium_checkout', plan_type=plan_type, property_pk=property_pk)
+                    messages.success(request, f"Promo code applied! You saved NPR {discount_amount:.2f}")
+                    promo_code_obj = promo_obj
                 else:
                     messages.error(request, "Invalid or expired promo code.")
                     return redirect('premium:premium_checkout', plan_type=plan_type, property_pk=property_pk)
@@ -356,79 +367,81 @@ def premium_checkout(request, plan_type, property_pk):
     }
     return render(request, 'premium/premium_checkout.html', context)
 
-def process_payment_simulation(payment_method, amount, user):
-    """Simulate payment processing for different methods"""
-    import time
-    from random import choice
-
-    # Simulate processing time
-    time.sleep(1)
-
-    payment_id = f"PAY_{uuid.uuid4().hex[:8].upper()}"
-
-    # Simulate different success rates based on payment method
-    success_rates = {
-        'esewa': 0.95,
-        'khalti': 0.93,
-        'credit_card': 0.90,
-        'bank_transfer': 0.85,
-        'mobile_banking': 0.88,
-        'cash': 1.0,  # Always successful for cash
-    }
-
-    success_rate = success_rates.get(payment_method, 0.80)
-
-    # Simulate random success/failure
-    if choice([True, False]) or success_rate >= 0.9:  # Higher success rate for demo
-        return {
-            'success': True,
-            'payment_id': payment_id,
-            'reference': f"REF_{uuid.uuid4().hex[:6].upper()}",
-            'details': {
-                'method': payment_method,
-                'amount': amount,
-                'currency': 'NPR',
-                'processed_at': timezone.now().isoformat(),
-                'status': 'completed'
-            }
-        }
-    else:
-        return {
-            'success': False,
-            'payment_id': payment_id,
-            'error': f"{payment_method.upper()} payment failed. Please try again or use a different payment method."
-        }
-
 @login_required
 def premium_analytics(request):
-    """Detailed analytics for premium users"""
-    user_properties = Property.objects.filter(user=request.user, is_premium=True)
+    """
+    Detailed analytics for premium users.
+
+    Built from the rolled-up PropertyAnalytics/PropertyDailyAnalytics tables and cached
+    per user. The cache key carries the page view rollup watermark, so the next
+    rollup_analytics run invalidates it; PREMIUM_ANALYTICS_CACHE_TTL bounds how stale
+    the inquiry counts can get in between.
+    """
+    rolled_up_to = AnalyticsCheckpoint.objects.filter(
+        name=PAGE_VIEW_CHECKPOINT
+    ).values_list('last_id', flat=True).first() or 0
+    today = timezone.localdate()
+    cache_key = f'premium_analytics:{request.user.pk}:{rolled_up_to}:{today}'
+    context = cache.get(cache_key)
+    if context is None:
+        context = build_premium_analytics(request.user, today)
+        cache.set(cache_key, context, settings.PREMIUM_ANALYTICS_CACHE_TTL)
+    return render(request, 'premium/premium_analytics.html', context)
 
-    # Get analytics data
-    total_views = 0
-    total_inquiries = 0
+def build_premium_analytics(user, today):
+    """
+    Dashboard numbers for a user's premium properties in three queries: the properties
+    annotated with their inquiry counts, then their rolled-up view totals and the
+    PREMIUM_ANALYTICS_DAYS daily view series (zero-filled, oldest first) by id.
+    """
+    inquiries = ContactInquiry.objects.filter(property=OuterRef('pk')).order_by().values(
+        'property'
+    ).annotate(count=Count('id')).values('count')
+    rows = list(Property.objects.filter(user=user, is_premium=True).annotate(
+        inquiries=Coalesce(Subquery(inquiries), 0),
+    ).order_by('-created_at').values('id', 'title', 'inquiries'))
+    # The analytics tables may live in another database: fetched by id, never joined
+    views = dict(PropertyAnalytics.objects.filter(
+        property_id__in=[row['id'] for row in rows]
+    ).values_list('property_id', 'total_views')) if rows else {}
+
+    days = [today - timedelta(days=offset) for offset in range(settings.PREMIUM_ANALYTICS_DAYS - 1, -1, -1)]
     property_analytics = []
-
-    for prop in user_properties:
-        views = prop.page_views.count()
-        inquiries = prop.contactinquiry_set.count()
-        total_views += views
-        total_inquiries += inquiries
-
+    series = {}
+    for row in rows:
+        property_views = views.get(row['id'], 0)
         property_analytics.append({
-            'property': prop,
-            'views': views,
-            'inquiries': inquiries,
-            'conversion_rate': (inquiries / views * 100) if views > 0 else 0
+            'property': {'id': row['id'], 'title': row['title']},
+            'views': property_views,
+            'inquiries': row['inquiries'],
+            'conversion_rate': (row['inquiries'] / property_views * 100) if property_views > 0 else 0,
         })
-
-    context = {
+        series[row['id']] = dict.fromkeys(days, 0)
+
+    if series:
+        daily = PropertyDailyAnalytics.objects.filter(
+            property_id__in=series, date__gte=days[0], date__lte=today
+        ).values_list('property_id', 'date', 'views')
+        for property_id, day, day_views in daily:
+            series[property_id][day] = day_views
+    for analytics in property_analytics:
+        analytics['daily_views'] = list(series[analytics['property']['id']].values())
+
+    total_views = sum(analytics['views'] for analytics in property_analytics)
+    total_inquiries = sum(analytics['inquiries'] for analytics in property_analytics)
+    return {
         'total_views': total_views,
         'total_inquiries': total_inquiries,
         'property_analytics': property_analytics,
         'avg_conversion_rate': (total_inquiries / total_views * 100) if total_views > 0 else 0,
+        'chart_data': {
+            'days': [day.isoformat() for day in days],
+            'properties': [
+                {'title': analytics['property']['title'], 'views': analytics['daily_views']}
+                for analytics in property_analytics
+            ],
+        },
     }
-    return render(request, 'premium/premium_analytics.html', context)
 
 def admin_create_premium(request):
     """Admin view to manually create premium listings for users"""
@@ -1,5 +1,4 @@
 from django.contrib import admin
-from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import path
 from django.shortcuts import render, redirect, get_object_or_404
@@ -7,10 +6,13 @@ from django.http import JsonResponse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
 import json
+from real_estate.exports import CsvExportMixin, format_datetime, yes_no
+from . import lookups
 from .models import Property, PropertyType, Amenity, Image, SavedSearch, Company, Location
+from .ranking import refresh_rank_scores
 
 @admin.register(Property)
-class PropertyAdmin(admin.ModelAdmin):
+class PropertyAdmin(CsvExportMixin, admin.ModelAdmin):
     list_display = ('get_thumbnail', 'title', 'user', 'property_type', 'city', 'format_price', 'format_status', 'is_premium', 'created_at', 'admin_actions')
     list_display_links = ('get_thumbnail', 'title')
     list_filter = ('property_type', 'status', 'is_premium', 'is_verified', 'created_at', 'state')
@@ -47,12 +49,17 @@ class PropertyAdmin(admin.ModelAdmin):
 
     list_per_page = 25
     ordering = ('-created_at',)
+    list_select_related = ('user', 'property_type')
+
+    def get_queryset(self, request):
+        """Images are prefetched for the thumbnails"""
+        return super().get_queryset(request).prefetch_related('images')
 
     # Enhanced formatters for list display
     def get_thumbnail(self, obj):
         """Display property thumbnail"""
-        if obj.images.exists():
-            image = obj.images.first()
+        image = next(iter(obj.images.all()), None)
+        if image is not None:
             return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 4px;" />',
                              image.image.url)
         elif obj.floor_plan_image:
@@ -238,46 +245,43 @@ class PropertyAdmin(admin.ModelAdmin):
         return False
 
     def mark_as_verified(self, request, queryset):
+        property_ids = list(queryset.values_list('pk', flat=True))
         queryset.update(is_verified=True)
+        refresh_rank_scores(Property.objects.filter(pk__in=property_ids))
         self.message_user(request, f"{queryset.count()} properties marked as verified.")
     mark_as_verified.short_description = "Verify selected properties"
 
     def mark_as_premium(self, request, queryset):
+        property_ids = list(queryset.values_list('pk', flat=True))
         queryset.update(is_premium=True)
+        refresh_rank_scores(Property.objects.filter(pk__in=property_ids))
         self.message_user(request, f"{queryset.count()} properties marked as premium.")
     mark_as_premium.short_description = "Make premium"
 
     def remove_premium(self, request, queryset):
+        property_ids = list(queryset.values_list('pk', flat=True))
         queryset.update(is_premium=False)
+        refresh_rank_scores(Property.objects.filter(pk__in=property_ids))
         self.message_user(request, f"{queryset.count()} properties removed from premium.")
     remove_premium.short_description = "Remove premium status"
 
+    export_name = 'properties'
+    export_columns = (
+        ('Title', 'title'),
+        ('User', 'user__username'),
+        ('Type', 'property_type__name'),
+        ('City', 'city'),
+        ('State', 'state'),
+        ('Price', 'price'),
+        ('Status', 'status'),
+        ('Premium', 'is_premium', yes_no),
+        ('Verified', 'is_verified', yes_no),
+        ('Created', 'created_at', format_datetime),
+    )
+
     def export_properties(self, request, queryset):
         # Export selected properties to CSV
-        import csv
-        from django.http import HttpResponse
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="properties_export_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(['Title', 'User', 'Type', 'City', 'State', 'Price', 'Status', 'Premium', 'Verified', 'Created'])
-
-        for property in queryset:
-            writer.writerow([
-                property.title,
-                property.user.username,
-                property.property_type.name if property.property_type else '',
-                property.city,
-                property.state,
-                property.price,
-                property.status,
-                'Yes' if property.is_premium else 'No',
-                'Yes' if property.is_verified else 'No',
-                property.created_at.strftime('%Y-%m-%d %H:%M')
-            ])
-
-        self.message_user(request, f"Exported {queryset.count()} properties to CSV.")
+        return self.export_csv(request, queryset)
     export_properties.short_description = "Export to CSV"
 
     def bulk_update_status(self, request, queryset):
@@ -543,11 +547,13 @@ class CompanyAdmin(admin.ModelAdmin):
 
     def activate_companies(self, request, queryset):
         queryset.update(is_active=True)
+        lookups.companies.invalidate()
         self.message_user(request, f"{queryset.count()} companies activated.")
     activate_companies.short_description = "Activate selected companies"
 
     def deactivate_companies(self, request, queryset):
         queryset.update(is_active=False)
+        lookups.companies.invalidate()
         self.message_user(request, f"{queryset.count()} companies deactivated.")
     deactivate_companies.short_description = "Deactivate selected companies"
 
@@ -574,10 +580,12 @@ class LocationAdmin(admin.ModelAdmin):
 
     def activate_locations(self, request, queryset):
         queryset.update(is_active=True)
+        lookups.locations.invalidate()
         self.message_user(request, f"{queryset.count()} locations activated.")
     activate_locations.short_description = "Activate selected locations"
 
     def deactivate_locations(self, request, queryset):
         queryset.update(is_active=False)
+        lookups.locations.invalidate()
         self.message_user(request, f"{queryset.count()} locations deactivated.")
     deactivate_locations.short_description = "Deactivate selected locations"
@@ -1,14 +1,15 @@
 from django import forms
+from .lookups import LookupChoiceField, LookupMultipleChoiceField
 from .models import Property, PropertyType, Amenity
 
 class PropertySearchForm(forms.Form):
     query = forms.CharField(max_length=255, required=False, label='Keywords')
-    property_type = forms.ModelChoiceField(queryset=PropertyType.objects.all(), required=False, label='Property Type')
+    property_type = LookupChoiceField(queryset=PropertyType.objects.all(), required=False, label='Property Type')
     min_price = forms.DecimalField(max_digits=15, decimal_places=2, required=False, label='Min Price')
     max_price = forms.DecimalField(max_digits=15, decimal_places=2, required=False, label='Max Price')
     min_sq_ft = forms.IntegerField(required=False, label='Min Square Footage')
     max_sq_ft = forms.IntegerField(required=False, label='Max Square Footage')
-    amenities = forms.ModelMultipleChoiceField(queryset=Amenity.objects.all(), required=False, widget=forms.CheckboxSelectMultiple, label='Amenities')
+    amenities = LookupMultipleChoiceField(queryset=Amenity.objects.all(), required=False, widget=forms.CheckboxSelectMultiple, label='Amenities')
 
     # Add more fields for other filters like location, year built, zoning, etc.
     city = forms.CharField(max_length=100, required=False, label='City')
@@ -29,6 +30,10 @@ class PropertyForm(forms.ModelForm):
             'rent_roll', 'expense_summaries', 'broker_name', 'broker_email', 
             'broker_phone', 'virtual_tour_url', 'floor_plan_image'
         ]
+        field_classes = {
+            'property_type': LookupChoiceField,
+            'amenities': LookupMultipleChoiceField,
+        }
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
             'rent_roll': forms.Textarea(attrs={'rows': 4}),
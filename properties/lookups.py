@@ -0,0 +1,159 @@
+"""
+Process-local copies of the small lookup tables: property types, amenities,
+locations and companies.
+
+They change maybe once a week but are read by every search form, listing form and
+listing page, so each process keeps the whole table in memory, stamped with the
+table's version in the shared cache (settings.LOOKUP_CACHE). Saving or deleting a
+row (or invalidate() after a queryset update) stores a new version once the
+transaction commits; every process sees it at its next version check, at most
+LOOKUP_VERSION_CHECK_SECONDS later, and reloads the table.
+
+Cached instances are shared between requests and threads: read them, never modify
+or save them.
+"""
+import threading
+import time
+import uuid
+
+from django import forms
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.forms.models import ModelChoiceIterator
+
+from .models import Amenity, Company, Location, PropertyType
+
+
+class LookupTable:
+    def __init__(self, model, ordering=('name',)):
+        self.model = model
+        self.ordering = ordering
+        self.version_key = f'lookup_version:{model._meta.label_lower}'
+        self.lock = threading.Lock()
+        self.checked_at = None
+        self.state = (None, (), {})  # (version, rows, rows by pk)
+
+    def current(self):
+        """(rows, rows by pk), reloaded if another process changed the table"""
+        now = time.monotonic()
+        if self.checked_at is None or now - self.checked_at >= settings.LOOKUP_VERSION_CHECK_SECONDS:
+            with self.lock:
+                if self.checked_at is None or now - self.checked_at >= settings.LOOKUP_VERSION_CHECK_SECONDS:
+                    self.refresh(now)
+        return self.state[1:]
+
+    def refresh(self, now):
+        cache = caches[settings.LOOKUP_CACHE]
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        if version != self.state[0]:
+            # From the primary: a lagging replica's rows would be kept under the new version
+            manager = self.model._default_manager.db_manager(router.db_for_write(self.model))
+            rows = tuple(manager.order_by(*self.ordering))
+            self.state = (version, rows, {row.pk: row for row in rows})
+        self.checked_at = now
+
+    def all(self):
+        return self.current()[0]
+
+    def get(self, pk):
+        """The row with primary key pk (an int or its string form), or None"""
+        try:
+            pk = self.model._meta.pk.to_python(pk)
+        except ValidationError:
+            return None
+        return self.current()[1].get(pk)
+
+    def invalidate(self):
+        """Publish a new version once the current transaction commits"""
+        def publish():
+            caches[settings.LOOKUP_CACHE].set(self.version_key, uuid.uuid4().hex, None)
+            self.checked_at = None
+
+        transaction.on_commit(publish, using=router.db_for_write(self.model))
+
+
+property_types = LookupTable(PropertyType)
+amenities = LookupTable(Amenity)
+locations = LookupTable(Location)
+companies = LookupTable(Company)
+
+TABLES = {table.model: table for table in (property_types, amenities, locations, companies)}
+
+
+def attach_lookups(objects, *fields):
+    """
+    Fill the named foreign keys of each object from the lookup tables, e.g.
+    ``attach_lookups(properties, 'property_type', 'location')``, so reading them
+    doesn't query. Evaluates objects if it is a queryset.
+    """
+    for obj in objects:
+        for name in fields:
+            field = obj._meta.get_field(name)
+            related = TABLES[field.related_model].get(getattr(obj, field.attname))
+            if related is not None:
+                field.set_cached_value(obj, related)
+    return objects
+
+
+class LookupChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.lookup.all():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.lookup.all()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.lookup.all())
+
+
+class LookupChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField over a lookup table; renders and validates from the cache"""
+    iterator = LookupChoiceIterator
+
+    def __init__(self, queryset, **kwargs):
+        super().__init__(queryset, **kwargs)
+        self.lookup = TABLES[queryset.model]
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            value = value.pk
+        obj = self.lookup.get(value)
+        if obj is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value}
+            )
+        return obj
+
+
+class LookupMultipleChoiceField(forms.ModelMultipleChoiceField):
+    """ModelMultipleChoiceField over a lookup table; cleans to a list of cached rows"""
+    iterator = LookupChoiceIterator
+
+    def __init__(self, queryset, **kwargs):
+        super().__init__(queryset, **kwargs)
+        self.lookup = TABLES[queryset.model]
+
+    def _check_values(self, value):
+        try:
+            value = frozenset(value)
+        except TypeError:
+            raise ValidationError(self.error_messages['invalid_list'], code='invalid_list')
+        objects = []
+        for pk in value:
+            obj = self.lookup.get(pk)
+            if obj is None:
+                raise ValidationError(
+                    self.error_messages['invalid_choice'], code='invalid_choice', params={'value': pk}
+                )
+            objects.append(obj)
+        return objects
@@ -1,10 +1,11 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from core.nplusone import RepeatedQueryCheckMixin
 from properties.models import Image
 from properties.utils import detect_fake_images, get_image_statistics
 
 
-class Command(BaseCommand):
+class Command(RepeatedQueryCheckMixin, BaseCommand):
     help = 'Detect and flag fake property images for admin review'
 
     def add_arguments(self, parser):
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:22
+
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# Frozen copy of properties.ranking and settings.PROPERTY_RANK_BOOSTS as of this
+# migration, so later changes to either don't change what it computes
+RANK_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+PLAN_BOOSTS = {'premium': 3650, 'featured': 365, 'basic': 30}
+VERIFIED_BOOST = 14
+IMAGE_BOOST = 1
+MAX_IMAGES = 5
+HD_IMAGE_BOOST = 2
+HD_IMAGE_WIDTH = 1200
+VISIBLE_IMAGE_STATUSES = ('pending', 'approved')
+
+
+def rank_existing_properties(apps, schema_editor):
+    Property = apps.get_model('properties', 'Property')
+    Image = apps.get_model('properties', 'Image')
+    PremiumListing = apps.get_model('premium', 'PremiumListing')
+
+    plans = dict(
+        PremiumListing.objects.filter(is_active=True, property__is_premium=True)
+        .values_list('property_id', 'plan_type')
+    )
+    visible = Image.objects.filter(status__in=VISIBLE_IMAGE_STATUSES, is_duplicate=False)
+    images = Counter(visible.values_list('property_id', flat=True).iterator())
+    hd_images = set(visible.filter(width__gte=HD_IMAGE_WIDTH).values_list('property_id', flat=True))
+
+    ranked = []
+    for pk, created_at, is_verified in Property.objects.values_list('pk', 'created_at', 'is_verified').iterator():
+        score = (created_at - RANK_EPOCH).total_seconds() / 86400
+        score += PLAN_BOOSTS.get(plans.get(pk), 0)
+        if is_verified:
+            score += VERIFIED_BOOST
+        score += min(images[pk], MAX_IMAGES) * IMAGE_BOOST
+        if pk in hd_images:
+            score += HD_IMAGE_BOOST
+        ranked.append(Property(pk=pk, rank_score=round(score, 4)))
+    Property.objects.bulk_update(ranked, ['rank_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0008_alter_image_options_image_created_at_and_more'),
+        ('premium', '0007_promoredemption'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='rank_score',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(rank_existing_properties, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
 from django.utils import timezone
 
@@ -107,9 +108,27 @@ class Property(models.Model):
     # Verification status
     is_verified = models.BooleanField(default=False)
 
+    # Search ranking, maintained by properties.ranking
+    rank_score = models.FloatField(default=0, db_index=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Matched to the filters and orderings of the listing views; checked by explain_queries.
+        # Django renders filter(flag=True) as a bare column test, which SQLite cannot
+        # match against an index column, so boolean filters get partial indexes instead.
+        indexes = [
+            models.Index(fields=['-rank_score'], condition=Q(is_premium=True), name='property_premium_rank_idx'),
+            models.Index(fields=['user', '-created_at'], condition=Q(is_premium=True), name='property_user_premium_idx'),
+            models.Index(fields=['status', '-rank_score'], name='property_status_rank_idx'),
+            models.Index(fields=['status', 'price'], name='property_status_price_idx'),
+            models.Index(fields=['price'], name='property_price_idx'),
+            models.Index(fields=['-created_at'], name='property_created_idx'),
+            models.Index(fields=['-created_at'], condition=Q(is_verified=True), name='property_verified_idx'),
+            models.Index(fields=['-created_at'], condition=Q(is_verified=False), name='property_unverified_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -0,0 +1,66 @@
+"""
+Precomputed search ranking for properties.
+
+Property.rank_score is the listing's age expressed as a number of days since
+RANK_EPOCH, plus boosts (also in days) for its premium plan, verification and
+images. Because every listing ages at the same rate, adding the creation day
+instead of subtracting the age keeps the relative order correct forever, so the
+score only changes when one of its inputs does and ``ORDER BY rank_score DESC``
+reads straight off the index.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Case, Count, F, Q, When
+from django.utils import timezone
+
+RANK_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.get_fixed_timezone(0))
+
+# Images that still count towards a listing's quality
+VISIBLE_IMAGE_STATUSES = ('pending', 'approved')
+
+
+def compute_rank_score(created_at, plan_type=None, is_verified=False, images=0, hd_images=0):
+    boosts = settings.PROPERTY_RANK_BOOSTS
+    score = (created_at - RANK_EPOCH).total_seconds() / 86400
+    if plan_type:
+        score += boosts['plans'].get(plan_type, 0)
+    if is_verified:
+        score += boosts['verified']
+    score += min(images, boosts['max_images']) * boosts['image']
+    if hd_images:
+        score += boosts['hd_image']
+    return round(score, 4)
+
+
+def rank_inputs(queryset):
+    """Annotate the ranking inputs of each property in one query"""
+    visible = Q(images__status__in=VISIBLE_IMAGE_STATUSES, images__is_duplicate=False)
+    return queryset.annotate(
+        rank_plan=Case(When(
+            is_premium=True,
+            premium_listing__is_active=True,
+            then=F('premium_listing__plan_type'),
+        )),
+        rank_images=Count('images', filter=visible),
+        rank_hd_images=Count('images', filter=visible & Q(
+            images__width__gte=settings.PROPERTY_RANK_HD_IMAGE_WIDTH
+        )),
+    ).values_list('pk', 'rank_score', 'created_at', 'rank_plan', 'is_verified', 'rank_images', 'rank_hd_images')
+
+
+def refresh_rank_scores(queryset, batch_size=500):
+    """
+    Recompute rank_score for the properties in queryset; only changed rows are written.
+
+    Used by the model signals and after set-based updates (premium expiry, admin
+    bulk actions) that bypass them. Returns the number of properties updated.
+    """
+    model = queryset.model
+    changed = []
+    for pk, current, created_at, plan_type, is_verified, images, hd_images in rank_inputs(queryset.order_by()).iterator():
+        score = compute_rank_score(created_at, plan_type, is_verified, images, hd_images)
+        if score != current:
+            changed.append(model(pk=pk, rank_score=score))
+    model.objects.bulk_update(changed, ['rank_score'], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,40 @@
+"""
+Keep Property.rank_score current when a property or its images change, and the
+cached lookup tables current when their rows change.
+
+Premium listing changes are handled in premium.signals.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .lookups import TABLES
+from .models import Amenity, Company, Image, Location, Property, PropertyType
+from .ranking import refresh_rank_scores
+
+
+@receiver(post_save, sender=Property)
+def rank_saved_property(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and set(update_fields) <= {'rank_score'}):
+        return
+    refresh_rank_scores(Property.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Image)
+def rank_property_of_saved_image(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_rank_scores(Property.objects.filter(pk=instance.property_id))
+
+
+@receiver(post_delete, sender=Image)
+def rank_property_of_deleted_image(sender, instance, origin=None, **kwargs):
+    # Images removed along with their property need no re-ranking
+    if getattr(origin, 'model', type(origin)) is Image:
+        refresh_rank_scores(Property.objects.filter(pk=instance.property_id))
+
+
+@receiver([post_save, post_delete], sender=PropertyType)
+@receiver([post_save, post_delete], sender=Amenity)
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=Company)
+def invalidate_lookup_table(sender, **kwargs):
+    TABLES[sender].invalidate()
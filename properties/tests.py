@@ -1,3 +1,218 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import router
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import path, reverse
+
+from analytics.models import PageView, SocialShare
+from core.nplusone import RepeatedQueriesError, RepeatedQueryCheckMixin, detect_repeated_queries
+from premium.models import PremiumListing
+from real_estate.routers import _replica_lag, end_request_routing, start_request_routing
+
+from .forms import PropertySearchForm
+from .lookups import LookupTable, amenities, property_types
+from .models import Image, Property, PropertyType
+from .ranking import RANK_EPOCH, compute_rank_score, refresh_rank_scores
+
+
+@override_settings(LOOKUP_CACHE='default', LOOKUP_VERSION_CHECK_SECONDS=0)
+class LookupTableTests(TestCase):
+    def test_forms_resolve_choices_from_the_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            office = PropertyType.objects.create(name='Office')
+        property_types.all()
+        amenities.all()
+
+        with self.assertNumQueries(0):
+            form = PropertySearchForm({'property_type': str(office.pk)})
+            self.assertTrue(form.is_valid())
+            self.assertEqual(form.cleaned_data['property_type'], office)
+            self.assertIn('Office', form.as_p())
+            self.assertFalse(PropertySearchForm({'property_type': '0'}).is_valid())
+
+    def test_change_in_one_process_reloads_the_others(self):
+        other_process = LookupTable(PropertyType)
+        PropertyType.objects.create(name='Office')
+        self.assertEqual([row.name for row in other_process.all()], ['Office'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PropertyType.objects.create(name='Retail')
+        self.assertEqual([row.name for row in other_process.all()], ['Office', 'Retail'])
+
+        with self.assertNumQueries(0):
+            other_process.all()
+
+
+@override_settings(
+    LOOKUP_CACHE='default', DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG_SECONDS=10, REPLICA_LAG_CHECK_SECONDS=3600,
+)
+class LookupTableRoutingTests(TransactionTestCase):
+    def test_reload_inside_a_request_reads_the_primary(self):
+        PropertyType.objects.create(name='Office')
+        # Fresh as far as the router knows, but not a configured database: reading from it fails
+        _replica_lag['replica1'] = (time.monotonic(), 0)
+        self.addCleanup(_replica_lag.clear)
+
+        token = start_request_routing()
+        try:
+            self.assertEqual(router.db_for_read(PropertyType), 'replica1')
+            self.assertEqual([row.name for row in LookupTable(PropertyType).all()], ['Office'])
+        finally:
+            end_request_routing(token)
+
+
+@override_settings(NPLUSONE_ACTION='raise', NPLUSONE_THRESHOLD=3, NPLUSONE_ALLOWLIST=[])
+class RepeatedQueryTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        office = PropertyType.objects.create(name='Office')
+        for i in range(4):
+            listing = Property.objects.create(
+                user=cls.admin, title=f'Listing {i}', description='-', property_type=office,
+                address='-', city='Kathmandu', state='Bagmati', zip_code='44600', price=1000,
+            )
+            Image.objects.bulk_create([Image(property=listing, image=f'property_images/{i}.jpg')])
+            PageView.objects.create(url=f'/properties/{listing.pk}/', property=listing, user=cls.admin)
+            SocialShare.objects.create(platform='facebook', content_type='property', property=listing, user=cls.admin)
+
+    def test_query_repeated_in_a_loop_raises(self):
+        with self.assertRaisesMessage(RepeatedQueriesError, '4 x SELECT'):
+            with detect_repeated_queries('loop'):
+                for listing in Property.objects.all():
+                    listing.images.first()
+
+    def test_only_commands_that_opt_in_are_checked(self):
+        class LoopCommand(BaseCommand):
+            def handle(self, *args, **options):
+                for listing in Property.objects.all():
+                    listing.images.first()
+
+        class CheckedLoopCommand(RepeatedQueryCheckMixin, LoopCommand):
+            pass
+
+        LoopCommand().execute(skip_checks=True, no_color=False, force_color=False, stdout=StringIO())
+        with self.assertRaisesMessage(RepeatedQueriesError, '4 x SELECT'):
+            CheckedLoopCommand().execute(skip_checks=True, no_color=False, force_color=False, stdout=StringIO())
+
+    def test_listing_admin_does_not_query_per_row(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/real-admin/properties/property/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelists_do_not_query_per_row(self):
+        self.client.force_login(self.admin)
+        for changelist in (
+            'properties/image', 'accounts/user', 'analytics/pageview', 'analytics/socialshare',
+        ):
+            with self.subTest(changelist):
+                response = self.client.get(f'/real-admin/{changelist}/')
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(ROOT_URLCONF='properties.tests')
+    def test_default_site_user_admin_does_not_query_per_row(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/accounts/user/')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    PROPERTY_RANK_BOOSTS={
+        'plans': {'premium': 1000, 'featured': 100, 'basic': 10},
+        'verified': 5, 'image': 1, 'max_images': 3, 'hd_image': 2,
+    },
+    PROPERTY_RANK_HD_IMAGE_WIDTH=1200,
+)
+class RankScoreTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user('owner', 'owner@example.com', 'pw')
+        cls.office = PropertyType.objects.create(name='Office')
+
+    def create_listing(self, title='Listing', **fields):
+        return Property.objects.create(
+            user=self.owner, title=title, description='-', property_type=self.office,
+            address='-', city='Kathmandu', state='Bagmati', zip_code='44600', price=1000, **fields,
+        )
+
+    def add_image(self, listing, name, width=800, **fields):
+        return Image.objects.create(property=listing, image=f'property_images/{name}.jpg', width=width, **fields)
+
+    def test_compute_rank_score(self):
+        created = RANK_EPOCH + timedelta(days=10, hours=12)
+        self.assertEqual(compute_rank_score(created), 10.5)
+        self.assertEqual(compute_rank_score(created, 'featured'), 110.5)
+        self.assertEqual(compute_rank_score(created, 'unknown'), 10.5)
+        self.assertEqual(compute_rank_score(created, is_verified=True), 15.5)
+        # Images count up to max_images; one HD image is enough for the HD boost
+        self.assertEqual(compute_rank_score(created, images=2), 12.5)
+        self.assertEqual(compute_rank_score(created, images=7, hd_images=2), 15.5)
+
+    def test_refresh_rank_scores_writes_only_changed_rows(self):
+        listing = self.create_listing()
+        other = self.create_listing('Other')
+        Property.objects.filter(pk=listing.pk).update(rank_score=0)
+
+        self.assertEqual(refresh_rank_scores(Property.objects.all()), 1)
+        listing.refresh_from_db()
+        self.assertEqual(listing.rank_score, compute_rank_score(listing.created_at))
+        self.assertEqual(refresh_rank_scores(Property.objects.filter(pk__in=[listing.pk, other.pk])), 0)
+
+    def test_signals_keep_the_score_current(self):
+        listing = self.create_listing()
+        base = compute_rank_score(listing.created_at)
+        self.assertEqual(listing.rank_score, 0)  # the instance predates the signal's update
+        listing.refresh_from_db()
+        self.assertEqual(listing.rank_score, base)
+
+        def score():
+            return Property.objects.values_list('rank_score', flat=True).get(pk=listing.pk)
+
+        image = self.add_image(listing, 'front')
+        self.assertEqual(score(), round(base + 1, 4))
+        self.add_image(listing, 'wide', width=1600)
+        self.assertEqual(score(), round(base + 2 + 2, 4))
+        self.add_image(listing, 'copy', is_duplicate=True)
+        self.add_image(listing, 'rejected', status='rejected')
+        self.assertEqual(score(), round(base + 2 + 2, 4))
+
+        listing.is_verified = True
+        listing.save()
+        self.assertEqual(score(), round(base + 2 + 2 + 5, 4))
+
+        image.delete()
+        self.assertEqual(score(), round(base + 1 + 2 + 5, 4))
+
+        Property.objects.filter(pk=listing.pk).update(is_premium=True)
+        premium = PremiumListing.objects.create(property=listing, user=self.owner, plan_type='featured')
+        self.assertEqual(score(), round(base + 1 + 2 + 5 + 100, 4))
+        premium.is_active = False
+        premium.save()
+        self.assertEqual(score(), round(base + 1 + 2 + 5, 4))
+
+    def test_property_list_orders_by_rank_score(self):
+        older = self.create_listing('Older')
+        newer = self.create_listing('Newer')
+        verified = self.create_listing('Verified', is_verified=True)
+        Property.objects.filter(pk=older.pk).update(rank_score=50)
+        Property.objects.filter(pk=newer.pk).update(rank_score=10)
+        Property.objects.filter(pk=verified.pk).update(rank_score=30)
+
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('properties:property_list'))
+        self.assertEqual(
+            [listing.title for listing in response.context['properties']], ['Older', 'Verified', 'Newer'],
+        )
+
+
+# admin.site is only mounted under DEBUG
+urlpatterns = [path('admin/', site.urls)]
@@ -172,12 +172,8 @@ def cleanup_orphaned_files():
 
 
 def send_image_moderation_notification(image, action, admin_user=None):
-    """Send notification to property owner about image moderation"""
-    from django.core.mail import send_mail
-    from django.conf import settings
-
-    if not hasattr(settings, 'DEFAULT_FROM_EMAIL'):
-        return  # Email not configured
+    """Queue a notification to the property owner about image moderation"""
+    from premium.outbox import queue_email
 
     try:
         subject = f"Property Image {action.title()} - {image.property.title}"
@@ -202,12 +198,6 @@ Best regards,
 Real Estate Net Team
 """
 
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[image.property.user.email],
-            fail_silently=True,
-        )
+        queue_email(image.property.user, 'image_moderation', subject, message)
     except Exception:
-        pass  # Email sending failed, but don't break the moderation process
+        pass  # Queueing failed, but don't break the moderation process
@@ -3,6 +3,7 @@ from django.db.models import Q
 from .models import Property, SavedSearch
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .forms import PropertySearchForm, PropertyForm
+from .lookups import attach_lookups, property_types
 from django.contrib import messages
 from django.shortcuts import redirect
 import random
@@ -20,10 +21,12 @@ def broker_required(view_func):
 def home(request):
     if request.user.is_authenticated:
         # Get featured/premium properties (limit to 6)
-        featured_properties = Property.objects.filter(is_premium=True)[:6]
+        featured_properties = attach_lookups(
+            Property.objects.filter(is_premium=True).order_by('-rank_score')[:6], 'property_type'
+        )
 
         # Get latest properties (limit to 8)
-        latest_properties = Property.objects.all().order_by('-created_at')[:8]
+        latest_properties = attach_lookups(Property.objects.all().order_by('-created_at')[:8], 'property_type')
 
         context = {
             'featured_properties': featured_properties,
@@ -50,8 +53,11 @@ def property_list(request):
 
     # Apply filters
     if property_type_filter:
-        # For now, we'll filter by property type name (this should be improved with proper property type filtering)
-        properties = properties.filter(property_type__name__icontains=property_type_filter)
+        # Matched by name against the cached property types, so the filter needs no join
+        properties = properties.filter(property_type_id__in=[
+            property_type.pk for property_type in property_types.all()
+            if property_type_filter.lower() in property_type.name.lower()
+        ])
 
     if listing_type_filter:
         if listing_type_filter == 'sale':
@@ -75,14 +81,16 @@ def property_list(request):
         properties = properties.filter(city__icontains=city_filter)
 
     # Add related images to properties for template use
-    properties = properties.prefetch_related('images')
+    properties = attach_lookups(
+        properties.order_by('-rank_score').prefetch_related('images'), 'property_type', 'location'
+    )
 
     # Prepare data for map markers using actual property coordinates
     properties_data = []
     for prop in properties:
         # Use property's location coordinates if available, otherwise fallback to Kathmandu
-        lat = getattr(prop.location, 'latitude', None) or 27.7172
-        lng = getattr(prop.location, 'longitude', None) or 85.3240
+        lat = float(getattr(prop.location, 'latitude', None) or 27.7172)
+        lng = float(getattr(prop.location, 'longitude', None) or 85.3240)
 
         # Add slight randomization if multiple properties have same coordinates
         same_coords = [p for p in properties_data if p['lat'] == lat and p['lng'] == lng]
@@ -107,7 +115,9 @@ def property_list(request):
 
 @login_required(login_url='/accounts/login/')
 def property_detail(request, pk):
-    property = get_object_or_404(Property, pk=pk)
+    # The template checks the images in several places; prefetched, that's one query
+    property = get_object_or_404(Property.objects.select_related('user').prefetch_related('images'), pk=pk)
+    attach_lookups([property], 'property_type')
     context = {
         'property': property
     }
@@ -173,7 +183,7 @@ def search_results(request):
 
     context = {
         'form': form,
-        'properties': properties
+        'properties': properties.order_by('-rank_score'),
     }
     return render(request, 'properties/search_results.html', context)
 
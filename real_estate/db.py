@@ -0,0 +1,172 @@
+"""
+Database helpers shared across apps
+"""
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import F
+
+
+# Pragmas applied only with settings.SQLITE_WAL: journal_mode is written into the
+# database file, and synchronous=NORMAL is only safe in WAL mode
+WAL_PRAGMAS = {'journal_mode', 'synchronous'}
+
+
+def sqlite_pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    connection_created receiver: apply settings.SQLITE_PRAGMAS to every new SQLite connection.
+
+    The WAL_PRAGMAS are left out unless SQLITE_WAL is set, so the database file keeps
+    the journal mode it has.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = settings.SQLITE_PRAGMAS
+    if not settings.SQLITE_WAL:
+        pragmas = {name: value for name, value in pragmas.items() if name not in WAL_PRAGMAS}
+    with connection.cursor() as cursor:
+        for statement in sqlite_pragma_statements(pragmas):
+            cursor.execute(statement)
+
+
+def track_connection_acquisition(connection):
+    """
+    Time what connection spends being acquired: opening a connection (or taking one
+    from the pool), including its initialization and SQLITE_PRAGMAS, and the
+    CONN_HEALTH_CHECKS probe of a reused one.
+
+    Totals accumulate in connection.acquisition (ms, opened, checked) until
+    reset_connection_acquisition() is called; installing twice is a no-op.
+    """
+    if hasattr(connection, 'acquisition'):
+        return
+    reset_connection_acquisition(connection)
+    connect = connection.connect
+    close_if_health_check_failed = connection.close_if_health_check_failed
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            connection.acquisition['ms'] += (time.perf_counter() - start) * 1000
+            connection.acquisition['opened'] += 1
+
+    def timed_health_check():
+        if connection.connection is None or not connection.health_check_enabled or connection.health_check_done:
+            return close_if_health_check_failed()
+        start = time.perf_counter()
+        try:
+            return close_if_health_check_failed()
+        finally:
+            connection.acquisition['ms'] += (time.perf_counter() - start) * 1000
+            connection.acquisition['checked'] += 1
+
+    connection.connect = timed_connect
+    connection.close_if_health_check_failed = timed_health_check
+
+
+def reset_connection_acquisition(connection):
+    connection.acquisition = {'ms': 0.0, 'opened': 0, 'checked': 0}
+
+
+@contextmanager
+def immediate_atomic(using=None, savepoint=True, durable=False):
+    """
+    transaction.atomic() that starts with BEGIN IMMEDIATE when it is the outermost block on SQLite.
+
+    A deferred transaction that reads before it writes must upgrade its lock at the first
+    write, and if another connection committed in the meantime SQLite fails with "database
+    is locked" right away instead of waiting out busy_timeout. Taking the write lock up
+    front makes concurrent writers queue instead. Use it for read-then-write paths; nested
+    blocks and other backends get a plain atomic().
+    """
+    using = using or DEFAULT_DB_ALIAS
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using, savepoint=savepoint, durable=durable):
+            yield
+        return
+
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using, savepoint=savepoint, durable=durable):
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
+
+
+def increment_counters(model, unique_fields, rows, using=None):
+    """
+    Atomically add to counter columns of rows identified by unique_fields, creating them if needed.
+
+    Each row is a dict holding the unique_fields values plus the amounts to add, e.g.
+    ``{'date': today, 'platform': 'facebook', 'total_shares': 1, 'property_shares': 1}``.
+    Rows sharing the same key are summed first, then everything is applied as one
+    ``INSERT ... ON CONFLICT (...) DO UPDATE SET col = col + excluded.col`` statement, so
+    concurrent callers never lose increments. unique_fields must be covered by a unique
+    constraint. Backends without ON CONFLICT fall back to per-row F() updates.
+    """
+    if not rows:
+        return
+
+    totals = {}
+    for row in rows:
+        key = tuple(row[name] for name in unique_fields)
+        counters = totals.setdefault(key, {})
+        for name, amount in row.items():
+            if name not in unique_fields:
+                counters[name] = counters.get(name, 0) + amount
+
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        _increment_counters_fallback(model, unique_fields, totals, using)
+        return
+
+    opts = model._meta
+    counter_names = sorted({name for counters in totals.values() for name in counters})
+    insert_fields = [field for field in opts.concrete_fields if not field.primary_key]
+    table = connection.ops.quote_name(opts.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in insert_fields)
+    conflict = ', '.join(connection.ops.quote_name(opts.get_field(name).column) for name in unique_fields)
+    updates = ', '.join(
+        '{col} = {table}.{col} + excluded.{col}'.format(
+            col=connection.ops.quote_name(opts.get_field(name).column), table=table
+        )
+        for name in counter_names
+    )
+
+    placeholders = []
+    params = []
+    for key, counters in totals.items():
+        values = dict(zip(unique_fields, key))
+        values.update(counters)
+        for field in insert_fields:
+            value = values[field.name] if field.name in values else field.get_default()
+            params.append(field.get_db_prep_save(value, connection))
+        placeholders.append('(%s)' % ', '.join(['%s'] * len(insert_fields)))
+
+    sql = f'INSERT INTO {table} ({columns}) VALUES {", ".join(placeholders)} ON CONFLICT ({conflict}) DO UPDATE SET {updates}'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _increment_counters_fallback(model, unique_fields, totals, using):
+    with transaction.atomic(using=using):
+        for key, counters in totals.items():
+            lookup = dict(zip(unique_fields, key))
+            manager = model._default_manager.using(using)
+            updated = manager.filter(**lookup).update(**{name: F(name) + amount for name, amount in counters.items()})
+            if not updated:
+                manager.get_or_create(**lookup)
+                manager.filter(**lookup).update(**{name: F(name) + amount for name, amount in counters.items()})
@@ -0,0 +1,220 @@
+"""
+CSV exports for admin actions.
+
+Small selections are streamed straight to the browser; rows are read with
+values_list(...).iterator() so neither the queryset nor the CSV is held in memory.
+Selections above EXPORT_STREAM_MAX_ROWS are written to EXPORT_ROOT by a background
+thread and downloaded later from the admin. An export that fails, or is cut short by
+a restart, leaves a .failed marker that the download link reports.
+"""
+import csv
+import logging
+import os
+import threading
+import time
+import uuid
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import close_old_connections, connections
+from django.http import FileResponse, Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+logger = logging.getLogger(__name__)
+
+class Echo:
+    """File-like object whose write() returns the line instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def export_root():
+    return Path(settings.EXPORT_ROOT)
+
+
+class RelatedValue:
+    """
+    Column formatter for a foreign key id whose table may be in another database, where
+    no join is possible: the ids of each chunk are resolved with one query on the
+    related model, e.g. ``('User', 'user_id', RelatedValue(User, 'username'))``.
+    """
+
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+
+    def resolve(self, ids):
+        ids = {value for value in ids if value is not None}
+        if not ids:
+            return {}
+        return dict(self.model._default_manager.filter(pk__in=ids).values_list('pk', self.field))
+
+
+def csv_rows(columns, queryset):
+    """
+    Yield CSV rows for a queryset.
+
+    columns is a list of (header, lookup) or (header, lookup, formatter) tuples; the
+    lookups (including joins such as ``user__username``) are fetched with one
+    values_list query, and RelatedValue columns with one query per chunk, so no
+    per-row queries are made.
+    """
+    lookups = [column[1] for column in columns]
+    formatters = [column[2] if len(column) > 2 else None for column in columns]
+    related = [index for index, formatter in enumerate(formatters) if isinstance(formatter, RelatedValue)]
+
+    yield [column[0] for column in columns]
+    rows = queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    for chunk in iter(lambda: list(islice(rows, settings.EXPORT_CHUNK_SIZE)), []):
+        resolved = {index: formatters[index].resolve(row[index] for row in chunk) for index in related}
+        for row in chunk:
+            yield [
+                resolved[index].get(value, '') if index in resolved
+                else formatter(value) if formatter
+                else ('' if value is None else value)
+                for index, (formatter, value) in enumerate(zip(formatters, row))
+            ]
+
+
+def stream_csv(filename, columns, queryset):
+    """StreamingHttpResponse that sends the CSV as it is read from the database"""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in csv_rows(columns, queryset)),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_csv(filename, columns, queryset):
+    """Write the CSV to EXPORT_ROOT; the file only appears once it is complete"""
+    root = export_root()
+    root.mkdir(parents=True, exist_ok=True)
+    tmp_path = root / f'{filename}.partial'
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as export_file:
+            csv.writer(export_file).writerows(csv_rows(columns, queryset))
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, root / filename)
+
+
+def export_failure(filename):
+    """
+    Why a background export failed, or None. A .partial file nothing has written to for
+    EXPORT_STALE_SECONDS belongs to an export that was interrupted, e.g. by a restart.
+    """
+    root = export_root()
+    failed_path = root / f'{filename}.failed'
+    tmp_path = root / f'{filename}.partial'
+    try:
+        if time.time() - tmp_path.stat().st_mtime > settings.EXPORT_STALE_SECONDS:
+            tmp_path.unlink(missing_ok=True)
+            failed_path.write_text('Interrupted before it finished\n', encoding='utf-8')
+    except FileNotFoundError:
+        pass
+    if not failed_path.is_file():
+        return None
+    return failed_path.read_text(encoding='utf-8').strip()
+
+
+def start_background_export(filename, columns, queryset):
+    """Run write_csv in a background thread with its own database connections"""
+    def run():
+        close_old_connections()
+        try:
+            write_csv(filename, columns, queryset)
+        except Exception as error:
+            logger.exception(f"Background export {filename} failed")
+            (export_root() / f'{filename}.failed').write_text(f'{type(error).__name__}: {error}\n', encoding='utf-8')
+        finally:
+            # Every alias the export touched, e.g. analytics for page views
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name=f'export-{filename}', daemon=True)
+    thread.start()
+    return thread
+
+
+def yes_no(value):
+    return 'Yes' if value else 'No'
+
+
+def format_datetime(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+class CsvExportMixin:
+    """
+    ModelAdmin mixin for CSV export actions.
+
+    Subclasses set export_columns (see csv_rows) and export_name, and return
+    self.export_csv(request, queryset) from their export action.
+    """
+    export_columns = ()
+    export_name = None
+
+    def get_urls(self):
+        opts = self.model._meta
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'exports/<str:filename>/',
+                self.admin_site.admin_view(self.download_export),
+                name=f'{opts.app_label}_{opts.model_name}_export_download',
+            ),
+        ]
+        return custom_urls + urls
+
+    def export_filename(self):
+        name = self.export_name or self.model._meta.model_name
+        # The random suffix keeps two exports started in the same second apart
+        return f'{name}_export_{timezone.now().strftime("%Y%m%d_%H%M%S")}_{uuid.uuid4().hex[:8]}.csv'
+
+    def export_csv(self, request, queryset):
+        """Stream the selection, or start a background export for large selections"""
+        filename = self.export_filename()
+        total = queryset.count()
+
+        if total <= settings.EXPORT_STREAM_MAX_ROWS:
+            return stream_csv(filename, self.export_columns, queryset)
+
+        start_background_export(filename, self.export_columns, queryset)
+        opts = self.model._meta
+        url = reverse(
+            f'{self.admin_site.name}:{opts.app_label}_{opts.model_name}_export_download',
+            args=[filename],
+        )
+        self.message_user(
+            request,
+            format_html(
+                '📦 Exporting {} rows in the background. <a href="{}">Download {}</a> once it is ready.',
+                total, url, filename,
+            ),
+            messages.INFO,
+        )
+
+    def download_export(self, request, filename):
+        """Serve a finished background export, or report why it failed"""
+        name = self.export_name or self.model._meta.model_name
+        filename = os.path.basename(filename)
+        if not (filename.startswith(f'{name}_export_') and filename.endswith('.csv')):
+            raise Http404("Export not found")
+
+        failure = export_failure(filename)
+        if failure:
+            self.message_user(request, f'❌ Export {filename} failed: {failure}', messages.ERROR)
+            opts = self.model._meta
+            return HttpResponseRedirect(reverse(f'{self.admin_site.name}:{opts.app_label}_{opts.model_name}_changelist'))
+
+        export_path = export_root() / filename
+        if not export_path.is_file():
+            raise Http404("Export not found or still running")
+        return FileResponse(open(export_path, 'rb'), as_attachment=True, filename=filename)
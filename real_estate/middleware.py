@@ -1,19 +1,68 @@
 import ipaddress
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import HttpResponseForbidden, HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse
 from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.utils.decorators import decorator_from_middleware
+from django.db import connections
+from core.metrics import REGISTRY, end_request_metrics, route_label, start_request_metrics
+from core.nplusone import detect_repeated_queries
+from core.profiling import RequestProfiler, profile_trigger
+from .db import reset_connection_acquisition, track_connection_acquisition
+from .routers import end_request_routing, start_request_routing
 
-class AdminSecurityMiddleware:
+class AsyncCapableMiddleware:
     """
-    Middleware to restrict admin access to specific IP addresses and require superuser privileges
+    Base for middleware that runs natively under both WSGI and ASGI, so async views
+    are not pushed through a thread by a sync-only middleware. Subclasses implement
+    process() and aprocess().
     """
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.aprocess(request)
+        return self.process(request)
+
+
+class AdminSecurityMiddleware(AsyncCapableMiddleware):
+    """
+    Middleware to restrict admin access to specific IP addresses and require superuser privileges
+    """
+
+    def process(self, request):
+        denied = self.check_ip(request)
+        if denied:
+            return denied
+
+        # Process the request first to get user authentication
+        response = self.get_response(request)
+
+        if self.is_admin_path(request) and hasattr(request, 'user'):
+            return self.check_user(request, request.user) or response
+        return response
+
+    async def aprocess(self, request):
+        denied = self.check_ip(request)
+        if denied:
+            return denied
+
+        response = await self.get_response(request)
+
+        if self.is_admin_path(request) and hasattr(request, 'user'):
+            return self.check_user(request, await request.auser()) or response
+        return response
+
+    def check_ip(self, request):
         # Check if trying to access admin
         if request.path.startswith('/admin/') and settings.ADMIN_RESTRICTED_ACCESS:
             # Check IP address first
@@ -25,26 +74,26 @@ class AdminSecurityMiddleware:
                     "<p>Admin access is restricted to authorized IP addresses only.</p>"
                     "<p>Your IP: {}</p>".format(client_ip)
                 )
+        return None
 
-        # Process the request first to get user authentication
-        response = self.get_response(request)
+    def is_admin_path(self, request):
+        return (request.path.startswith('/admin/') or request.path.startswith('/secure-admin/')) and settings.ADMIN_RESTRICTED_ACCESS
 
-        # Check admin access after authentication middleware has run
-        if (request.path.startswith('/admin/') or request.path.startswith('/secure-admin/')) and settings.ADMIN_RESTRICTED_ACCESS:
-            # Check if user is authenticated and is superuser
-            if hasattr(request, 'user') and request.user.is_authenticated:
-                if not request.user.is_superuser:
-                    return HttpResponseForbidden(
-                        "<h1>🚫 Admin Access Required</h1>"
-                        "<p>You need administrator privileges to access this area.</p>"
-                        "<p><a href='{}'>← Back to Homepage</a></p>".format(reverse('home'))
-                    )
-            elif hasattr(request, 'user'):
-                # Redirect to login with next parameter
-                login_url = "{}?next={}".format(reverse('accounts:login'), request.path)
-                return HttpResponseRedirect(login_url)
-
-        return response
+    def check_user(self, request, user):
+        """Check admin access after authentication middleware has run"""
+        # Check if user is authenticated and is superuser
+        if user.is_authenticated:
+            if not user.is_superuser:
+                return HttpResponseForbidden(
+                    "<h1>🚫 Admin Access Required</h1>"
+                    "<p>You need administrator privileges to access this area.</p>"
+                    "<p><a href='{}'>← Back to Homepage</a></p>".format(reverse('home'))
+                )
+        else:
+            # Redirect to login with next parameter
+            login_url = "{}?next={}".format(reverse('accounts:login'), request.path)
+            return HttpResponseRedirect(login_url)
+        return None
 
     def get_client_ip(self, request):
         """Get the client's real IP address"""
@@ -72,6 +121,163 @@ class AdminSecurityMiddleware:
                 continue
         return False
 
+class ConnectionTimingMiddleware(AsyncCapableMiddleware):
+    """
+    Add the time the request spent acquiring database connections (opening them or
+    health-checking reused ones) to a Server-Timing header, one entry per database
+    with an open connection, e.g. ``db-default;dur=0.41;desc="1 opened, 0 checked"``. Enabled by SERVER_TIMING.
+
+    Under ASGI the connections belong to the request's sync thread, so they are
+    read there.
+    """
+
+    def process(self, request):
+        if not settings.SERVER_TIMING:
+            return self.get_response(request)
+        self.start()
+        return self.add_timings(self.get_response(request), self.collect())
+
+    async def aprocess(self, request):
+        if not settings.SERVER_TIMING:
+            return await self.get_response(request)
+        await sync_to_async(self.start)()
+        response = await self.get_response(request)
+        return self.add_timings(response, await sync_to_async(self.collect)())
+
+    def start(self):
+        for connection in connections.all(initialized_only=False):
+            track_connection_acquisition(connection)
+            reset_connection_acquisition(connection)
+
+    def collect(self):
+        return [
+            f'db-{connection.alias};dur={connection.acquisition["ms"]:.2f};'
+            f'desc="{connection.acquisition["opened"]} opened, {connection.acquisition["checked"]} checked"'
+            for connection in connections.all(initialized_only=True)
+            if connection.connection is not None or connection.acquisition['opened']
+        ]
+
+    def add_timings(self, response, timings):
+        if timings:
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = ', '.join(filter(None, [existing, *timings]))
+        return response
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Record each request's latency, database queries and time, template render time
+    and response size in core.metrics.REGISTRY, labelled by the resolved URL name.
+    Enabled by METRICS_ENABLED; the totals are served at /metrics.
+    """
+
+    def process(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        metrics, token = start_request_metrics()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request_metrics(token)
+        return self.record(request, response, time.perf_counter() - start, metrics)
+
+    async def aprocess(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        metrics, token = start_request_metrics()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request_metrics(token)
+        return self.record(request, response, time.perf_counter() - start, metrics)
+
+    def record(self, request, response, duration, metrics):
+        size = None if isinstance(response, StreamingHttpResponse) else len(response.content)
+        REGISTRY.record(route_label(request), request.method, response.status_code, duration, metrics, size)
+        return response
+
+
+class QueryPatternMiddleware(AsyncCapableMiddleware):
+    """
+    Report N+1 queries in the request (see core.nplusone): logged under DEBUG,
+    raised in tests. Does nothing unless NPLUSONE_ACTION is set.
+    """
+
+    def process(self, request):
+        with detect_repeated_queries(f'{request.method} {request.path}'):
+            return self.get_response(request)
+
+    async def aprocess(self, request):
+        with detect_repeated_queries(f'{request.method} {request.path}'):
+            return await self.get_response(request)
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Profile requests superusers ask for (X-Profile: 1 header or _profile=1) and a
+    PROFILE_SAMPLE_RATE sample of the rest, stored as RequestProfile rows (see
+    core.profiling). Must come after AuthenticationMiddleware.
+    """
+
+    def process(self, request):
+        trigger = profile_trigger(request, request.user)
+        profiler = RequestProfiler.acquire(trigger) if trigger else None
+        if profiler is None:
+            return self.get_response(request)
+        response = profiler.run(self.get_response, request)
+        profiler.save(request, response, request.user)
+        return response
+
+    async def aprocess(self, request):
+        user = await request.auser()
+        trigger = profile_trigger(request, user)
+        profiler = RequestProfiler.acquire(trigger) if trigger else None
+        if profiler is None:
+            return await self.get_response(request)
+        response = await profiler.arun(self.get_response, request)
+        await sync_to_async(profiler.save)(request, response, user)
+        return response
+
+
+class ReplicaPinningMiddleware(AsyncCapableMiddleware):
+    """
+    Let PrimaryReplicaRouter send the request's reads to replicas, except for unsafe
+    methods and for REPLICA_PIN_SECONDS after the client last wrote, which is
+    remembered in a cookie so the user reads their own writes.
+    """
+
+    def process(self, request):
+        token = start_request_routing(self.is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            routing = end_request_routing(token)
+        return self.pin(response, routing)
+
+    async def aprocess(self, request):
+        token = start_request_routing(self.is_pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing = end_request_routing(token)
+        return self.pin(response, routing)
+
+    def is_pinned(self, request):
+        return (
+            request.method not in ('GET', 'HEAD', 'OPTIONS')
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+
+    def pin(self, response, routing):
+        if routing.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
 def admin_required(view_func):
     """
     Decorator to require admin access for views
@@ -0,0 +1,192 @@
+"""
+Database routers (settings.DATABASE_ROUTERS)
+"""
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Routing state of the request being handled (see ReplicaPinningMiddleware); None
+# outside requests, where commands and scheduled jobs always use the primary
+_request_routing = ContextVar('request_routing', default=None)
+
+# alias -> (checked at, lag in seconds)
+_replica_lag = {}
+
+
+class RequestRouting:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def start_request_routing(pinned=False):
+    """Let reads of the current request go to replicas unless pinned; returns a reset token"""
+    return _request_routing.set(RequestRouting(pinned))
+
+
+def end_request_routing(token):
+    """Finish the current request; returns its RequestRouting"""
+    routing = _request_routing.get()
+    _request_routing.reset(token)
+    return routing
+
+
+@contextmanager
+def outside_request_routing():
+    """
+    Run the block as if outside a request: its reads go to the primary and its writes
+    don't pin the client there. For the site's own bookkeeping, such as storing a
+    request profile, which the client never reads back.
+    """
+    token = _request_routing.set(None)
+    try:
+        yield
+    finally:
+        _request_routing.reset(token)
+
+
+WRITE_STATEMENT = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+
+def write_tracker(execute, sql, params, many, context):
+    """Execute wrapper marking the current request as having written when it modifies the primary"""
+    routing = _request_routing.get()
+    if routing is not None and not routing.wrote and WRITE_STATEMENT.match(sql):
+        routing.wrote = True
+    return execute(sql, params, many, context)
+
+
+def install_write_tracker(sender, connection, **kwargs):
+    """connection_created receiver putting write_tracker on the primary's connections"""
+    if connection.alias == DEFAULT_DB_ALIAS and write_tracker not in connection.execute_wrappers:
+        connection.execute_wrappers.append(write_tracker)
+
+
+def sync_marker_path(alias):
+    return f"{connections[alias].settings_dict['NAME']}.synced"
+
+
+def replica_lag(alias):
+    """
+    Seconds the replica is behind the primary, or None if unknown.
+
+    SQLite replicas are files refreshed by the sync_replicas command, so their lag is
+    the time since it last touched the replica's sync marker; PostgreSQL standbys
+    report their replay delay.
+    """
+    connection = connections[alias]
+    if connection.vendor == 'sqlite':
+        marker = sync_marker_path(alias)
+        return time.time() - os.path.getmtime(marker) if os.path.exists(marker) else None
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())')
+            lag = cursor.fetchone()[0]
+        return 0 if lag is None else float(lag)
+    return 0
+
+
+def fresh_replicas():
+    """Replicas within REPLICA_MAX_LAG_SECONDS; lag is checked at most every REPLICA_LAG_CHECK_SECONDS"""
+    now = time.monotonic()
+    fresh = []
+    for alias in settings.DATABASE_REPLICAS:
+        checked_at, lag = _replica_lag.get(alias, (None, None))
+        if checked_at is None or now - checked_at > settings.REPLICA_LAG_CHECK_SECONDS:
+            try:
+                lag = replica_lag(alias)
+            except Exception:
+                lag = None
+            _replica_lag[alias] = (now, lag)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS:
+            fresh.append(alias)
+    return fresh
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads made while handling a request to a replica of the default database
+    (settings.DATABASE_REPLICAS) and everything else to the primary.
+
+    Reads stay on the primary inside transactions, for the rest of a request once it
+    has written, for unsafe methods, and for REPLICA_PIN_SECONDS after a user's write
+    (ReplicaPinningMiddleware sets a cookie), so users always read their own writes.
+    Replicas lagging more than REPLICA_MAX_LAG_SECONDS are skipped. The analytics app
+    is left to AnalyticsRouter.
+    """
+    excluded_apps = {'analytics'}
+    # Stale sessions would log users out or lose their messages
+    primary_apps = {'sessions'}
+
+    def db_for_read(self, model, **hints):
+        app_label = model._meta.app_label
+        if app_label in self.excluded_apps:
+            return None
+        routing = _request_routing.get()
+        if (
+            routing is None or routing.pinned or routing.wrote
+            or app_label in self.primary_apps
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        replicas = fresh_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Only a statement that actually modifies the primary marks the request as
+        # having written (write_tracker); asking where a write would go doesn't
+        if model._meta.app_label in self.excluded_apps:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class AnalyticsRouter:
+    """
+    Keep the analytics app in its own database (settings.ANALYTICS_DATABASE) so tracking
+    writes never wait on the lock of the listings/users database.
+
+    Analytics models refer to properties, users and blog posts by id only (their foreign
+    keys have no database constraint), so relations across the two databases are allowed
+    but must never be joined in a query.
+    """
+    app_label = 'analytics'
+
+    def database_for(self, model):
+        if model._meta.app_label == self.app_label:
+            return settings.ANALYTICS_DATABASE
+        # Explicit, so a user or property reached from an analytics row is not looked
+        # up in the analytics database (Django would default to the row's database)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        return self.database_for(model)
+
+    def db_for_write(self, model, **hints):
+        return self.database_for(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if self.app_label in (obj1._meta.app_label, obj2._meta.app_label):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == self.app_label:
+            return db == settings.ANALYTICS_DATABASE
+        return db == DEFAULT_DB_ALIAS
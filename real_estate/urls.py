@@ -18,8 +18,10 @@ from django.contrib import admin
 from django.urls import path, include
 from properties.views import home
 from accounts import views
+from core.views import metrics
 from django.conf import settings
 from django.conf.urls.static import static
+from django.db.models import Count
 
 # Custom admin site with full access for superusers
 class SecureAdminSite(admin.AdminSite):
@@ -99,13 +101,16 @@ from properties.models import Property, PropertyType, Amenity, Image, Company, L
 from accounts.models import User
 from contact.models import ContactInquiry
 from blog.models import BlogPost
-from analytics.models import PageView
+from analytics.models import PageView, SocialShare
 from premium.models import PremiumListing
 
 
 # Import admin classes
 from properties.admin import PropertyAdmin, PropertyTypeAdmin, AmenityAdmin, ImageAdmin, CompanyAdmin, LocationAdmin
 from premium.admin import PremiumListingAdmin
+from analytics.admin import PageViewAdmin, SocialShareAdmin
+from core.admin import JobRunAdmin, RequestProfileAdmin, SchedulerLockAdmin
+from core.models import JobRun, RequestProfile, SchedulerLock
 
 # Create custom admin classes
 class UserAdmin(admin.ModelAdmin):
@@ -129,9 +134,13 @@ class UserAdmin(admin.ModelAdmin):
     )
     actions = ['delete_brokers', 'delete_investors', 'delete_tenants']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(property_count=Count('properties'))
+
     def properties_count(self, obj):
-        return obj.properties.count()
+        return obj.property_count
     properties_count.short_description = 'Properties Listed'
+    properties_count.admin_order_field = 'property_count'
 
     def view_properties(self, obj):
         url = f'/real-admin/properties/property/?user={obj.id}'
@@ -165,7 +174,11 @@ secure_admin.register(User, UserAdmin)
 secure_admin.register(PremiumListing, PremiumListingAdmin)
 secure_admin.register(ContactInquiry)
 secure_admin.register(BlogPost)
-secure_admin.register(PageView)
+secure_admin.register(PageView, PageViewAdmin)
+secure_admin.register(SocialShare, SocialShareAdmin)
+secure_admin.register(JobRun, JobRunAdmin)
+secure_admin.register(SchedulerLock, SchedulerLockAdmin)
+secure_admin.register(RequestProfile, RequestProfileAdmin)
 
 urlpatterns = [
     path('real-admin/', secure_admin.urls),  # Real Estate Admin Panel
@@ -187,6 +200,7 @@ urlpatterns = [
     path('contact/', include('contact.urls', namespace='contact')),
     path('blog/', include('blog.urls', namespace='blog')),
     path('legal/', include('legal.urls', namespace='legal')),
+    path('metrics', metrics, name='metrics'),  # Prometheus scrape endpoint
     path('', home, name='home'),
 ]
 
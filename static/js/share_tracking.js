@@ -0,0 +1,71 @@
+/**
+ * Client-side queue for analytics events (social shares, page views).
+ *
+ * Events are buffered and sent to the batch endpoint in one request: when the
+ * queue fills up, after a short delay, and when the page is hidden or unloaded
+ * (via navigator.sendBeacon so the request survives navigation).
+ *
+ * Usage:
+ *   <script src="{% static 'js/share_tracking.js' %}" data-endpoint="{% url 'analytics:track_event_batch_async' %}"></script>
+ *   AnalyticsQueue.enqueue({type: 'share', platform: 'facebook', ...});
+ */
+(function (window, document) {
+    'use strict';
+
+    var script = document.currentScript;
+    var endpoint = (script && script.dataset.endpoint) || '/analytics/async/track-batch/';
+    var MAX_QUEUE = 20;
+    var FLUSH_DELAY_MS = 5000;
+
+    var queue = [];
+    var timer = null;
+
+    function flush(useBeacon) {
+        if (timer) {
+            clearTimeout(timer);
+            timer = null;
+        }
+        if (!queue.length) {
+            return;
+        }
+
+        var body = JSON.stringify({events: queue.splice(0, queue.length)});
+
+        if (useBeacon && navigator.sendBeacon) {
+            if (navigator.sendBeacon(endpoint, new Blob([body], {type: 'text/plain'}))) {
+                return;
+            }
+        }
+
+        fetch(endpoint, {
+            method: 'POST',
+            headers: {'Content-Type': 'text/plain'},
+            body: body,
+            keepalive: true,
+            credentials: 'same-origin'
+        }).catch(function (error) {
+            console.error('Error sending analytics events:', error);
+        });
+    }
+
+    function enqueue(event) {
+        queue.push(event);
+        if (queue.length >= MAX_QUEUE) {
+            flush(false);
+        } else if (!timer) {
+            timer = setTimeout(function () { flush(false); }, FLUSH_DELAY_MS);
+        }
+    }
+
+    document.addEventListener('visibilitychange', function () {
+        if (document.visibilityState === 'hidden') {
+            flush(true);
+        }
+    });
+    window.addEventListener('pagehide', function () { flush(true); });
+
+    window.AnalyticsQueue = {
+        enqueue: enqueue,
+        flush: flush
+    };
+})(window, document);